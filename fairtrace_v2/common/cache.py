@@ -3,9 +3,41 @@ import re
 from django.core.cache.backends.filebased import FileBasedCache
 from django.utils import timezone
 from django.utils.cache import caches
+from django_redis.cache import RedisCache
 
 
-class FileBasedCacheOperational(FileBasedCache):
+# Patterns of the keys used for the operational caches. Named groups are
+# indexed as tags (eg: theme_12_4_en is tagged batch:12 and theme:4), so
+# that all keys related to an object can be found without a scan.
+KEY_TAG_PATTERNS = (
+    re.compile(r"^(?:theme|stage|map|claim)_(?P<batch>\d+)_(?P<theme>\d+)_"),
+    re.compile(r"^connection_(?P<node>\d+)_(?P<supply_chain>\d+)_"),
+    re.compile(r"^(?P<transaction>\d+)_(?:parent|actor)_transactions_"),
+)
+
+
+class TaggedCacheMixin:
+    """Tagging of cache keys with the objects they are built from."""
+
+    @staticmethod
+    def get_tags(key, tags=()):
+        """Returns the tags of a key as "<name>:<id>" strings.
+
+        Tags are parsed from the key using KEY_TAG_PATTERNS and can also be
+        passed explicitly as (name, id) pairs.
+        """
+        key_tags = {f"{name}:{value}" for name, value in tags}
+        for pattern in KEY_TAG_PATTERNS:
+            match = pattern.match(key)
+            if match:
+                key_tags.update(
+                    f"{name}:{value}"
+                    for name, value in match.groupdict().items()
+                )
+        return key_tags
+
+
+class FileBasedCacheOperational(TaggedCacheMixin, FileBasedCache):
     """Class to handle FileBasedCacheOperational and functions."""
 
     def keys(self, search: str):
@@ -18,13 +50,17 @@ class FileBasedCacheOperational(FileBasedCache):
             return []
         return list(filter(search_re.fullmatch, key_list))
 
-    def set(self, key, value, **kwargs):
+    def set(self, key, value, tags=(), **kwargs):
         """To perform function set."""
         super().set(key, value, **kwargs)
         key_list = self.keys("*")
         if key not in key_list:
             key_list.append(key)
             super().set("keys", key_list)
+        if tags:
+            key_tags = self.get("tags", default={})
+            key_tags[key] = self.get_tags("", tags)
+            super().set("tags", key_tags)
 
     def delete(self, key, **kwargs):
         """To perform function lete."""
@@ -34,6 +70,150 @@ class FileBasedCacheOperational(FileBasedCache):
             key_list.remove(key)
             super().set("keys", key_list)
 
+    def _key_tags(self):
+        """Returns the tags of every key."""
+        key_tags = self.get("tags", default={})
+        return {
+            key: self.get_tags(key) | key_tags.get(key, set())
+            for key in self.keys("*")
+        }
+
+    def keys_by_tag(self, *tags):
+        """Returns the keys having all the given (name, id) tags."""
+        tags = self.get_tags("", tags)
+        return [
+            key
+            for key, key_tags in self._key_tags().items()
+            if tags <= key_tags
+        ]
+
+    def keys_by_any_tag(self, *tags):
+        """Returns the keys having any of the given (name, id) tags."""
+        tags = self.get_tags("", tags)
+        return [
+            key
+            for key, key_tags in self._key_tags().items()
+            if tags & key_tags
+        ]
+
+
+class RedisCacheOperational(TaggedCacheMixin, RedisCache):
+    """Redis cache keeping an index of its keys.
+
+    Replaces FileBasedCacheOperational, whose key registry is a single list
+    rewritten on every write and is local to one host. Here every key is
+    added to a registry set and to a set per tag, and the tags of a key are
+    kept as well to clean them up on deletion. Lookups by tag are then set
+    reads, and the cache is shared by all app and worker nodes. Keys that
+    expired are removed from the index when they are looked up.
+    """
+
+    def _index_key(self, name):
+        """Returns the redis key of an index set."""
+        return self.make_key(f"_index:{name}")
+
+    @property
+    def _redis(self):
+        """Raw redis client."""
+        return self.client.get_client(write=True)
+
+    @staticmethod
+    def _decode(values):
+        """Decodes the members of an index set."""
+        return [value.decode() for value in values]
+
+    def set(self, key, value, *args, tags=(), **kwargs):
+        """Stores the value and indexes its key."""
+        result = super().set(key, value, *args, **kwargs)
+        pipe = self._redis.pipeline()
+        pipe.sadd(self._index_key("keys"), key)
+        for tag in self.get_tags(key, tags):
+            pipe.sadd(self._index_key(f"tag:{tag}"), key)
+            pipe.sadd(self._index_key(f"key:{key}"), tag)
+        pipe.execute()
+        return result
+
+    def delete(self, key, *args, **kwargs):
+        """Deletes the value and removes its key from the index."""
+        result = super().delete(key, *args, **kwargs)
+        self._unindex([key])
+        return result
+
+    def delete_many(self, keys, *args, **kwargs):
+        """Deletes the values and removes their keys from the index."""
+        keys = list(keys)
+        if not keys:
+            return None
+        result = super().delete_many(keys, *args, **kwargs)
+        self._unindex(keys)
+        return result
+
+    def _unindex(self, keys):
+        """Removes keys from the registry and from their tag sets."""
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.smembers(self._index_key(f"key:{key}"))
+        key_tags = pipe.execute()
+
+        pipe = self._redis.pipeline()
+        pipe.srem(self._index_key("keys"), *keys)
+        for key, tags in zip(keys, key_tags):
+            for tag in self._decode(tags):
+                pipe.srem(self._index_key(f"tag:{tag}"), key)
+            pipe.delete(self._index_key(f"key:{key}"))
+        pipe.execute()
+
+    def _prune(self, keys):
+        """Returns the keys that still exist, removing the ones that expired
+        from the index."""
+        keys = list(keys)
+        if not keys:
+            return []
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.exists(self.make_key(key))
+        found = pipe.execute()
+        expired = [key for key, exists in zip(keys, found) if not exists]
+        if expired:
+            self._unindex(expired)
+        return [key for key, exists in zip(keys, found) if exists]
+
+    def keys(self, search):
+        """Returns keys matching a glob pattern.
+
+        Kept for compatibility with FileBasedCacheOperational, prefer
+        keys_by_tag.
+        """
+        return self._prune(
+            self._decode(
+                self._redis.sscan_iter(self._index_key("keys"), match=search)
+            )
+        )
+
+    def keys_by_tag(self, *tags):
+        """Returns the keys having all the given (name, id) tags."""
+        tag_keys = [
+            self._index_key(f"tag:{tag}") for tag in self.get_tags("", tags)
+        ]
+        if not tag_keys:
+            return []
+        return self._prune(self._decode(self._redis.sinter(*tag_keys)))
+
+    def keys_by_any_tag(self, *tags):
+        """Returns the keys having any of the given (name, id) tags."""
+        tag_keys = [
+            self._index_key(f"tag:{tag}") for tag in self.get_tags("", tags)
+        ]
+        if not tag_keys:
+            return []
+        return self._prune(self._decode(self._redis.sunion(*tag_keys)))
+
+    def delete_by_tag(self, *tags):
+        """Deletes all keys having all the given (name, id) tags."""
+        keys = self.keys_by_tag(*tags)
+        self.delete_many(keys)
+        return keys
+
 
 class CacheProxy:
     """Proxy access to the multiple type Cache object's attributes.
@@ -0,0 +1,83 @@
+"""Shared codec for hashing ids (idencode) and decoding them back.
+
+Building a Hashids object shuffles its alphabet with the salt, which costs
+more than the encoding itself, so a single instance is shared. Encoded and
+decoded values are also memoized since the same ids are encoded over and
+over in serializers and cache keys.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from hashids import Hashids
+
+CODEC_CACHE_SIZE = 2**16
+
+
+@lru_cache(maxsize=None)
+def get_hasher() -> Hashids:
+    """Returns the shared Hashids instance."""
+    return Hashids(
+        min_length=settings.HASHHID_MIN_LENGTH, salt=settings.HASHHID_SALT
+    )
+
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def _encode_int(value):
+    """Memoized encoding of an int."""
+    return get_hasher().encode(value)
+
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def _decode_str(value):
+    """Memoized decoding of a hash."""
+    return get_hasher().decode(value)
+
+
+def encode(value):
+    """Hashes an int value.
+
+    Returns None if the value cannot be encoded.
+    """
+    try:
+        return _encode_int(int(value))
+    except Exception:
+        return None
+
+
+def decode(value):
+    """Decodes a hashed value to its int.
+
+    Returns None if the value cannot be decoded.
+    """
+    try:
+        return _decode_str(value)[0]
+    except Exception:
+        return None
+
+
+def _convert_many(convert, values) -> list:
+    """Converts a list of values, each distinct value being converted once.
+
+    Values that cannot be hashed, as the objects of a request body, are
+    converted one by one.
+    """
+    converted = {}
+    results = []
+    for value in values:
+        try:
+            if value not in converted:
+                converted[value] = convert(value)
+            results.append(converted[value])
+        except TypeError:
+            results.append(convert(value))
+    return results
+
+
+def encode_many(values) -> list:
+    """Hashes a list of int values, each value being encoded once."""
+    return _convert_many(encode, values)
+
+
+def decode_many(values) -> list:
+    """Decodes a list of hashed values, each value being decoded once."""
+    return _convert_many(decode, values)
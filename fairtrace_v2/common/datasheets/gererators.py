@@ -1,15 +1,23 @@
 import datetime
 import os
 import shutil
+from copy import copy
 from operator import methodcaller
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Tuple
 
 import pytz
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.core.files import File
 from django.db import models
 from django.utils import timezone
 from openpyxl import load_workbook
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 
 DATASHEET_ROOT = "/common/datasheets/"
 
@@ -26,11 +34,19 @@ class GeneratorMethod:
         def foo(self, instance):
             ...
             return ...
+
+    * With 'batch=True', the method is called once per chunk of items and
+    returns the values of all of them by pk, to avoid a query per row.
+
+        def foo(self, items):
+            ...
+            return {item.pk: ... for item in items}
     """
 
-    def __init__(self, name):
+    def __init__(self, name, batch=False):
         """To perform function __init__."""
         self.name = name
+        self.batch = batch
 
     def __repr__(self):
         """To perform function __repr__."""
@@ -54,6 +70,15 @@ class DataGenerator(object):
     .data(queryset) -> This will generate a data 'dict' according to the
     fields mentioned in 'Meta'.
 
+    .iter_data(queryset, progress) -> Same as '.data()', but yields the rows
+    one by one while reading the queryset in chunks of pk ranges.
+
+    Relations used in the 'Meta.field_map' paths are loaded along with the
+    items, using select_related for foreign keys and prefetch_related for
+    reverse and many to many relations. Relations used by properties or
+    methods can be added with 'Meta.select_related' and
+    'Meta.prefetch_related'.
+
     .clean(field, value, data) -> This will clean individual fields value
     and helps to compare with other resolved fields.
     """
@@ -61,6 +86,7 @@ class DataGenerator(object):
     meta = None
     fields = []
     new_field_names = []
+    chunk_size = 2000
 
     def __init__(self):
         """To perform function __init__."""
@@ -87,16 +113,106 @@ class DataGenerator(object):
 
     def data(self, qs: models.QuerySet) -> List[dict]:
         """convert qs to dictionary."""
+        return list(self.iter_data(qs))
+
+    def iter_data(
+        self,
+        qs: models.QuerySet,
+        progress: Callable[[int], None] = None,
+    ) -> Iterator[dict]:
+        """Yields the dictionary of every item of the qs.
+
+        'progress' is called with the number of items done after every
+        chunk.
+        """
         self._model_check(qs.model)
-        data_list = []
-        for item in qs.iterator():
-            data_dict = {}
-            for field in self.fields:
-                value = self.get_value(field, item)
-                field = self.new_field_names[self.fields.index(field)]
-                self.clean(field, value, data_dict)
-            data_list.append(data_dict)
-        return data_list
+        select_related, prefetch_related = self.get_query_plan()
+        qs = qs.select_related(*select_related).prefetch_related(
+            *prefetch_related
+        )
+        fields = list(zip(self.fields, self.new_field_names))
+        batch_fields = [
+            field
+            for field in self.fields
+            if isinstance(field, GeneratorMethod) and field.batch
+        ]
+        done = 0
+        for items in self.iter_chunks(qs):
+            batch_values = {
+                field.name: methodcaller(field.name, items)(self)
+                for field in batch_fields
+            }
+            for item in items:
+                data_dict = {}
+                for field, field_name in fields:
+                    if field in batch_fields:
+                        value = batch_values[field.name].get(item.pk)
+                    else:
+                        value = self.get_value(field, item)
+                    self.clean(field_name, value, data_dict)
+                yield data_dict
+            done += len(items)
+            if progress:
+                progress(done)
+
+    def iter_chunks(self, qs: models.QuerySet) -> Iterator[list]:
+        """Yields the items of the qs in lists of 'chunk_size'.
+
+        Chunks are read by keyset pagination on the pk, in the direction of
+        the first ordering of the qs, so that each chunk is a range on the
+        primary key instead of an OFFSET or a list of ids. Unlike
+        iterator(), this applies prefetch_related.
+        """
+        qs, lookup = self.order_by_key(qs)
+        chunk = list(qs[: self.chunk_size])
+        while chunk:
+            yield chunk
+            if len(chunk) < self.chunk_size:
+                return
+            chunk = list(
+                qs.filter(**{lookup: chunk[-1].pk})[: self.chunk_size]
+            )
+
+    @staticmethod
+    def order_by_key(qs: models.QuerySet) -> Tuple[models.QuerySet, str]:
+        """Orders the qs by pk in the direction of its first ordering and
+        returns it with the lookup of the items after a pk."""
+        ordering = qs.query.order_by or qs.model._meta.ordering
+        if ordering and str(ordering[0]).startswith("-"):
+            return qs.order_by("-pk"), "pk__lt"
+        return qs.order_by("pk"), "pk__gt"
+
+    def get_query_plan(self) -> Tuple[set, set]:
+        """Returns the select_related and prefetch_related lookups of the
+        relations used in the field_map.
+
+        Each field path is followed while its segments are relations of the
+        model, up to a non relational field or a property.
+        """
+        select_related = set(getattr(self.meta, "select_related", ()))
+        prefetch_related = set(getattr(self.meta, "prefetch_related", ()))
+        for field in self.fields:
+            if isinstance(field, GeneratorMethod):
+                continue
+            model = self.meta.model
+            path, many = [], False
+            for segment in field.split("__"):
+                try:
+                    model_field = model._meta.get_field(segment)
+                except FieldDoesNotExist:
+                    break
+                if not (model_field.is_relation and model_field.related_model):
+                    break
+                path.append(segment)
+                many |= model_field.many_to_many or model_field.one_to_many
+                model = model_field.related_model
+            if not path:
+                continue
+            if many:
+                prefetch_related.add("__".join(path))
+            else:
+                select_related.add("__".join(path))
+        return select_related, prefetch_related
 
     # noinspection PyMethodMayBeStatic
     def clean(self, field, value, data):
@@ -159,7 +275,13 @@ class TemplateDataGenerator(DataGenerator):
         - company_cell -> company name cell.
     * You can override path while initializing.
 
+    * Rows are streamed into a write-only workbook, with the cells above
+    the start row copied from the template. Set 'streaming' to False for
+    templates that cannot be copied that way (eg: with images), to fill the
+    template in memory instead.
+
     .to_sheet(queryset) -> create data sheet
+    .write_sheet(rows) -> create data sheet from an iterable of row dicts.
     .save_to_instance() -> append data sheet to export entry.
     .close() -> remove temporary file from storage.
     """
@@ -173,6 +295,7 @@ class TemplateDataGenerator(DataGenerator):
             self.path = settings.BASE_DIR + path
 
     template_name = "default.xlsx"
+    streaming = True
 
     start_cell = (4, 1)
     created_by_cell = (1, 1)
@@ -192,28 +315,117 @@ class TemplateDataGenerator(DataGenerator):
             self.path + "templates/" + self.template_name, self.full_path
         )
 
-    def to_sheet(self, queryset):
+    def to_sheet(self, queryset, progress=None):
         """This function get the data and generate the file in a temporary
         storage."""
-        data = self.data(queryset)
+        self.write_sheet(self.iter_data(queryset, progress))
+
+    def write_sheet(self, rows: Iterable[dict]):
+        """Generate the file in the temporary storage from the rows."""
+        if self.streaming:
+            self._write_streaming(rows)
+        else:
+            self._write_in_memory(rows)
+
+    def _write_in_memory(self, rows):
+        """Fill the rows into the loaded template."""
         wb = load_workbook(self.full_path)
 
         sheet = wb.active
         self.update_sheet_meta(sheet)
-        for row_idx, row in enumerate(data, self.start_cell[ROW_INDEX]):
+        for row_idx, row in enumerate(rows, self.start_cell[ROW_INDEX]):
             for column_idx, column in enumerate(
                 row.values(), self.start_cell[COL_INDEX]
             ):
-                if isinstance(column, datetime.datetime):
-                    if settings.USE_TZ and timezone.is_aware(column):
-                        # Convert aware datetime to the default time zone
-                        # before casting them to dates (#17742).
-                        default_timezone = timezone.get_default_timezone()
-                        column = timezone.make_naive(column, default_timezone)
-
-                sheet.cell(row=row_idx, column=column_idx).value = column
+                sheet.cell(
+                    row=row_idx, column=column_idx
+                ).value = self.clean_cell(column)
+        wb.save(self.full_path)
+
+    def _write_streaming(self, rows):
+        """Write the template header and the rows into a write-only
+        workbook, keeping only the current row in memory.
+
+        The rows are styled as the first data row of the template.
+        """
+        template_wb = load_workbook(self.full_path)
+        template = template_wb.active
+        self.update_sheet_meta(template)
+
+        wb = Workbook(write_only=True)
+        sheet = wb.create_sheet(template.title)
+        for key, dimension in template.column_dimensions.items():
+            sheet.column_dimensions[key].width = dimension.width
+        sheet.freeze_panes = template.freeze_panes
+        for merged_range in template.merged_cells.ranges:
+            if merged_range.max_row < self.start_cell[ROW_INDEX]:
+                sheet.merged_cells.add(merged_range.coord)
+
+        for template_row in template.iter_rows(
+            max_row=self.start_cell[ROW_INDEX] - 1
+        ):
+            sheet.append(
+                [
+                    self._new_cell(sheet, c.value, self._get_style(c))
+                    for c in template_row
+                ]
+            )
+        row_styles = [
+            self._get_style(cell)
+            for row in template.iter_rows(
+                min_row=self.start_cell[ROW_INDEX],
+                max_row=self.start_cell[ROW_INDEX],
+                min_col=self.start_cell[COL_INDEX],
+            )
+            for cell in row
+        ]
+        template_wb.close()
+
+        padding = [None] * (self.start_cell[COL_INDEX] - 1)
+        for row in rows:
+            cells = []
+            for idx, value in enumerate(row.values()):
+                value = self.clean_cell(value)
+                style = row_styles[idx] if idx < len(row_styles) else None
+                cells.append(
+                    self._new_cell(sheet, value, style) if style else value
+                )
+            sheet.append(padding + cells)
         wb.save(self.full_path)
 
+    @staticmethod
+    def _get_style(cell) -> dict:
+        """Returns the style attributes of a template cell, if styled."""
+        if not cell.has_style:
+            return {}
+        return {
+            "font": copy(cell.font),
+            "fill": copy(cell.fill),
+            "border": copy(cell.border),
+            "alignment": copy(cell.alignment),
+            "number_format": cell.number_format,
+        }
+
+    @staticmethod
+    def _new_cell(sheet, value, style):
+        """Create a cell with the style attributes in the write-only
+        sheet."""
+        new_cell = WriteOnlyCell(sheet, value=value)
+        for attr, style_value in (style or {}).items():
+            setattr(new_cell, attr, style_value)
+        return new_cell
+
+    @staticmethod
+    def clean_cell(value):
+        """Convert a value to be written in a cell."""
+        if isinstance(value, datetime.datetime):
+            if settings.USE_TZ and timezone.is_aware(value):
+                # Convert aware datetime to the default time zone
+                # before casting them to dates (#17742).
+                default_timezone = timezone.get_default_timezone()
+                value = timezone.make_naive(value, default_timezone)
+        return value
+
     def save_to_instance(self, file_name):
         """This will append the file with the Export entry."""
         if not self.instance:
@@ -1,5 +1,10 @@
 """Module to override the default authentication."""
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+
 from django.conf import settings
 from rest_framework.authentication import (
     TokenAuthentication as RestTokenAuthentication, BaseAuthentication, 
@@ -15,6 +20,65 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 
 
+class VerifiedTokenCache:
+    """
+    Process level LRU cache of verified tokens.
+
+    Entries are keyed by the hash of the token, so that the token itself is
+    not kept in memory, and expire after `ttl` seconds or when the token
+    does, whichever is earlier.
+    """
+
+    def __init__(self, ttl, max_size):
+        """Initialize the cache."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(token):
+        """Returns the cache key of a token."""
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        """Returns the cached value of a token, or None."""
+        key = self.make_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, token, value, expires_at=None):
+        """Caches the value of a token until it expires."""
+        expires_at = min(
+            time.time() + self.ttl, expires_at or float("inf"))
+        key = self.make_key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache(
+    settings.JWT_VERIFICATION_CACHE_TTL,
+    settings.JWT_VERIFICATION_CACHE_SIZE,
+)
+
+# Loaded public keys by path, with the modification time of the file.
+_public_keys = {}
 
 
 class TokenAuthentication(RestTokenAuthentication):
@@ -50,7 +114,8 @@ class JWtAuthentication(BaseAuthentication):
         get_user_nodes(user, token): Retrieves the nodes associated with the 
             authenticated user.
         verify_token(token): Verifies the JWT token using the public key.
-        load_public_key_pem(path): Loads a public key from a PEM file.
+        load_public_key_pem(path): Loads a public key from a PEM file, cached
+            until the file changes.
 
     Raises:
         AuthenticationFailed: If the authorization header is invalid or the 
@@ -121,14 +186,57 @@ class JWtAuthentication(BaseAuthentication):
             tuple: A tuple containing the authenticated user and the key.
 
         """
-        token = self.verify_token(key)
-        user = self.get_auth_user(token)
-        user_nodes = self.get_user_nodes(user, token)
-        self.request.session['nodes'] = user_nodes
-        self.request.session['type'] = token.get('type')
-        self.request.session['email_verified'] = token.get('email_verified')
+        cached = verified_tokens.get(key)
+        if cached is not None:
+            token, user_id, user_nodes = cached
+            user = self.get_cached_user(user_id)
+        else:
+            token = self.verify_token(key)
+            user = self.get_auth_user(token)
+            user_nodes = self.get_user_nodes(user, token)
+            verified_tokens.set(
+                key, (token, user.id, user_nodes), expires_at=token.get('exp')
+            )
+        self.update_session({
+            'nodes': user_nodes,
+            'type': token.get('type'),
+            'email_verified': token.get('email_verified'),
+        })
         return (user, key)
 
+    def update_session(self, values):
+        """
+        Writes the values into the session, only if they are changed, to
+        avoid saving an unchanged session on every request.
+
+        Args:
+            values (dict): The values to be set in the session.
+        """
+        session = self.request.session
+        for name, value in values.items():
+            if name not in session or session[name] != value:
+                session[name] = value
+
+    def get_cached_user(self, user_id):
+        """
+        Retrieves the user of a cached token.
+
+        Args:
+            user_id (int): The id of the user resolved from the token.
+
+        Returns:
+            User: The authenticated user.
+
+        Raises:
+            AuthenticationFailed: If the user no longer exists.
+        """
+        UserModel = get_user_model()
+        try:
+            return UserModel.objects.get(pk=user_id)
+        except UserModel.DoesNotExist:
+            msg = _("Unable to identify user")
+            raise exceptions.AuthenticationFailed(msg)
+
     def get_auth_user(self, token):
         """
         Retrieves the authenticated user based on the provided token.
@@ -203,8 +311,33 @@ class JWtAuthentication(BaseAuthentication):
             msg = _("Invalid token or signature.")
             raise exceptions.AuthenticationFailed(msg)
 
+    @classmethod
+    def load_public_key_pem(cls, path):
+        """
+        Returns the public key of a PEM file, loaded once per process.
+
+        The key is reloaded when the modification time of the file changes,
+        in which case the verified tokens are also discarded since they
+        might have been signed with a rotated key.
+
+        Args:
+            path (str): The path to the PEM file.
+
+        Returns:
+            str: The public key in PEM format.
+        """
+        mtime = os.stat(path).st_mtime_ns
+        cached = _public_keys.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        key = cls.read_public_key_pem(path)
+        if cached:
+            verified_tokens.clear()
+        _public_keys[path] = (mtime, key)
+        return key
+
     @staticmethod
-    def load_public_key_pem(path):
+    def read_public_key_pem(path):
         """
         Load a public key from a PEM file.
 
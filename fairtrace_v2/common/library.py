@@ -28,12 +28,12 @@ from django.utils import translation
 from django.utils.crypto import get_random_string
 from django.utils.timezone import localtime
 from django.utils.translation import gettext as _
-from hashids import Hashids
 from pytz import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from tabulate import tabulate
 
+from . import codec
 from .exceptions import BadRequest
 
 prev_time_log = int(time() * 100000)
@@ -310,14 +310,7 @@ def _encode(value):
     Returns:
         hashed string.
     """
-    hasher = Hashids(
-        min_length=settings.HASHHID_MIN_LENGTH, salt=settings.HASHHID_SALT
-    )
-    try:
-        value = int(value)
-        return hasher.encode(value)
-    except Exception:
-        return None
+    return codec.encode(value)
 
 
 def hash_dict(dictionary):
@@ -334,6 +327,25 @@ def hash_dict(dictionary):
     return hash_value
 
 
+def hash_fingerprint(*values):
+    """Function to hash identity values into a fingerprint.
+
+    The values are compared without case and surrounding spaces, and None
+    is hashed as an empty value, so that the fingerprint only narrows down
+    the possible duplicates, which are then compared exactly.
+
+    Input Params:
+        values: values identifying an object
+    Returns:
+        hashed string.
+    """
+    normalized = "|".join(
+        "" if value is None else str(value).strip().lower()
+        for value in values
+    )
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+
 def encode(value):
     """Making function public."""
     return _encode(value)
@@ -347,13 +359,7 @@ def _decode(value):
     Returns:
         int value.
     """
-    hasher = Hashids(
-        min_length=settings.HASHHID_MIN_LENGTH, salt=settings.HASHHID_SALT
-    )
-    try:
-        return hasher.decode(value)[0]
-    except Exception:
-        return None
+    return codec.decode(value)
 
 
 def decode(value):
@@ -417,12 +423,7 @@ def _decode_list(items):
     """To decode a list of items."""
     if type(items) != list:
         return []
-    data = []
-    for item in items:
-        item = _decode(item)
-        if item:
-            data.append(item)
-    return data
+    return [item for item in codec.decode_many(items) if item]
 
 
 def _anonymise_email(email):
@@ -1,5 +1,7 @@
 """Models commonly used in all apps."""
+from django.db import connection
 from django.db import models
+from django.db.models.expressions import RawSQL
 from rest_framework.exceptions import ValidationError
 
 
@@ -99,67 +101,169 @@ class GraphModel(models.Model):
         """To remove a child."""
         child.remove_parent(self)
 
-    def get_descendants(self, include_self=False):
-        """Gets all children and their children recursively."""
-        descendants_set = self.children.all().order_by("-id").distinct("id")
-        for child in self.children.all():
-            grand_children = child.get_descendants()
-            descendants_set |= grand_children
-        if include_self:
-            descendants_set |= (
-                self.__class__.objects.filter(id=self.id)
-                .order_by("-id")
-                .distinct("id")
+    @classmethod
+    def _graph_edges(cls):
+        """Returns the edge table and its (child, parent) columns."""
+        field = cls._meta.get_field("parents")
+        return (
+            field.m2m_db_table(),
+            field.m2m_column_name(),
+            field.m2m_reverse_name(),
+        )
+
+    def _graph_query(
+        self, ancestors=True, include_self=False, batches=None, max_depth=None
+    ):
+        """Builds a recursive CTE that walks the graph from this node.
+
+        The whole traversal is resolved by the database, replacing the
+        per-node recursion that issued one query for every visited node.
+
+        Args:
+            ancestors(bool)     : Walk towards parents if True, else towards
+                                  children.
+            include_self(bool)  : Include the starting node in the result.
+            batches(qs)         : Batches to prune ancestors with. At every
+                                  level, only parents whose result batch is
+                                  in the corresponding level of the batch
+                                  graph are followed.
+            max_depth(int)      : Maximum number of hops to walk.
+        Returns:
+            (sql, params) selecting the ids of the reachable nodes.
+        """
+        table, child_col, parent_col = self._graph_edges()
+        if ancestors:
+            from_col, to_col = child_col, parent_col
+        else:
+            from_col, to_col = parent_col, child_col
+
+        ctes, params, conditions = [], [], []
+        batch_ids = (
+            list(batches.values_list("id", flat=True)) if batches else []
+        )
+        track_depth = bool(batch_ids) or max_depth is not None
+
+        if batch_ids:
+            batch_model = batches.model
+            batch_field = batch_model._meta.get_field("parents")
+            source_col = self._meta.get_field("result_batches").field.column
+            batch_limit = ""
+            if max_depth is not None:
+                batch_limit = "WHERE bl.depth < %s"
+            ctes.append(
+                f"""batch_levels(id, depth) AS (
+                    SELECT id, 0 FROM "{batch_model._meta.db_table}"
+                    WHERE id = ANY(%s)
+                    UNION
+                    SELECT bp."{batch_field.m2m_reverse_name()}", bl.depth + 1
+                    FROM "{batch_field.m2m_db_table()}" bp
+                    JOIN batch_levels bl
+                    ON bp."{batch_field.m2m_column_name()}" = bl.id
+                    {batch_limit}
+                )"""
+            )
+            params.append(batch_ids)
+            if max_depth is not None:
+                params.append(max_depth)
+            # Like the recursive implementation, no parent is followed once
+            # the batch graph runs out of levels.
+            conditions.append(
+                f"""EXISTS (
+                    SELECT 1 FROM "{batch_model._meta.db_table}" b
+                    JOIN batch_levels bl ON bl.id = b.id
+                    WHERE b."{source_col}" = edge."{to_col}"
+                    AND bl.depth = graph.depth + 1
+                )"""
             )
-        return descendants_set
+        if max_depth is not None:
+            conditions.append("graph.depth < %s")
+
+        if track_depth:
+            columns, seed, step = "id, depth", "%s, 0", ", graph.depth + 1"
+        else:
+            columns, seed, step = "id", "%s", ""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        ctes.append(
+            f"""graph({columns}) AS (
+                SELECT {seed}
+                UNION
+                SELECT edge."{to_col}"{step}
+                FROM "{table}" edge
+                JOIN graph ON edge."{from_col}" = graph.id
+                {where}
+            )"""
+        )
+        params.append(self.pk)
+        if max_depth is not None:
+            params.append(max_depth)
+
+        sql = "WITH RECURSIVE %s SELECT DISTINCT id FROM graph" % ", ".join(
+            ctes
+        )
+        if not include_self:
+            sql += " WHERE id <> %s"
+            params.append(self.pk)
+        return sql, params
 
-    def get_ancestors(self, include_self=False, batches=None):
+    def _graph_queryset(self, **kwargs):
+        """Returns a lazy queryset over the nodes reached by _graph_query."""
+        sql, params = self._graph_query(**kwargs)
+        return (
+            self.__class__.objects.filter(id__in=RawSQL(sql, params))
+            .order_by("-id")
+            .distinct("id")
+        )
+
+    def _graph_ids(self, **kwargs):
+        """Returns the set of node ids reached by _graph_query."""
+        sql, params = self._graph_query(**kwargs)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def get_descendants(self, include_self=False, max_depth=None):
+        """Gets all children and their children recursively."""
+        return self._graph_queryset(
+            ancestors=False, include_self=include_self, max_depth=max_depth
+        )
+
+    def get_ancestors(self, include_self=False, batches=None, max_depth=None):
         """Gets all parents and their parents recursively."""
-        filters, source_batches = {}, None
-        if batches:
-            source_batches = batches.parents()
-            filters = {"result_batches__in": source_batches}
-            
-        ancestors_set = self.parents.filter(
-            **filters).order_by("-id").distinct("id")
-        for parent in self.parents.filter(**filters):
-            grand_parent = parent.get_ancestors(batches=source_batches)
-            ancestors_set |= grand_parent
-        if include_self:
-            ancestors_set |= (
-                self.__class__.objects.filter(id=self.id)
-                .order_by("-id")
-                .distinct("id")
-            )
-        return ancestors_set
+        return self._graph_queryset(
+            ancestors=True,
+            include_self=include_self,
+            batches=batches,
+            max_depth=max_depth,
+        )
+
+    def get_descendant_ids(self, include_self=False, max_depth=None):
+        """Returns ids of all descendants in a single query."""
+        return self._graph_ids(
+            ancestors=False, include_self=include_self, max_depth=max_depth
+        )
+
+    def get_ancestor_ids(
+        self, include_self=False, batches=None, max_depth=None
+    ):
+        """Returns ids of all ancestors in a single query."""
+        return self._graph_ids(
+            ancestors=True,
+            include_self=include_self,
+            batches=batches,
+            max_depth=max_depth,
+        )
 
     def get_leaf_nodes(self):
         """Gets the ending nodes."""
-        leaf_nodes = self.__class__.objects.none()
-        children = self.children.all().order_by("-id").distinct("id")
-        if not children:
-            return (
-                self.__class__.objects.filter(id=self.id)
-                .order_by("-id")
-                .distinct("id")
-            )
-        for child in children:
-            leaf_nodes |= child.get_leaf_nodes()
-        return leaf_nodes
+        return self.get_descendants(include_self=True).filter(
+            children__isnull=True
+        )
 
     def get_root_nodes(self):
         """Gets the starting nodes."""
-        root_nodes = self.__class__.objects.none()
-        parents = self.parents.all().order_by("-id").distinct("id")
-        if not parents:
-            return (
-                self.__class__.objects.filter(id=self.id)
-                .order_by("-id")
-                .distinct("id")
-            )
-        for parent in parents:
-            root_nodes |= parent.get_root_nodes()
-        return root_nodes
+        return self.get_ancestors(include_self=True).filter(
+            parents__isnull=True
+        )
 
     def is_island(self):
         """Check if node is separated from the rest of the graph."""
@@ -170,5 +274,5 @@ class GraphModel(models.Model):
         """Checks that the object is not an ancestor, avoid self links."""
         if parent == child:
             raise ValidationError("Self links are not allowed.")
-        if child in parent.get_ancestors():
+        if child.pk in parent.get_ancestor_ids():
             raise ValidationError("The object is an ancestor.")
@@ -0,0 +1,51 @@
+import time
+
+from common.library import decode
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from v2.supply_chains.models import Node
+
+
+class Command(BaseCommand):
+    """Benchmarks supplier and buyer chain mapping of a node.
+
+    The chains are mapped repeatedly in fast mode and in detailed mode,
+    which also returns the parent, managers, labels and tags of every
+    connection, and the average latency is reported. Run it against a node
+    with a large chain (eg: 5k actors) before and after changes to the
+    graph queries to compare.
+
+    Usage:
+    python manage.py benchmark_chain_mapping <node idencode> --runs 5
+    """
+
+    help = "Benchmark supplier/buyer chain mapping of a node"
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("node", type=str)
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        """Map the chains and report the average latency."""
+        try:
+            node = Node.objects.get(id=decode(options["node"]))
+        except Node.DoesNotExist:
+            raise CommandError("Node does not exist.")
+        runs = options["runs"]
+        for name in ("get_supplier_chain", "get_buyer_chain"):
+            for fast_mode in (True, False):
+                elapsed = 0
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    chain, tier_data = getattr(node, name)(fast_mode=fast_mode)
+                    elapsed += time.perf_counter() - start
+                self.stdout.write(
+                    "%-20s %-8s %6d actors %10.1f ms"
+                    % (
+                        name,
+                        "fast" if fast_mode else "detailed",
+                        len(tier_data),
+                        elapsed / runs * 1000,
+                    )
+                )
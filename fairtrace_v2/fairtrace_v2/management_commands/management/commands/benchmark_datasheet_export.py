@@ -0,0 +1,73 @@
+import datetime
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from v2.reports.generators import ExternalTransactionDataSheet
+
+
+class Command(BaseCommand):
+    """Benchmarks writing of data sheets.
+
+    Synthetic rows with the columns of the external transaction export are
+    written with the streaming and the in-memory writer, and the time and
+    the peak memory traced during each write are reported. The database is
+    not used, so this measures the sheet writing alone.
+
+    Usage:
+    python manage.py benchmark_datasheet_export --rows 10000 100000 500000
+    """
+
+    help = "Benchmark streaming vs in-memory data sheet export"
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            "--rows", type=int, nargs="+", default=[10000, 100000, 500000]
+        )
+        parser.add_argument(
+            "--skip-in-memory",
+            action="store_true",
+            help="Only benchmark the streaming writer.",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmarks for every row count."""
+        modes = [True] if options["skip_in_memory"] else [True, False]
+        for count in options["rows"]:
+            for streaming in modes:
+                self._run(count, streaming)
+
+    @staticmethod
+    def _rows(count):
+        """Yields synthetic rows."""
+        fields = ExternalTransactionDataSheet.Meta.field_map.keys()
+        now = datetime.datetime.now()
+        for index in range(count):
+            row = dict.fromkeys(fields, f"value {index}")
+            row["Quantity"] = index * 1.5
+            row["Date"] = now
+            yield row
+
+    def _run(self, count, streaming):
+        """Writes a sheet and reports the time and peak memory."""
+        data_sheet = ExternalTransactionDataSheet()
+        data_sheet.streaming = streaming
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            data_sheet.write_sheet(self._rows(count))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            data_sheet.close()
+        self.stdout.write(
+            "%8d rows  %-9s %9.1f s %9.1f MB peak"
+            % (
+                count,
+                "streaming" if streaming else "in-memory",
+                elapsed,
+                peak / 2**20,
+            )
+        )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from common import codec
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from hashids import Hashids
+
+
+def _encode_per_call(value):
+    """Encoding as it was done before the shared codec."""
+    hasher = Hashids(
+        min_length=settings.HASHHID_MIN_LENGTH, salt=settings.HASHHID_SALT
+    )
+    return hasher.encode(int(value))
+
+
+class Command(BaseCommand):
+    """Benchmarks encoding and decoding of ids.
+
+    Ids are drawn with repetition from a smaller pool, as in serialized
+    lists where the same related objects appear on many rows. Encoding with
+    a new Hashids object per call is compared with the shared codec, cold
+    and warm, and with encode_many/decode_many.
+
+    Usage:
+    python manage.py benchmark_idencode --count 1000000 --distinct 50000
+    """
+
+    help = "Benchmark idencode/iddecode implementations"
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("--count", type=int, default=1000000)
+        parser.add_argument("--distinct", type=int, default=50000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Run the benchmarks."""
+        random.seed(options["seed"])
+        pool = random.sample(range(1, 10**7), options["distinct"])
+        ids = [random.choice(pool) for _ in range(options["count"])]
+
+        baseline = self._time(
+            "Hashids per call", lambda: [_encode_per_call(i) for i in ids]
+        )
+        codec._encode_int.cache_clear()
+        self._time(
+            "codec.encode (cold)", lambda: [codec.encode(i) for i in ids]
+        )
+        self._time(
+            "codec.encode (warm)", lambda: [codec.encode(i) for i in ids]
+        )
+        encoded = self._time(
+            "codec.encode_many", lambda: codec.encode_many(ids)
+        )
+        codec._decode_str.cache_clear()
+        decoded = self._time(
+            "codec.decode_many", lambda: codec.decode_many(encoded)
+        )
+        if encoded != baseline or decoded != ids:
+            raise CommandError("Codec results differ from Hashids.")
+
+    def _time(self, name, func):
+        """Times a function and returns its result."""
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "%-22s %9.1f ms %10.0f ids/s"
+            % (name, elapsed * 1000, len(result) / elapsed)
+        )
+        return result
@@ -0,0 +1,108 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction as db_transaction
+from django.test.utils import CaptureQueriesContext
+from v2.transactions.models import Transaction
+
+
+class _Rollback(Exception):
+    """Raised to discard the synthetic graph after benchmarking."""
+
+
+class Command(BaseCommand):
+    """Benchmarks traversal of the transaction graph.
+
+    A synthetic, layered transaction DAG is created inside a database
+    transaction, the graph methods of the leaf transaction are timed along
+    with the number of queries they issue, and everything is rolled back
+    afterwards.
+
+    Usage:
+    python manage.py benchmark_transaction_graph --nodes 10000 --layers 20
+    """
+
+    help = "Benchmark transaction graph traversal on a synthetic DAG"
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("--nodes", type=int, default=10000)
+        parser.add_argument("--layers", type=int, default=20)
+        parser.add_argument("--max-parents", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Build the graph, run the benchmarks and roll back."""
+        random.seed(options["seed"])
+        try:
+            with db_transaction.atomic():
+                leaf = self._build_graph(
+                    options["nodes"],
+                    options["layers"],
+                    options["max_parents"],
+                )
+                self._run(leaf)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _build_graph(self, nodes, layers, max_parents):
+        """Creates a layered DAG and returns a leaf below all of it."""
+        width = max(nodes // layers, 1)
+        Edge = Transaction.parents.through
+        previous, edge_count = [], 0
+        for _ in range(layers):
+            layer = Transaction.objects.bulk_create(
+                [Transaction() for _ in range(width)]
+            )
+            edges = []
+            for txn in layer if previous else []:
+                for parent in random.sample(
+                    previous, min(max_parents, len(previous))
+                ):
+                    edges.append(
+                        Edge(from_transaction=txn, to_transaction=parent)
+                    )
+            Edge.objects.bulk_create(edges, batch_size=5000)
+            edge_count += len(edges)
+            previous = layer
+        leaf = Transaction.objects.create()
+        Edge.objects.bulk_create(
+            [Edge(from_transaction=leaf, to_transaction=p) for p in previous]
+        )
+        self.stdout.write(
+            "Created %d transactions with %d edges."
+            % (width * layers + 1, edge_count + len(previous))
+        )
+        return leaf
+
+    def _run(self, leaf):
+        """Times each graph method of the leaf transaction."""
+        root = leaf.get_root_nodes().first()
+        benchmarks = (
+            ("get_ancestors", lambda: list(leaf.get_ancestors())),
+            ("get_ancestor_ids", lambda: leaf.get_ancestor_ids()),
+            (
+                "get_parent_transactions",
+                lambda: list(leaf.get_parent_transactions()),
+            ),
+            ("get_root_nodes", lambda: list(leaf.get_root_nodes())),
+            ("get_descendants (root)", lambda: list(root.get_descendants())),
+            ("get_leaf_nodes (root)", lambda: list(root.get_leaf_nodes())),
+            (
+                "circular_checker",
+                lambda: Transaction.circular_checker(root, leaf),
+            ),
+        )
+        for name, func in benchmarks:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                result = func()
+                elapsed = time.perf_counter() - start
+            count = len(result) if result is not None else "-"
+            self.stdout.write(
+                "%-26s %8.1f ms %4d queries  %s rows"
+                % (name, elapsed * 1000, len(queries), count)
+            )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from v2.transactions import lineage
+
+
+class Command(BaseCommand):
+    """Checks the transaction lineage closure table against the parents
+    m2m.
+
+    Every range of transaction ids is recomputed from the live m2m and
+    compared with the stored rows, including their depth. The command
+    fails if any range is inconsistent, so it can be used as a periodic
+    check.
+
+    Usage:
+    python manage.py check_transaction_lineage --chunk-size 5000
+    """
+
+    help = "Check the transaction lineage closure table for consistency"
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        """Compare every range and report the inconsistent ones."""
+        inconsistent = 0
+        for result in lineage.check(options["chunk_size"]):
+            if result["missing"] or result["extra"]:
+                inconsistent += 1
+                self.stdout.write(
+                    self.style.WARNING(
+                        "{start}-{end}: {missing} missing, "
+                        "{extra} extra".format(**result)
+                    )
+                )
+        if inconsistent:
+            raise CommandError(
+                f"{inconsistent} ranges are inconsistent, run "
+                "rebuild_transaction_lineage."
+            )
+        self.stdout.write(self.style.SUCCESS("Lineage is consistent."))
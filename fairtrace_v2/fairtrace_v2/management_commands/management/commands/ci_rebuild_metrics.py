@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+from v2.dashboard.cache_handlers import get_ci_rebuild_metrics
+
+
+class Command(BaseCommand):
+    """Prints the metrics of the consumer interface cache rebuild queue.
+
+    These are the number of pending rebuilds, the number of requested,
+    merged, superseded and completed rebuilds, and the percentiles of the
+    latency from the first request of a rebuild to its completion.
+
+    Usage:
+    python manage.py ci_rebuild_metrics
+    """
+
+    help = "Print the metrics of the CI cache rebuild queue"
+
+    def handle(self, *args, **options):
+        """Print the metrics as JSON."""
+        self.stdout.write(json.dumps(get_ci_rebuild_metrics(), indent=4))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from v2.transactions import lineage
+
+
+class Command(BaseCommand):
+    """Rebuilds the transaction lineage closure table from scratch.
+
+    The table is truncated and refilled in bulk from the parents m2m, one
+    range of transaction ids at a time. Lineage reads should be disabled
+    (TRANSACTION_LINEAGE_ENABLED) while this runs.
+
+    Usage:
+    python manage.py rebuild_transaction_lineage --chunk-size 5000
+    """
+
+    help = "Rebuild the transaction lineage closure table"
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        """Rebuild the table, reporting progress per range."""
+        total = 0
+        for start, end, rows in lineage.rebuild(options["chunk_size"]):
+            total += rows
+            self.stdout.write(f"{start}-{end}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(f"Stored {total} rows."))
@@ -203,9 +203,13 @@ CACHES = {
         "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
         "KEY_PREFIX": "fairtrace_v2_django",
     },
+    # Operational cache of the consumer interface and connection maps. The
+    # alias is kept from when it was file based.
     "filesystem": {
-        "BACKEND": "common.cache.FileBasedCacheOperational",
-        "LOCATION": "/var/tmp/django_cache",
+        "BACKEND": "common.cache.RedisCacheOperational",
+        "LOCATION": f"{REDIS_URL}:{REDIS_PORT}/2",
+        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        "KEY_PREFIX": "fairtrace_v2_operational",
         "TIMEOUT": None,
     },
 }
@@ -321,7 +325,15 @@ CELERY_BEAT_SCHEDULE = {
     "validate_and_initiate_guardian_claim": {
         "task": "validate_and_initiate_guardian_claim",
         "schedule": crontab(hour=23, minute=0)
-    }
+    },
+    "resume-exports": {
+        "task": "resume_exports",
+        "schedule": crontab(minute="*/10"),
+    },
+    "resume-bulk-uploads": {
+        "task": "resume_bulk_uploads",
+        "schedule": crontab(minute="*/10"),
+    },
 }
 CELERY_DEFAULT_QUEUE = "low"
 CELERY_ROUTES = {
@@ -370,6 +382,51 @@ CONSUMER_INTERFACE_V2_URL = config.get("app", "CI_URL", fallback=None)
 
 CACHALOT_ONLY_CACHABLE_APPS = ("supply_chains", "transactions")
 
+# Serve transaction lineage lookups from the closure table. Enable only
+# after backfilling it with `manage.py rebuild_transaction_lineage`.
+TRANSACTION_LINEAGE_ENABLED = config.getboolean(
+    "app", "TRANSACTION_LINEAGE_ENABLED", fallback=False
+)
+
+# Seconds a consumer interface cache rebuild waits for further requests,
+# and the longest it can be postponed by them.
+CI_REBUILD_DEBOUNCE = config.getint("app", "CI_REBUILD_DEBOUNCE", fallback=30)
+CI_REBUILD_MAX_WAIT = config.getint("app", "CI_REBUILD_MAX_WAIT", fallback=300)
+
+# Rows of an export generated by a single task, and the seconds after which
+# a shard or merge without progress is considered interrupted and resumed.
+EXPORT_SHARD_SIZE = config.getint("app", "EXPORT_SHARD_SIZE", fallback=20000)
+EXPORT_SHARD_TIMEOUT = config.getint(
+    "app", "EXPORT_SHARD_TIMEOUT", fallback=1800
+)
+
+# Rows of a data sheet upload committed in a single transaction, and the
+# seconds after which a pending chunk is considered interrupted and resumed.
+BULK_UPLOAD_CHUNK_SIZE = config.getint(
+    "app", "BULK_UPLOAD_CHUNK_SIZE", fallback=500
+)
+BULK_UPLOAD_CHUNK_TIMEOUT = config.getint(
+    "app", "BULK_UPLOAD_CHUNK_TIMEOUT", fallback=1800
+)
+
+# Seconds after which a queued recompute of the dashboard stats of a node
+# that did not complete no longer prevents queueing another one.
+NODE_STATS_RELOAD_TIMEOUT = config.getint(
+    "app", "NODE_STATS_RELOAD_TIMEOUT", fallback=1800
+)
+
+# Threads computing the stats of the supply chains of a node concurrently.
+NODE_STATS_WORKERS = config.getint("app", "NODE_STATS_WORKERS", fallback=4)
+
+# Seconds a connection map is cached for, and the longest a request waits
+# for the map being built by another request.
+CONNECTION_MAP_CACHE_TIMEOUT = config.getint(
+    "app", "CONNECTION_MAP_CACHE_TIMEOUT", fallback=86400
+)
+CONNECTION_MAP_LOCK_TIMEOUT = config.getint(
+    "app", "CONNECTION_MAP_LOCK_TIMEOUT", fallback=30
+)
+
 GOOGLE_OAUTH2_CLIENT_ID = config.get("libs", "GOOGLE_OAUTH2_CLIENT_ID")
 GOOGLE_OAUTH2_CLIENT_SECRET = config.get("libs", "GOOGLE_OAUTH2_CLIENT_SECRET")
 
@@ -380,6 +437,13 @@ TRACE_OAUTH2_CLIENT_SECRET = config.get(
     "libs", "TRACE_OAUTH2_CLIENT_SECRET")
 TRACE_OAUTH2_BASE_URL = ROOT_URL + '/o/oauth2/'
 
+# Verified JWTs are cached per process for at most this many seconds (and
+# never beyond their expiry), up to the given number of tokens.
+JWT_VERIFICATION_CACHE_TTL = config.getint(
+    "libs", "JWT_VERIFICATION_CACHE_TTL", fallback=60)
+JWT_VERIFICATION_CACHE_SIZE = config.getint(
+    "libs", "JWT_VERIFICATION_CACHE_SIZE", fallback=1024)
+
 ADMIN_FRONT_ROOT_URL = config.get("app", "ADMIN_FRONT_ROOT_URL")
 LOGIN_ROOT_URL = config.get("app", "LOGIN_ROOT_URL")
 
@@ -3,12 +3,12 @@ import json
 
 import requests
 from celery import shared_task
+from common import codec
 from Crypto.Cipher import AES
 from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from django.utils.safestring import mark_safe
-from hashids import Hashids
 from pygments import highlight
 from pygments.formatters import HtmlFormatter
 from pygments.lexers import JsonLexer
@@ -25,14 +25,7 @@ def encode(value):
     Returns:
         hashed string.
     """
-    hasher = Hashids(
-        min_length=settings.HASHHID_MIN_LENGTH, salt=settings.HASHHID_SALT
-    )
-    try:
-        value = int(value)
-        return hasher.encode(value)
-    except Exception:
-        return None
+    return codec.encode(value)
 
 
 def decode(value):
@@ -43,13 +36,7 @@ def decode(value):
     Returns:
         int value.
     """
-    hasher = Hashids(
-        min_length=settings.HASHHID_MIN_LENGTH, salt=settings.HASHHID_SALT
-    )
-    try:
-        return hasher.decode(value)[0]
-    except Exception:
-        return None
+    return codec.decode(value)
 
 
 def encrypt(message, encryption_key=settings.BLOCKCHAIN_ENCRYPTION_KEY):
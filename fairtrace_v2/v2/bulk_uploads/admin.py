@@ -3,6 +3,7 @@ from django.contrib import admin
 from v2.bulk_uploads.models import DataSheetTemplate, NodeDataSheetTemplates
 from v2.bulk_uploads.models import DataSheetTemplateField
 from v2.bulk_uploads.models.uploads import DataSheetUpload
+from v2.bulk_uploads.models.uploads import DataSheetUploadChunk
 
 
 class DataSheetTemplateFieldInline(admin.TabularInline):
@@ -12,6 +13,15 @@ class DataSheetTemplateFieldInline(admin.TabularInline):
     extra = 0
 
 
+class DataSheetUploadChunkInline(admin.TabularInline):
+    """In-line view function for DataSheetUploadChunk."""
+
+    model = DataSheetUploadChunk
+    fields = ("index", "status", "updated_on")
+    readonly_fields = fields
+    extra = 0
+
+
 class DataSheetTemplatedAdmin(BaseAdmin):
     """Customize Node documents admin."""
 
@@ -23,6 +33,7 @@ class DataSheetUploadAdmin(BaseAdmin):
 
     list_display = ("template", "node", "file", "idencode")
     autocomplete_fields = ("node",)
+    inlines = (DataSheetUploadChunkInline,)
 
 
 class NodeDataSheetTemplatesAdmin(BaseAdmin):
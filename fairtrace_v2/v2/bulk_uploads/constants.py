@@ -25,3 +25,16 @@ NODE_TEMPLATE_STATUS_CHOICES = (
     (NODE_TEMPLATE_STATUS_ACTIVE, "Active"),
     (NODE_TEMPLATE_STATUS_INACTIVE, "Inactive"),
 )
+
+UPLOAD_CHUNK_STATUS_PENDING = 1
+UPLOAD_CHUNK_STATUS_DONE = 2
+UPLOAD_CHUNK_STATUS_FAILED = 3
+
+UPLOAD_CHUNK_STATUS_CHOICES = (
+    (UPLOAD_CHUNK_STATUS_PENDING, "Pending"),
+    (UPLOAD_CHUNK_STATUS_DONE, "Done"),
+    (UPLOAD_CHUNK_STATUS_FAILED, "Failed"),
+)
+
+# Error of the rows of a chunk that could not be processed.
+UPLOAD_CHUNK_FAILED_ERROR = "The row could not be processed. Please try again."
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.6 on 2026-10-16 12:00
+
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bulk_uploads', '0017_datasheetupload_added_transactions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasheetupload',
+            name='cursor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='DataSheetUploadChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('index', models.PositiveIntegerField()),
+                ('rows', django.contrib.postgres.fields.jsonb.JSONField(default=list)),
+                ('status', models.IntegerField(choices=[(1, 'Pending'), (2, 'Done'), (3, 'Failed')], default=1)),
+                ('errors', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, null=True)),
+                ('creator', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='creator_datasheetuploadchunk_objects', to=settings.AUTH_USER_MODEL)),
+                ('updater', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updater_datasheetuploadchunk_objects', to=settings.AUTH_USER_MODEL)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='bulk_uploads.DataSheetUpload')),
+            ],
+            options={
+                'ordering': ('index',),
+                'unique_together': {('upload', 'index')},
+            },
+        ),
+    ]
@@ -7,9 +7,11 @@ from django.contrib.postgres import fields
 from django.db import models
 from rest_framework.exceptions import ValidationError
 
+from .. import constants
 from ...products import constants as product_const
 from . import DataSheetTemplate
 from .common import get_file_path
+from ..readers import SheetReader
 from v2.transactions.models import Transaction
 
 
@@ -42,6 +44,7 @@ class DataSheetUpload(AbstractBaseModel):
         is_confirmed (bool):  flag indicating whether the upload has been
             confirmed.
         added_transactions(m2m): Transactions added from the sheet
+        cursor (int): The number of chunks of the upload committed.
     """
 
     node = models.ForeignKey("supply_chains.Node", on_delete=models.CASCADE)
@@ -80,6 +83,7 @@ class DataSheetUpload(AbstractBaseModel):
         Transaction,
         related_name="datasheet_uploads"
     )
+    cursor = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"DataSheetUpload: {self.template.name} | {self.pk}"
@@ -90,19 +94,23 @@ class DataSheetUpload(AbstractBaseModel):
         This method is overridden to customize the save behavior of the
         DataSheetUpload model. It performs additional operations before saving
         the model instance. It checks if the instance is new or existing,
-        creates a file hash for the uploaded file, and converts the file data
-        to a dictionary format. Then, it calls the super() method to save the
-        instance.
+        converts the file data to a dictionary format while hashing the file,
+        and checks the hash for duplicate uploads. Then, it calls the super()
+        method to save the instance.
+
+        The file cannot be changed, so it is only read again if the template
+        defining its title and data rows is changed.
 
         Args:
             *args: Additional positional arguments to pass to the save method.
             **kwargs: Additional keyword arguments to pass to the save method.
         """
         self.new_instance = not self.pk
-        self.block_file_change()
-        self.create_file_hash(self.file,
-                              check_type=kwargs.pop("check_type", "is_used"))
-        self.file_to_dict()
+        old = self.block_file_change()
+        check_type = kwargs.pop("check_type", "is_used")
+        if not old or old.template_id != self.template_id:
+            self.file_to_dict()
+        self.check_file_hash(self.file_hash, check_type=check_type)
         self.update_template()
         super().save(*args, **kwargs)
 
@@ -125,25 +133,41 @@ class DataSheetUpload(AbstractBaseModel):
         """
         if self.file:
             file_hash = hash_file(file)
-            check = ({"is_confirmed": True}
-                     if check_type == "is_confirmed"
-                     else {"is_used": True})
-            uploads = self.__class__.objects.filter(
-                file_hash=file_hash, **check, node=self.node
-            )
-            if uploads.exists():
-                raise ValidationError(f"File already"
-                                      f" {check_type.split('_')[-1]}")
+            self.check_file_hash(file_hash, check_type=check_type)
             self.file_hash = file_hash
 
+    def check_file_hash(self, file_hash, check_type="is_used"):
+        """Check that no other upload of the node has the same file.
+
+        Args:
+            file_hash: The hash of the uploaded file.
+            check_type: check duplicate with 'is_used' or 'is_confirmed.'
+
+        Raises:
+            Exception: If a file already exists with the same file hash and
+            node.
+        """
+        if not file_hash:
+            return
+        check = ({"is_confirmed": True}
+                 if check_type == "is_confirmed"
+                 else {"is_used": True})
+        uploads = self.__class__.objects.filter(
+            file_hash=file_hash, **check, node=self.node
+        )
+        if uploads.exists():
+            raise ValidationError(f"File already"
+                                  f" {check_type.split('_')[-1]}")
+
     def file_to_dict(self):
         """Convert the uploaded file to a dictionary.
 
-        This method converts the uploaded file to a dataframe and then converts
-        the dataframe to a dictionary format.
+        This method reads the rows of the uploaded file in batches with a
+        SheetReader, hashing the file as it is read, and converts them to a
+        dictionary format.
         The supported file formats are CSV, Excel (XLSX), and JSON. The
         converted data is stored in the 'initial_data' attribute of the model
-        instance.
+        instance, and the hash of the file in 'file_hash'.
 
         Raises:
             Exception: If an invalid file format or an unrecognized file
@@ -151,39 +175,42 @@ class DataSheetUpload(AbstractBaseModel):
         """
         if not self.file:
             self.initial_data = {}
+            return
 
-        def format_file_df(f_df):
-            """Format the file dataframe, set the header row and data row."""
-            header_row = f_df.iloc[self.template.title_row]
-            f_df = f_df.iloc[self.template.data_row :]  # noqa
-            f_df = f_df.set_axis(header_row.str.strip(), axis=1)
-            return f_df
-
-        file = self.file._get_file()  # noqa
-        if self.file.name.endswith(".csv"):
-            df = pd.read_csv(file, header=None)
-            df = format_file_df(df)
-        elif self.file.name.endswith(".xlsx"):
-            df = pd.read_excel(file, header=None)
-            df = format_file_df(df)
-        elif self.file.name.endswith(".json"):
-            df = pd.read_json(file, orient="index")
-        else:
+        if self.file.name.endswith(".json"):
+            self.file_hash = hash_file(self.file)
+            self.file.seek(0)
+            df = pd.read_json(self.file._get_file(), orient="index")  # noqa
+            df.replace("\xa0", np.nan, inplace=True)
+            df.dropna(how="all", inplace=True)
+            df.fillna("", inplace=True)
+            self.initial_data = df.to_dict(orient="index")
+            return
+        if not self.file.name.endswith((".csv", ".xlsx")):
             raise Exception(
                 "Invalid file format. Unrecognized file " "extension."
             )
 
-        df.replace("\xa0", np.nan, inplace=True)
-        df.dropna(how="all", inplace=True)
-        df.fillna("", inplace=True)
-        self.initial_data = df.to_dict(orient="index")
+        reader = SheetReader(self.file,
+                             title_row=self.template.title_row,
+                             data_row=self.template.data_row)
+        initial_data = {}
+        for batch in reader.iter_batches():
+            initial_data.update(batch)
+        self.initial_data = initial_data
+        self.file_hash = reader.file_hash
 
     def block_file_change(self):
-        """Block file change if file already exists."""
-        if not self.new_instance:
-            old = self.__class__.objects.get(pk=self.pk)
-            if old.file != self.file:
-                raise Exception("Cannot change file")
+        """Block file change if file already exists.
+
+        Returns the saved instance, or None for a new instance.
+        """
+        if self.new_instance:
+            return None
+        old = self.__class__.objects.get(pk=self.pk)
+        if old.file != self.file:
+            raise Exception("Cannot change file")
+        return old
 
     def update_template(self):
         """
@@ -240,3 +267,39 @@ class DataSheetUploadSummary(AbstractBaseModel):
             f"DataSheetUploadSummary: "
             f"{self.upload.template.name} | {self.pk}"
         )
+
+
+class DataSheetUploadChunk(AbstractBaseModel):
+    """Model representing a chunk of the rows of a data sheet upload.
+
+    The rows of an upload are processed in chunks, each of them committed in
+    its own transaction, so that a failure or a restart of the worker only
+    affects the chunk being processed. Chunks are processed again until
+    they are done, which allows an interrupted upload to be resumed.
+
+    Attributes:
+        upload (DataSheetUpload): The related data sheet upload.
+        index (int): The position of the chunk in the upload.
+        rows (list): The keys of the rows of the chunk in the data.
+        status (int): The status of the chunk, chosen from
+            UPLOAD_CHUNK_STATUS_CHOICES.
+        errors (dict): The errors of the rows of the chunk.
+    """
+
+    upload = models.ForeignKey(
+        DataSheetUpload, on_delete=models.CASCADE, related_name="chunks"
+    )
+    index = models.PositiveIntegerField()
+    rows = fields.JSONField(default=list)
+    status = models.IntegerField(
+        choices=constants.UPLOAD_CHUNK_STATUS_CHOICES,
+        default=constants.UPLOAD_CHUNK_STATUS_PENDING,
+    )
+    errors = fields.JSONField(default=dict, null=True, blank=True)
+
+    class Meta:
+        ordering = ("index",)
+        unique_together = ("upload", "index")
+
+    def __str__(self):
+        return f"DataSheetUploadChunk: {self.upload_id} | {self.index}"
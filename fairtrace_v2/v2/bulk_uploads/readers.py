@@ -0,0 +1,178 @@
+"""Streaming readers for uploaded data sheets.
+
+Reading a sheet with pandas loads every row of the file, and a DataFrame
+of it, before anything is done with the data, and the file is read again
+to compute its hash. The readers here go through the rows of the file one
+at a time, with openpyxl in read-only mode for XLSX files and the csv
+module for CSV files, and yield them in batches, so that memory does not
+grow with the size of the file beyond the data kept by the caller.
+
+The rows are read as pandas would with `read_excel`/`read_csv` and
+`header=None`, so that the data is the same as with the DataFrame. With
+`header=None` the title row is read as data, so every column of a CSV file
+with a title holds text and pandas keeps all of its values as strings, as
+the csv module does. Cells of XLSX files keep their types.
+"""
+import csv
+import hashlib
+import io
+from itertools import zip_longest
+
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+
+BATCH_SIZE = 1000
+
+# Values read as missing: the default 'na_values' of pandas, and the
+# non-breaking space replaced with NaN after reading the DataFrame.
+NA_VALUES = {
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+    "\xa0",
+}
+
+
+class HashingFile(io.RawIOBase):
+    """Binary file wrapper computing the md5 hash of the bytes read."""
+
+    def __init__(self, file):
+        """Initialize with the file to read."""
+        self.file = file
+        self.md5 = hashlib.md5()
+
+    def readable(self):
+        """The wrapper is only read."""
+        return True
+
+    def readinto(self, buffer):
+        """Reads from the file into the buffer and updates the hash."""
+        data = self.file.read(len(buffer))
+        buffer[: len(data)] = data
+        self.md5.update(data)
+        return len(data)
+
+    def hexdigest(self):
+        """Returns the hash of the bytes read so far."""
+        return self.md5.hexdigest()
+
+
+class SheetReader:
+    """Reads the rows of an uploaded data sheet in batches.
+
+    The row at 'title_row' is the header of the sheet, and rows are read
+    from 'data_row' as dictionaries of the values by the stripped header.
+    Empty rows are skipped, and missing values are read as "". Values of
+    CSV files are read as strings, see the module docstring.
+
+    CSV files are hashed while they are read. XLSX files are zip archives,
+    which are read from the end, so they are hashed in a separate streamed
+    read of the file before the rows are read.
+    """
+
+    def __init__(self, file, title_row=0, data_row=1, batch_size=BATCH_SIZE):
+        """Initialize with the Django file and the rows of the template."""
+        self.file = file
+        self.title_row = title_row
+        self.data_row = data_row
+        self.batch_size = batch_size
+        self.file_hash = None
+
+    @property
+    def is_csv(self):
+        """Whether the file is a CSV file."""
+        return self.file.name.endswith(".csv")
+
+    def _iter_xlsx_rows(self):
+        """Yields the values of the rows of the first sheet of the file."""
+        md5 = hashlib.md5()
+        self.file.open("rb")
+        for chunk in self.file.chunks():
+            md5.update(chunk)
+        self.file_hash = md5.hexdigest()
+        self.file.seek(0)
+        workbook = load_workbook(
+            self.file, read_only=True, data_only=True, keep_links=False
+        )
+        sheet = workbook.worksheets[0]
+        # The dimension stored in the sheet is often wrong, and read-only
+        # sheets only read the cells within it.
+        sheet.reset_dimensions()
+        try:
+            for row in sheet.iter_rows(values_only=True):
+                yield [self._convert_xlsx_value(value) for value in row]
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _convert_xlsx_value(value):
+        """Converts a cell value as pandas does with openpyxl."""
+        if isinstance(value, str) and value in ERROR_CODES:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def _iter_csv_rows(self):
+        """Yields the values of the rows of the file, hashing it."""
+        self.file.open("rb")
+        self.file.seek(0)
+        hashing_file = HashingFile(self.file)
+        text = io.TextIOWrapper(
+            io.BufferedReader(hashing_file), encoding="utf-8-sig", newline=""
+        )
+        yield from csv.reader(text)
+        self.file_hash = hashing_file.hexdigest()
+
+    def iter_rows(self):
+        """Yields the values of the rows of the file."""
+        if self.is_csv:
+            return self._iter_csv_rows()
+        return self._iter_xlsx_rows()
+
+    @staticmethod
+    def _is_missing(value):
+        """Whether a value is read as missing."""
+        return value is None or (isinstance(value, str) and value in NA_VALUES)
+
+    def iter_batches(self):
+        """Yields the data rows of the file, by row index, in batches."""
+        header = []
+        batch = {}
+        for index, row in enumerate(self.iter_rows()):
+            if index == self.title_row:
+                header = [
+                    value.strip() if isinstance(value, str) else None
+                    for value in row
+                ]
+            if index < self.data_row:
+                continue
+            values = {}
+            for column, value in zip_longest(header, row):
+                if column is None:
+                    continue
+                values[column] = "" if self._is_missing(value) else value
+            if not any(value != "" for value in values.values()):
+                continue
+            batch[index] = values
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = {}
+        if batch:
+            yield batch
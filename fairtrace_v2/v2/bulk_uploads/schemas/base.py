@@ -28,6 +28,20 @@ class BaseUploadSchema(pa.DataFrameModel):
         """
         return df
 
+    @classmethod
+    def clean_df(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean the validated dataframe.
+
+        This class method normalises the columns of the validated rows for
+        the serializers creating them, on the whole dataframe at once. The
+        rows are stored as they are validated, since they are edited and
+        validated again, and cleaned when they are uploaded.
+
+        Returns:
+            pa.DataFrame: The cleaned dataframe.
+        """
+        return df
+
     @classmethod
     def get_schema_metadata(cls):
         """Get the metadata of the schema class.
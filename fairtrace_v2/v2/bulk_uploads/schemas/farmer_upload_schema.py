@@ -1,5 +1,6 @@
 from typing import Any, Dict, Optional
 
+import numpy as np
 import pandas as pd
 import pandera as pa
 from common.country_data import COUNTRY_WITH_PROVINCE
@@ -105,6 +106,42 @@ class FarmerUploadSchema(BaseUploadSchema):
     def format_df(cls, df: pd.DataFrame) -> pd.DataFrame:
         return df
 
+    @classmethod
+    def clean_df(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean the validated dataframe.
+
+        The country code is added to the phone numbers, the dial code being
+        taken from drop-down values like "Netherlands (+31)". Coordinates
+        that are not set and family members are set as missing and whole
+        numbers.
+        """
+        if "country_code" in df:
+            codes = df.pop("country_code").fillna("").astype(str)
+            if "phone" in df:
+                dial_codes = codes.str.extract(
+                    r"\((\+\d+)\)", expand=False
+                ).fillna(codes)
+                codes = codes.where(codes.str.startswith("+"), dial_codes)
+                with_code = (codes != "") & df["phone"].notna()
+                df.loc[with_code, "phone"] = codes[with_code] + df.loc[
+                    with_code, "phone"
+                ].astype(str)
+        for column in ("latitude", "longitude"):
+            if column in df:
+                df[column] = df[column].where(
+                    df[column].notna() & df[column].astype(bool)
+                )
+        if "family_members" in df:
+            family_members = pd.to_numeric(
+                df["family_members"], errors="coerce"
+            )
+            df["family_members"] = (
+                np.trunc(family_members.where(family_members != 0))
+                .astype("Int64")
+                .astype(object)
+            )
+        return df
+
     @classmethod
     def set_identification_no(cls, node: Node, supply_chain: SupplyChain):
         ids = (
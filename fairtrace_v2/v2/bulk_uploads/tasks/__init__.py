@@ -1,9 +1,19 @@
+from datetime import timedelta
+
 from celery import shared_task
 from django.apps import apps
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
 from sentry_sdk import capture_exception
 
 from v2.bulk_templates.constants import (TEMPLATE_TYPE_TXN,
                                          TEMPLATE_TYPE_CONNECTION)
+from v2.bulk_uploads.constants import (UPLOAD_CHUNK_FAILED_ERROR,
+                                       UPLOAD_CHUNK_STATUS_DONE,
+                                       UPLOAD_CHUNK_STATUS_FAILED,
+                                       UPLOAD_CHUNK_STATUS_PENDING)
 from v2.bulk_uploads.tasks.bulk_connection_adaptors import (
     BulkConnectionAdapter, )
 from v2.bulk_uploads.tasks.bulk_trace_adapters import BulkTraceAdapter
@@ -11,14 +21,83 @@ from v2.bulk_uploads.tasks.bulk_transaction_adapters import (
     BulkTransactionAdapter, )
 
 
+def get_adapter_class(data_sheet):
+    """
+    Return the adapter class for the template of the data sheet.
+
+    Parameters:
+    data_sheet (DataSheetUpload): The data sheet upload.
+
+    Returns:
+    type: The adapter class, or None if the template type is not supported.
+    """
+    # Determine the appropriate adapter based on the template type
+    adapter_mapping = {
+        TEMPLATE_TYPE_TXN: BulkTransactionAdapter,
+        TEMPLATE_TYPE_CONNECTION: BulkConnectionAdapter,
+        # Add more mappings as needed
+    }
+
+    if data_sheet.template.is_system_template:
+        return BulkTraceAdapter
+    return adapter_mapping.get(data_sheet.template.type)
+
+
+def plan_chunks(data_sheet):
+    """
+    Create the chunks of the data sheet, splitting its rows in chunks of
+    'BULK_UPLOAD_CHUNK_SIZE' in the order of the data.
+
+    Parameters:
+    data_sheet (DataSheetUpload): The data sheet upload.
+
+    Returns:
+    list: The chunks created.
+    """
+    chunk_model = apps.get_model("bulk_uploads", "DataSheetUploadChunk")
+    keys = list(data_sheet.data or {})
+    size = settings.BULK_UPLOAD_CHUNK_SIZE
+    return chunk_model.objects.bulk_create(
+        chunk_model(
+            upload=data_sheet,
+            index=index,
+            rows=keys[start:start + size],
+            creator=data_sheet.creator,
+            updater=data_sheet.creator,
+        )
+        for index, start in enumerate(range(0, len(keys), size))
+    )
+
+
+def _dispatch_chunks(data_sheet, adapter_class):
+    """
+    Queue the pending chunks of the data sheet.
+
+    All the pending chunks are queued if the rows of the sheet are
+    independent, else only the first one, and the next chunk is queued once
+    it is processed.
+    """
+    chunks = data_sheet.chunks.filter(status=UPLOAD_CHUNK_STATUS_PENDING)
+    if not adapter_class.parallel_chunks:
+        chunks = chunks[:1]
+    chunks = list(chunks)
+    for chunk in chunks:
+        type(chunk).objects.filter(pk=chunk.pk).update(
+            updated_on=timezone.now())
+        bulk_upload_chunk.delay(chunk.id)
+    return chunks
+
+
 @shared_task(name="bulk_upload", queue="low")
 def bulk_upload(upload_id):
     """
     Celery task to process bulk data sheet upload.
 
-    This task processes a bulk data sheet upload by adapting, formatting, and
-    creating transaction or connection data based on the provided
-    DataSheetUpload     instance.
+    The rows of the DataSheetUpload are split in chunks, each of them
+    processed by `bulk_upload_chunk` in its own transaction. The pending
+    and failed chunks of an upload that was already split are only queued
+    again, so the task also resumes an interrupted upload and retries the
+    chunks that failed.
 
     Parameters:
     upload_id (int): The ID of the DataSheetUpload instance to process.
@@ -33,44 +112,147 @@ def bulk_upload(upload_id):
     # Retrieve the DataSheetUpload instance using the provided upload_id
     data_sheet = data_sheet_upload_model.objects.get(id=upload_id)
 
-    # Determine the appropriate adapter based on the template type
-    adapter_mapping = {
-        TEMPLATE_TYPE_TXN: BulkTransactionAdapter,
-        TEMPLATE_TYPE_CONNECTION: BulkConnectionAdapter,
-        # Add more mappings as needed
-    }
-
-    if data_sheet.template.is_system_template:
-        adapter_class = BulkTraceAdapter
-    elif data_sheet.template.type in adapter_mapping:
-        adapter_class = adapter_mapping[data_sheet.template.type]
-    else:
+    adapter_class = get_adapter_class(data_sheet)
+    if not adapter_class:
         return "Unsupported template type"
+    if data_sheet.is_used:
+        return f"Data sheet {data_sheet.idencode} is already processed"
+
+    with db_transaction.atomic():
+        if not data_sheet.chunks.exists():
+            plan_chunks(data_sheet)
+        data_sheet.chunks.filter(status=UPLOAD_CHUNK_STATUS_FAILED).update(
+            status=UPLOAD_CHUNK_STATUS_PENDING, errors={},
+            updated_on=timezone.now())
 
-    adapter = adapter_class(data_sheet)
+    if not _dispatch_chunks(data_sheet, adapter_class):
+        _upload_completed(upload_id)
 
-    # Format the data from the data sheet
-    adapter.format_data()
+    return (f"Processing {data_sheet.template.get_type_display()} data "
+            f"sheet {data_sheet.idencode}")
 
-    # Create the data using the formatted data
+
+@shared_task(name="bulk_upload_chunk", queue="low")
+def bulk_upload_chunk(chunk_id):
+    """
+    Celery task to process a chunk of a bulk data sheet upload.
+
+    The rows of the chunk are formatted and created, and the chunk marked
+    as done, in a single transaction. The chunk is locked while processed,
+    so a chunk queued again while it is still being processed is skipped.
+    If the rows cannot be created, the chunk is rolled back and marked as
+    failed, with an error for each of its rows.
+
+    Parameters:
+    chunk_id (int): The ID of the DataSheetUploadChunk to process.
+    """
+    chunk_model = apps.get_model("bulk_uploads", "DataSheetUploadChunk")
+    upload_id = chunk_model.objects.values_list(
+        "upload_id", flat=True).get(id=chunk_id)
     try:
-        adapter.create_data()
-    except Exception as e:
+        with db_transaction.atomic():
+            chunk = chunk_model.objects.select_for_update(
+                skip_locked=True).filter(id=chunk_id).first()
+            if not chunk or chunk.status != UPLOAD_CHUNK_STATUS_PENDING:
+                return
+            data_sheet = chunk.upload
+            adapter = get_adapter_class(data_sheet)(data_sheet, chunk.rows)
+
+            # Format the data of the rows of the chunk
+            adapter.format_data()
+
+            # Create the data using the formatted data
+            adapter.create_data()
+
+            chunk.errors = adapter.errors
+            chunk.status = UPLOAD_CHUNK_STATUS_DONE
+            chunk.save(update_fields=["errors", "status", "updated_on"])
+            type(data_sheet).objects.filter(pk=data_sheet.pk).update(
+                cursor=F("cursor") + 1)
+
         # If there are exceptions during the processing, capture them.
+        for exception in adapter.exceptions:
+            capture_exception(exception)
+    except Exception as e:
         capture_exception(e)
+        rows = chunk_model.objects.values_list("rows", flat=True).get(
+            id=chunk_id)
+        chunk_model.objects.filter(pk=chunk_id).update(
+            status=UPLOAD_CHUNK_STATUS_FAILED,
+            errors={
+                idx: {"non_field_errors": [UPLOAD_CHUNK_FAILED_ERROR]}
+                for idx in rows
+            },
+            updated_on=timezone.now())
+    _chunk_completed(upload_id)
+
+
+def _chunk_completed(upload_id):
+    """
+    Queue the next chunk of the upload, or complete the upload once none of
+    its chunks is pending.
+    """
+    data_sheet_upload_model = apps.get_model("bulk_uploads",
+                                             "DataSheetUpload")
+    data_sheet = data_sheet_upload_model.objects.get(id=upload_id)
+    adapter_class = get_adapter_class(data_sheet)
+    if not data_sheet.chunks.filter(
+            status=UPLOAD_CHUNK_STATUS_PENDING).exists():
+        _upload_completed(upload_id)
+    elif not adapter_class.parallel_chunks:
+        _dispatch_chunks(data_sheet, adapter_class)
 
-    # If there are errors during the processing, update the data sheet
-    # with errors
-    if adapter.errors:
-        data_sheet.errors = adapter.errors
 
-    # If there are exceptions during the processing, capture them.
-    for exception in adapter.exceptions:
-        capture_exception(exception)
+def _upload_completed(upload_id):
+    """
+    Mark the data sheet as used, with the errors of its chunks.
 
-    # Mark the data sheet as used and save it
-    data_sheet.is_used = True
-    data_sheet.save()
+    The data sheet is not marked as used while any of its chunks failed,
+    so that the failed chunks can be processed again with `bulk_upload`,
+    but the errors of the rows are still set.
 
-    return (f"Processed {data_sheet.template.get_type_display()} data "
-            f"sheet {data_sheet.idencode}")
+    The data sheet is locked while updated, so that it is completed once
+    even if the last chunks complete at the same time.
+
+    The data sheet is updated without save(), which would read the file of
+    the sheet again.
+    """
+    data_sheet_upload_model = apps.get_model("bulk_uploads",
+                                             "DataSheetUpload")
+    with db_transaction.atomic():
+        data_sheet = data_sheet_upload_model.objects.select_for_update().get(
+            id=upload_id)
+        if data_sheet.is_used:
+            return
+        errors = {}
+        failed = False
+        for chunk in data_sheet.chunks.all():
+            errors.update(chunk.errors or {})
+            failed |= chunk.status == UPLOAD_CHUNK_STATUS_FAILED
+
+        # The errors of the rows are replaced, as the errors of a previous
+        # run of failed chunks no longer apply once they are processed.
+        data_sheet_upload_model.objects.filter(pk=upload_id).update(
+            is_used=not failed, errors=errors, updated_on=timezone.now())
+
+
+@shared_task(name="resume_bulk_uploads")
+def resume_bulk_uploads():
+    """
+    Queue again the chunks of the uploads that were interrupted.
+
+    Chunks are interrupted when a worker restarts while processing them,
+    and are considered so when they are pending and were not updated for
+    'BULK_UPLOAD_CHUNK_TIMEOUT' seconds.
+    """
+    data_sheet_upload_model = apps.get_model("bulk_uploads",
+                                             "DataSheetUpload")
+    stale = timezone.now() - timedelta(
+        seconds=settings.BULK_UPLOAD_CHUNK_TIMEOUT)
+    uploads = data_sheet_upload_model.objects.filter(
+        is_used=False,
+        chunks__status=UPLOAD_CHUNK_STATUS_PENDING,
+        chunks__updated_on__lt=stale,
+    ).distinct()
+    for data_sheet in uploads:
+        _dispatch_chunks(data_sheet, get_adapter_class(data_sheet))
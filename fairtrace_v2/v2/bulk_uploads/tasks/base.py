@@ -1,6 +1,13 @@
+import copy
+import math
 from abc import ABC, abstractmethod
 from collections import defaultdict
 
+import pandas as pd
+from v2.transactions.bulk import BulkIncomingTransactionCreator
+from v2.transactions.context import TransactionContext
+from v2.transactions.serializers.external import ExternalTransactionSerializer
+
 
 class DataSheetAdapted(ABC):
     """
@@ -9,19 +16,62 @@ class DataSheetAdapted(ABC):
     """
 
     data_sheet = None  # Placeholder for the data sheet instance
-    
-    def __init__(self, data_sheet):
+
+    # Whether the chunks of a sheet can be processed concurrently. Rows
+    # that may depend on the rows before them, like farmers invited by an
+    # earlier row, require the chunks to be processed in order.
+    parallel_chunks = False
+
+    def __init__(self, data_sheet, rows=None):
         """
         Initialize the DataSheetAdapted instance with a data sheet.
 
         Parameters:
         data_sheet (DataSheetUpload): The DataSheetUpload instance containing
                                       the data.
+        rows (list): Keys of the rows of the data to process. All the rows
+                     are processed if not given.
         """
         self.data = {} 
         self.errors = defaultdict(dict)  
         self.exceptions = []  
         self.data_sheet = data_sheet
+        self.rows = rows
+        # Products, connections, wallets and operations looked up while
+        # creating the data of the sheet are shared by all the rows.
+        self.transaction_context = TransactionContext()
+        if data_sheet.product:
+            self.transaction_context.add_product(data_sheet.product)
+
+    def get_data(self):
+        """
+        Return a copy of the data of the rows to process.
+
+        The rows are cleaned on a DataFrame by the schema of the template,
+        and the values it sets as missing are left out of the rows.
+        """
+        data = self.data_sheet.data
+        if self.rows is not None:
+            data = {idx: data[idx] for idx in self.rows if idx in data}
+        if not data:
+            return {}
+        df = pd.DataFrame.from_dict(data, orient="index", dtype=object)
+        df = self.data_sheet.template.schema.clean_df(df)
+        return copy.deepcopy({
+            idx: {
+                key: value for key, value in row.items()
+                if not self._is_missing(value)
+            }
+            for idx, row in df.to_dict(orient="index").items()
+        })
+
+    @staticmethod
+    def _is_missing(value):
+        """
+        Whether a value of a cleaned row is missing.
+        """
+        return value is pd.NA or (
+            isinstance(value, float) and math.isnan(value))
 
     @abstractmethod
     def format_data(self):
@@ -43,4 +93,67 @@ class DataSheetAdapted(ABC):
         """
         pass
 
+    def create_transactions(self, transactions):
+        """
+        Create incoming transactions from farmers in bulk.
+
+        The rows are validated and created in chunks with
+        BulkIncomingTransactionCreator. Rows of a chunk that could not be
+        created are created again one by one with
+        ExternalTransactionSerializer, so that their errors are reported.
+
+        Parameters:
+        transactions (dict): (farmer, transaction data) by row index.
+        """
+        data_sheet = self.data_sheet
+        if not data_sheet.product:
+            failed = [(list(transactions), None)]
+        else:
+            creator = BulkIncomingTransactionCreator(
+                node=data_sheet.node,
+                user=data_sheet.creator,
+                product=data_sheet.product,
+                unit=data_sheet.unit,
+                currency=data_sheet.currency,
+                data_sheet=data_sheet,
+                transaction_context=self.transaction_context,
+            )
+            for idx, (farmer, data) in transactions.items():
+                errors = creator.add(idx, farmer, data)
+                if errors:
+                    self.errors[idx].update(errors)
+            _, failed = creator.create()
 
+        for keys, exception in failed:
+            if exception:
+                self.exceptions.append(exception)
+            for idx in keys:
+                farmer, data = transactions[idx]
+                self.create_transaction(idx, farmer, data)
+
+    def create_transaction(self, idx, farmer, data):
+        """
+        Create a single transaction with ExternalTransactionSerializer.
+
+        Parameters:
+        idx: Index of the row in the data sheet.
+        farmer (Farmer): Farmer the transaction is received from.
+        data (dict): Transaction data of the row.
+        """
+        try:
+            serializer = ExternalTransactionSerializer(
+                data=dict(data, node=farmer.idencode),
+                context={
+                    "node": self.data_sheet.node,
+                    "user": self.data_sheet.creator,
+                    "data_sheet": self.data_sheet,
+                    "transaction_context": self.transaction_context,
+                },
+            )
+            if not serializer.is_valid():
+                self.errors[idx].update(serializer.errors)
+                return
+            transaction = serializer.save()
+            self.data_sheet.added_transactions.add(transaction)
+        except Exception as e:
+            self.exceptions.append(e)
@@ -1,6 +1,3 @@
-import re
-import copy
-
 from common.library import decode
 from django.apps import apps
 from django.db import transaction as db_transaction
@@ -17,8 +14,8 @@ class BulkConnectionAdapter(DataSheetAdapted):
     sheet.
     """
 
-    def __init__(self, data_sheet):
-        super().__init__(data_sheet)
+    def __init__(self, data_sheet, rows=None):
+        super().__init__(data_sheet, rows)
         self.farmers_ids = []
 
     def format_data(self):
@@ -33,7 +30,7 @@ class BulkConnectionAdapter(DataSheetAdapted):
         """
 
         data_sheet = self.data_sheet
-        data = copy.deepcopy(data_sheet.data)
+        data = self.get_data()
         common_data = {
             "node": data_sheet.node,
             "supply_chain": data_sheet.supply_chain,
@@ -52,17 +49,8 @@ class BulkConnectionAdapter(DataSheetAdapted):
         for idx, value in data.items():
             # Add common data to each entry
             connection_type = value.pop("connection_type", None)
-            country_code = value.pop("country_code", None)
             fair_id = value.get("fair_id", None)
-            family_members = value.pop("family_members", None)
-
-            if family_members:
-                value["family_members"] = int(family_members)
 
-            for key in ("latitude", "longitude"):
-                if not value.get(key):
-                    value.pop(key, None)
-                    
             if fair_id and decode(fair_id) not in self.farmers_ids:
                 self.errors[idx].update(
                     {"fair_id": 'Invalid fair id'})
@@ -92,14 +80,6 @@ class BulkConnectionAdapter(DataSheetAdapted):
                     self.errors[idx][
                         "connection_type"] = "Invalid connection type"
 
-            # Add country code to phone number
-            if country_code and "phone" in value:
-                if not country_code.startswith('+'):
-                    match = re.search(r'\((\+\d+)\)', country_code)
-                    if match:
-                        country_code = match.group(1)
-                value["phone"] = f"{country_code}{value['phone']}"
-
             value.update(common_data)
             self.data[idx] = value
 
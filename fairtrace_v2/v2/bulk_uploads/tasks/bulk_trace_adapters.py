@@ -1,18 +1,14 @@
-import re
-import copy
-
 from common.library import decode, encode
 from django.apps import apps
-from django.db import transaction as db_transaction
 from v2.bulk_uploads.schemas.transaction_upload_schema import \
     TransactionUploadSchema
 from v2.bulk_uploads.tasks.base import DataSheetAdapted
 from v2.supply_chains.constants import NODE_TYPE_FARM, POLYGON
-from v2.supply_chains.models import Operation
 from v2.supply_chains.serializers.node import FarmerSerializer
 from v2.supply_chains.serializers.supply_chain import FarmerInviteSerializer
 from v2.transactions import constants
-from v2.transactions.serializers.external import ExternalTransactionSerializer
+
+FARMER_KEY_FIELDS = ("first_name", "last_name", "country", "province")
 
 
 class BulkTraceAdapter(DataSheetAdapted):
@@ -21,8 +17,8 @@ class BulkTraceAdapter(DataSheetAdapted):
     sheet.
     """
 
-    def __init__(self, data_sheet):
-        super().__init__(data_sheet)
+    def __init__(self, data_sheet, rows=None):
+        super().__init__(data_sheet, rows)
         self.farmers_ids = []
 
     def format_data(self):
@@ -37,7 +33,7 @@ class BulkTraceAdapter(DataSheetAdapted):
         """
 
         data_sheet = self.data_sheet
-        data = copy.deepcopy(data_sheet.data)
+        data = self.get_data()
         connection_common_data = {
             "node": data_sheet.node,
             "supply_chain": data_sheet.supply_chain,
@@ -64,19 +60,9 @@ class BulkTraceAdapter(DataSheetAdapted):
         for idx, value in data.items():
             # Add common data to each entry
             connection_type = value.pop("connection_type", None)
-            country_code = value.pop("country_code", None)
             fair_id = value.get("fair_id", None)
-            family_members = value.pop("family_members", None)
-            lat = value.pop("latitude", None)
-            lon = value.pop("longitude", None)
-
-            if "latitude" in value and not value.get("latitude", ""):
-                value.pop("latitude")
-            if "longitude" in value and not value.get("longitude", ""):
-                value.pop("longitude")
-
-            if family_members:
-                value["family_members"] = int(family_members)
+            value.pop("latitude", None)
+            value.pop("longitude", None)
 
             if fair_id and decode(fair_id) not in self.farmers_ids:
                 self.errors[idx].update(
@@ -84,26 +70,11 @@ class BulkTraceAdapter(DataSheetAdapted):
                 continue
 
             if connection_type:
-                # Query the Operation model to find the primary operation
-                # based on the connection_type
-                primary_operation = Operation.objects.filter(
-                    name__iexact=connection_type.strip(),
-                    supply_chains=data_sheet.supply_chain,
-                    node_type=NODE_TYPE_FARM
-                ).last()
-
-                if not primary_operation:
-                    primary_operation = Operation.objects.filter(
-                        name__istartswith=connection_type.strip(),
-                        supply_chains=data_sheet.supply_chain,
-                        node_type=NODE_TYPE_FARM
-                    ).last()
-
-                if not primary_operation:
-                    primary_operation = Operation.objects.filter(
-                        supply_chains=data_sheet.supply_chain,
-                        node_type=NODE_TYPE_FARM
-                    ).last()
+                # Find the primary operation based on the connection_type,
+                # looked up once per connection type for the sheet.
+                primary_operation = self.transaction_context.get_operation(
+                    connection_type, data_sheet.supply_chain, NODE_TYPE_FARM
+                )
 
                 if primary_operation:
                     # If a primary operation is found, assign its idencode to
@@ -114,14 +85,6 @@ class BulkTraceAdapter(DataSheetAdapted):
                     self.errors[idx][
                         "connection_type"] = "Invalid connection type"
 
-                # Add country code to phone number
-            if country_code and "phone" in value:
-                if not country_code.startswith('+'):
-                    match = re.search(r'\((\+\d+)\)', country_code)
-                    if match:
-                        country_code = match.group(1)
-                value["phone"] = f"{country_code}{value['phone']}"
-
             # Get the list of fields in the TransactionUploadSchema
             transaction_fields = list(TransactionUploadSchema
                                       .get_fields().keys())
@@ -150,110 +113,132 @@ class BulkTraceAdapter(DataSheetAdapted):
             value.update(connection_common_data)
             self.data[idx] = value
 
-    @db_transaction.atomic()
-    def create_data(self):
+    @staticmethod
+    def farmer_key(values):
+        """
+        Fields identifying a farmer in the sheet, compared case-insensitively.
+
+        Parameters:
+        values (dict): Row values or the attributes of a farmer.
         """
-        Create bulk transactions from the formatted data.
+        return tuple(
+            value.lower() if isinstance(value, str) else value
+            for value in map(values.get, FARMER_KEY_FIELDS)
+        )
 
-        This method uses the ExternalTransactionSerializer to create bulk
-        transactions using the formatted data. It handles validation and error
-        handling.
+    def get_node_farmer_ids(self):
+        """
+        Ids of the farmers supplying to the node, by farmer_key.
+
+        The farmers of the node are read with a single query instead of
+        looking up every row. The oldest farmer is kept for a key.
+        """
+        farmer_model = apps.get_model("supply_chains", "Farmer")
+        farmer_ids = {}
+        for row in (
+            farmer_model.objects.filter(buyers=self.data_sheet.node)
+            .order_by("id")
+            .values("id", *FARMER_KEY_FIELDS)
+        ):
+            farmer_ids.setdefault(self.farmer_key(row), row["id"])
+        return farmer_ids
+
+    def create_data(self):
+        """
+        Create farmers and bulk transactions from the formatted data.
 
-        It iterates through the formatted data and attempts to create each
-        transaction. If a transaction fails validation, errors are collected
-        and stored.
+        Existing farmers are resolved for the whole sheet at once. Farmers
+        with a fair id are updated, and farmers that are not found are
+        invited, one row at a time, since inviting creates the node, the
+        connection and the invitation. Farmer plots are then bulk created and
+        the transactions created in chunks with `create_transactions`.
 
         Note: This method modifies self.errors if there are errors during
             creation.
         """
         farmer_model = apps.get_model("supply_chains", "Farmer")
         farmer_plot_model = apps.get_model("supply_chains", "FarmerPlot")
+        context = {
+            "node": self.data_sheet.node,
+            "user": self.data_sheet.creator,
+        }
 
         # map farmer idencode to
         farmer_idencode_to_obj = dict([
             (encode(farmer.pk), farmer)
             for farmer
-            in farmer_model.objects.filter(pk__in=self.farmers_ids)])
-
-        farmer_serializer_klass = FarmerInviteSerializer
-        transaction_serializer_klass = ExternalTransactionSerializer
-        update_serializer_klass = FarmerSerializer
+            in farmer_model.objects.filter(
+                pk__in=self.farmers_ids).order_by("id")])
+
+        # Farmers of the sheet, for the rows marked as duplicates.
+        sheet_farmers = {}
+        for farmer in farmer_idencode_to_obj.values():
+            sheet_farmers.setdefault(self.farmer_key(vars(farmer)), farmer)
+
+        farmer_ids = self.get_node_farmer_ids()
+        existing_farmers = farmer_model.objects.in_bulk({
+            farmer_ids[key]
+            for key in map(self.farmer_key, self.data.values())
+            if key in farmer_ids
+        })
+
+        plots = []
+        transactions = {}
         for idx, value in self.data.items():
-            filter_data = {
-                "first_name__iexact": value.get("first_name"),
-                "last_name__iexact": value.get("last_name"),
-                "country__iexact": value.get("country"),
-                "province__iexact": value.get("province"),
-            }
-
             try:
                 transaction_data = value.pop("transaction_data", None)
                 farmer_duplicated = value.pop("farmer_duplicated", False)
                 geo_json = value.pop("geo_json", None)
-
-                if not farmer_duplicated:
-                    if value.get("fair_id", None):
-                        # Update farmer if fair_id is present
-                        farmer = farmer_idencode_to_obj.get(value["fair_id"])
-                        if not farmer:
-                            continue
-                        serializer = update_serializer_klass(
+                key = self.farmer_key(value)
+
+                if farmer_duplicated:
+                    # The farmer may have been created by an earlier chunk
+                    # of the sheet.
+                    farmer = sheet_farmers.get(key) or existing_farmers.get(
+                        farmer_ids.get(key))
+                    if not farmer:
+                        self.errors[idx]["farmer"] = "Farmer not found"
+                        continue
+                elif value.get("fair_id", None):
+                    # Update farmer if fair_id is present
+                    farmer = farmer_idencode_to_obj.get(value["fair_id"])
+                    if not farmer:
+                        continue
+                    serializer = FarmerSerializer(
+                        farmer, data=value, partial=True, context=context)
+                    serializer.is_valid(raise_exception=True)
+                    farmer = serializer.save()
+                else:
+                    farmer = existing_farmers.get(farmer_ids.get(key))
+                    if not farmer:
+                        serializer = FarmerInviteSerializer(
+                            data=value, context=context)
+                        serializer.is_valid(raise_exception=True)
+                        farmer = serializer.save().invitee.farmer
+                        self.transaction_context.add_connection(
+                            self.data_sheet.node,
+                            self.data_sheet.supply_chain,
                             farmer,
-                            data=value,
-                            partial=True,
-                            context={
-                                "node": self.data_sheet.node,
-                                "user": self.data_sheet.creator,
-                            },
                         )
-                        serializer.is_valid(raise_exception=True)
-                        farmer = serializer.save()
-                    else:
-                        # Identify existing farmers using unique fields
-                        existing_farmers = farmer_model.objects.filter(
-                            **filter_data, buyers=self.data_sheet.node)
-                        farmer = existing_farmers.first()
-
-                        if not farmer:
-                            serializer = farmer_serializer_klass(
-                                data=value,
-                                context={
-                                    "node": self.data_sheet.node,
-                                    "user": self.data_sheet.creator,
-                                },
-                            )
-                            serializer.is_valid(raise_exception=True)
-                            obj = serializer.save()
-                            farmer = obj.invitee
-                            if geo_json and isinstance(geo_json, dict):
-                                #add farmer plot
-                                farmer_plot_model.objects.create(
-                                    farmer=farmer,
-                                    name= "Plot 1",
-                                    location_type=POLYGON,
-                                    geo_json=geo_json
-                                )
+                        farmer_ids[key] = farmer.pk
+                        existing_farmers[farmer.pk] = farmer
+                        if geo_json and isinstance(geo_json, dict):
+                            plots.append(farmer_plot_model(
+                                farmer=farmer,
+                                name="Plot 1",
+                                location_type=POLYGON,
+                                geo_json=geo_json
+                            ))
 
+                if not farmer_duplicated:
                     self.farmers_ids.append(farmer.pk)
-                else:
-                    farmers = farmer_model.objects.filter(
-                        pk__in=self.farmers_ids, **filter_data)
-                    farmer = farmers.first()
+                    sheet_farmers.setdefault(
+                        self.farmer_key(vars(farmer)), farmer)
 
                 if transaction_data:
-                    transaction_data["node"] = farmer.idencode
-                    serializer = transaction_serializer_klass(
-                        data=transaction_data,
-                        context={
-                            "node": self.data_sheet.node,
-                            "user": self.data_sheet.creator,
-                            "data_sheet": self.data_sheet,
-                        },
-                    )
-                    if not serializer.is_valid():
-                        self.errors[idx].update(serializer.errors)
-                        continue
-                    transaction = serializer.save()                
-                    self.data_sheet.added_transactions.add(transaction)
+                    transactions[idx] = (farmer, transaction_data)
             except Exception as e:
                 self.exceptions.append(e)
+
+        farmer_plot_model.objects.bulk_create(plots)
+        self.create_transactions(transactions)
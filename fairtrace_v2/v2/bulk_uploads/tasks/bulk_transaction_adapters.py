@@ -1,11 +1,6 @@
-import copy
-
-from django.db import transaction as db_transaction
-
 from v2.bulk_uploads.tasks.base import DataSheetAdapted
 from v2.supply_chains.constants import NODE_TYPE_FARM
 from v2.transactions import constants
-from v2.transactions.serializers.external import ExternalTransactionSerializer
 
 
 class BulkTransactionAdapter(DataSheetAdapted):
@@ -14,6 +9,10 @@ class BulkTransactionAdapter(DataSheetAdapted):
     sheet.
     """
 
+    # Transactions are only created from farmers already connected to the
+    # node, so the rows do not depend on each other.
+    parallel_chunks = True
+
     def format_data(self):
         """
         Format the data sheet's data for bulk transaction creation.
@@ -26,7 +25,7 @@ class BulkTransactionAdapter(DataSheetAdapted):
         """
 
         data_sheet = self.data_sheet
-        data = copy.deepcopy(data_sheet.data)
+        data = self.get_data()
         common_data = {
             "product": data_sheet.product.idencode,
             "unit": data_sheet.unit,
@@ -52,39 +51,20 @@ class BulkTransactionAdapter(DataSheetAdapted):
             value.update(common_data)
             self.data[idx] = value
 
-    @db_transaction.atomic()
     def create_data(self):
         """
         Create bulk transactions from the formatted data.
 
-        This method uses the ExternalTransactionSerializer to create bulk
-        transactions using the formatted data. It handles validation and error
-        handling.
-
-        It iterates through the formatted data and attempts to create each
-        transaction. If a transaction fails validation, errors are collected
-        and stored.
+        The transactions are validated and created in chunks with
+        `create_transactions`. If a transaction fails validation, errors
+        are collected and stored.
 
         Note: This method modifies self.errors if there are errors during
             creation.
         """
-
-        serializer_klass = ExternalTransactionSerializer
-        for idx, value in self.data.items():
-            try:
-                serializer = serializer_klass(
-                    data=value,
-                    context={
-                        "node": self.data_sheet.node,
-                        "user": self.data_sheet.creator,
-                        "data_sheet": self.data_sheet,
-                    },
-                )
-                if not serializer.is_valid():
-                    self.errors[idx].update(serializer.errors)
-                    continue
-                transaction = serializer.save()
-                self.data_sheet.added_transactions.add(transaction)
-            except Exception as e:
-                self.exceptions.append(e)
-
+        self.create_transactions(
+            {
+                idx: (value.pop("node"), value)
+                for idx, value in self.data.items()
+            }
+        )
@@ -1 +1,274 @@
-# Create your tests here.
+import io
+import re
+import zipfile
+from unittest import mock
+
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.test import SimpleTestCase
+from mixer.backend.django import mixer
+from openpyxl import Workbook
+from v2.accounts.tests.integration.base import AuthBaseTestCase
+from v2.bulk_uploads import tasks
+from v2.bulk_uploads.constants import TEMPLATE_TYPE_TXN
+from v2.bulk_uploads.constants import UPLOAD_CHUNK_FAILED_ERROR
+from v2.bulk_uploads.constants import UPLOAD_CHUNK_STATUS_DONE
+from v2.bulk_uploads.constants import UPLOAD_CHUNK_STATUS_FAILED
+from v2.bulk_uploads.models import DataSheetTemplate
+from v2.bulk_uploads.models.uploads import DataSheetUpload
+from v2.bulk_uploads.readers import SheetReader
+from v2.bulk_uploads.schemas.farmer_upload_schema import FarmerUploadSchema
+
+
+class RecordingAdapter:
+    """Adapter recording the rows it creates, and failing on the rows in
+    'fail_rows'."""
+
+    parallel_chunks = True
+    created = []
+    fail_rows = set()
+
+    def __init__(self, data_sheet, rows=None):
+        self.rows = rows
+        self.errors = {}
+        self.exceptions = []
+
+    def format_data(self):
+        pass
+
+    def create_data(self):
+        if self.fail_rows & set(self.rows):
+            raise ValueError("Rows could not be created")
+        RecordingAdapter.created += self.rows
+        self.errors = {self.rows[-1]: {"name": ["Invalid name"]}}
+
+
+class SequentialRecordingAdapter(RecordingAdapter):
+    parallel_chunks = False
+
+
+@override_settings(BULK_UPLOAD_CHUNK_SIZE=2)
+class BulkUploadChunkTestCase(AuthBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        RecordingAdapter.created = []
+        RecordingAdapter.fail_rows = set()
+        template = mixer.blend(
+            DataSheetTemplate,
+            file=None,
+            type=TEMPLATE_TYPE_TXN,
+            is_system_template=False,
+        )
+        self.data_sheet = DataSheetUpload.objects.bulk_create(
+            [
+                DataSheetUpload(
+                    node=self.company,
+                    template=template,
+                    data={str(idx): {"name": idx} for idx in range(5)},
+                    creator=self.user,
+                    updater=self.user,
+                )
+            ]
+        )[0]
+
+    def run_upload(self, adapter_class=RecordingAdapter):
+        """Runs the upload with the chunks processed as they are queued."""
+        with mock.patch.object(
+            tasks, "get_adapter_class", return_value=adapter_class
+        ), mock.patch.object(
+            tasks.bulk_upload_chunk,
+            "delay",
+            side_effect=tasks.bulk_upload_chunk,
+        ):
+            tasks.bulk_upload(self.data_sheet.id)
+        self.data_sheet.refresh_from_db()
+
+    def test_plan_chunks(self):
+        chunks = tasks.plan_chunks(self.data_sheet)
+
+        self.assertEqual(
+            [(chunk.index, chunk.rows) for chunk in chunks],
+            [(0, ["0", "1"]), (1, ["2", "3"]), (2, ["4"])],
+        )
+
+    @mock.patch.object(tasks.bulk_upload_chunk, "delay")
+    def test_parallel_chunks_are_queued_at_once(self, delay):
+        with mock.patch.object(
+            tasks, "get_adapter_class", return_value=RecordingAdapter
+        ):
+            tasks.bulk_upload(self.data_sheet.id)
+
+        self.assertCountEqual(
+            [call.args[0] for call in delay.call_args_list],
+            self.data_sheet.chunks.values_list("id", flat=True),
+        )
+
+    @mock.patch.object(tasks.bulk_upload_chunk, "delay")
+    def test_sequential_chunks_are_queued_one_at_a_time(self, delay):
+        with mock.patch.object(
+            tasks, "get_adapter_class", return_value=SequentialRecordingAdapter
+        ):
+            tasks.bulk_upload(self.data_sheet.id)
+
+        delay.assert_called_once_with(self.data_sheet.chunks.first().id)
+
+    def test_upload_is_completed_with_the_errors_of_the_chunks(self):
+        self.run_upload(SequentialRecordingAdapter)
+
+        self.assertEqual(RecordingAdapter.created, [str(i) for i in range(5)])
+        self.assertTrue(self.data_sheet.is_used)
+        self.assertEqual(self.data_sheet.cursor, 3)
+        self.assertEqual(
+            self.data_sheet.errors,
+            {idx: {"name": ["Invalid name"]} for idx in ("1", "3", "4")},
+        )
+
+    def test_failed_chunk_reports_its_rows(self):
+        RecordingAdapter.fail_rows = {"2"}
+
+        self.run_upload()
+
+        self.assertFalse(self.data_sheet.is_used)
+        self.assertEqual(
+            self.data_sheet.chunks.get(index=1).status,
+            UPLOAD_CHUNK_STATUS_FAILED,
+        )
+        for idx in ("2", "3"):
+            self.assertEqual(
+                self.data_sheet.errors[idx],
+                {"non_field_errors": [UPLOAD_CHUNK_FAILED_ERROR]},
+            )
+
+    def test_failed_chunk_is_retried(self):
+        RecordingAdapter.fail_rows = {"2"}
+        self.run_upload()
+        RecordingAdapter.fail_rows = set()
+
+        self.run_upload()
+
+        self.assertTrue(self.data_sheet.is_used)
+        self.assertCountEqual(
+            RecordingAdapter.created, [str(i) for i in range(5)]
+        )
+        self.assertFalse(
+            self.data_sheet.chunks.exclude(status=UPLOAD_CHUNK_STATUS_DONE)
+        )
+        self.assertEqual(
+            self.data_sheet.errors["3"], {"name": ["Invalid name"]}
+        )
+
+
+class SheetReaderTestCase(SimpleTestCase):
+    @staticmethod
+    def create_xlsx(rows, dimension):
+        """Returns an XLSX file of the rows, whose sheet declares the given
+        dimension."""
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        content = io.BytesIO()
+        workbook.save(content)
+        source = zipfile.ZipFile(content)
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w") as target:
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename == "xl/worksheets/sheet1.xml":
+                    data = re.sub(
+                        rb'<dimension ref="[^"]*"/>',
+                        b'<dimension ref="%s"/>' % dimension.encode(),
+                        data,
+                    )
+                target.writestr(item, data)
+        return ContentFile(output.getvalue(), name="sheet.xlsx")
+
+    def test_xlsx_rows_outside_the_dimension_are_read(self):
+        file = self.create_xlsx(
+            [["Name", "Quantity"], ["Jane", 12.0], ["John"]], "A1"
+        )
+
+        batches = list(SheetReader(file).iter_batches())
+
+        self.assertEqual(
+            batches,
+            [
+                {
+                    1: {"Name": "Jane", "Quantity": 12},
+                    2: {"Name": "John", "Quantity": ""},
+                }
+            ],
+        )
+
+    def test_csv_rows_are_read_as_strings(self):
+        file = ContentFile(
+            b"Name,Quantity,Phone\n"
+            b"Jane,12.3,0123\n"
+            b"NA,,\n"
+            b"John,n/a,5\n",
+            name="sheet.csv",
+        )
+        reader = SheetReader(file)
+
+        batches = list(reader.iter_batches())
+
+        self.assertEqual(
+            batches,
+            [
+                {
+                    1: {"Name": "Jane", "Quantity": "12.3", "Phone": "0123"},
+                    3: {"Name": "John", "Quantity": "", "Phone": "5"},
+                }
+            ],
+        )
+        self.assertIsNotNone(reader.file_hash)
+
+
+class FarmerUploadSchemaTestCase(SimpleTestCase):
+    def test_clean_df(self):
+        df = pd.DataFrame.from_dict(
+            {
+                "1": {
+                    "country_code": "Netherlands (+31)",
+                    "phone": "612345678",
+                    "latitude": 52.1,
+                    "longitude": "",
+                    "family_members": 4.0,
+                },
+                "2": {
+                    "country_code": "+91",
+                    "phone": "98765",
+                    "latitude": 0,
+                    "longitude": 5.3,
+                    "family_members": "",
+                },
+                "3": {
+                    "country_code": "",
+                    "phone": "12345",
+                    "latitude": "",
+                    "longitude": "",
+                    "family_members": 0,
+                },
+            },
+            orient="index",
+            dtype=object,
+        )
+
+        rows = FarmerUploadSchema.clean_df(df).to_dict(orient="index")
+
+        self.assertEqual(
+            {idx: row["phone"] for idx, row in rows.items()},
+            {"1": "+31612345678", "2": "+9198765", "3": "12345"},
+        )
+        self.assertNotIn("country_code", rows["1"])
+        self.assertEqual(rows["1"]["latitude"], 52.1)
+        self.assertEqual(rows["2"]["longitude"], 5.3)
+        self.assertEqual(rows["1"]["family_members"], 4)
+        self.assertIsInstance(rows["1"]["family_members"], int)
+        for idx, column in (
+            ("1", "longitude"),
+            ("2", "latitude"),
+            ("2", "family_members"),
+            ("3", "family_members"),
+        ):
+            self.assertTrue(pd.isna(rows[idx][column]), (idx, column))
@@ -1,4 +1,5 @@
 import json
+from collections import defaultdict
 from typing import Tuple
 
 import numpy as np
@@ -184,18 +185,6 @@ class DataSheetUploadViewSet(
         df = schema.format_df(df)
         data, errors = self._validate_with_schema(df, schema)
 
-        # Prepare the list of verified identification numbers if upload_type 
-        # is "UPDATE"
-        if upload_type == "UPDATE":
-            identification_numbers = set()  # Using a set for O(1) lookups
-            verified_data = instance.data
-            
-            # Collect all unique identification numbers from the verified data
-            for verified in verified_data:
-                if 'identification_no' in verified_data[verified]:
-                    identification_numbers.add(
-                        str(verified_data[verified]['identification_no']))
-
         # Create a helper function to handle adding errors
         def add_to_errors(index, row, error_message):
             if index not in errors:
@@ -215,59 +204,16 @@ class DataSheetUploadViewSet(
             if not key_exists:
                 errors[index]['errors'].append(error_message)
 
-        # Iterate through the DataFrame and check for duplicates and 
-        # other conditions
-        for index, row in df.iterrows():
-            identification_no = row.get('identification_no')
-            fair_id = row.get('fair_id', None)
-            if pd.notna(identification_no):
-                # Default to row_data being the current row if not popped 
-                # from data
-                row_data = row
-                # Check for duplicates in the "UPDATE" case
-                if upload_type == "UPDATE":
-                    if str(identification_no) in identification_numbers:
-                        # Remove the row from `data` and add it to `errors`
-                        if index in data:
-                            row_data = data.pop(index)
-                        add_to_errors(index, row_data, {
-                            'key': 'identification_no',
-                            'reason': 'Duplicate Identification Number'
-                        })
-                else:
-                    #Check for duplicates based on `identification_no` within 
-                    # the DataFrame
-                    duplicate_identification_numbers = df[
-                        df.duplicated(
-                            subset=['identification_no'], 
-                            keep=False
-                        )]
-                    if index in duplicate_identification_numbers.index:
-                        if index in data:
-                            row_data = data.pop(index)
-                        add_to_errors(index, row_data, {
-                            'key': 'identification_no',
-                            'reason': 'Duplicate Identification Number'
-                        })
-                
-                # Check for existence of the identification number in 
-                # FarmerReference model
-                if instance.template.type == TEMPLATE_TYPE_CONNECTION:
-                    node = self.kwargs.get("node", None)
-                    suppliers = node.get_farmer_suppliers()
-                    reference = FarmerReference.objects.filter(
-                        number=identification_no, 
-                        farmer__in=suppliers)
-                    if fair_id:
-                        reference = reference.exclude(farmer__id=decode(fair_id))
-                    if reference.exists():
-                        # Remove the row from `data` and add it to `errors`
-                        if index in data:
-                            row_data = data.pop(index)
-                        add_to_errors(index, row_data, {
-                            'key': 'identification_no',
-                            'reason': 'Identification Number Already Exists'
-                        })
+        # Check the identification numbers column-wise, and move the rows
+        # failing a check from `data` to `errors`.
+        for index, reason in self.check_identification_numbers(
+                df, instance, upload_type).items():
+            row_data = (data.pop(index) if index in data
+                        else df.loc[index].to_dict())
+            add_to_errors(index, row_data, {
+                'key': 'identification_no',
+                'reason': reason
+            })
 
         key_columns = ['first_name', 'last_name', 'country', 'province']
         if self.check_all_key_exist(list(schema_fields), key_columns):
@@ -283,6 +229,67 @@ class DataSheetUploadViewSet(
             instance.save()
         return data, errors
 
+    def check_identification_numbers(self, df, instance, upload_type) -> dict:
+        """Check the identification numbers of the data sheet.
+
+        The checks are run on the whole column at once, with a single query
+        for the identification numbers already used by the farmers of the
+        node, instead of checking the rows one at a time.
+
+        Args:
+            df (DataFrame): The data sheet as a DataFrame.
+            instance (DataSheetUpload): The DataSheetUpload instance.
+            upload_type (str): "UPDATE" when validating edited rows.
+
+        Returns:
+            dict: The reason of the error by row index, for the rows with an
+            invalid identification number.
+        """
+        if 'identification_no' not in df:
+            return {}
+        numbers = df['identification_no']
+        present = numbers.notna()
+        if not present.any():
+            return {}
+        invalid = {}
+
+        if upload_type == "UPDATE":
+            # Identification numbers of the rows already verified.
+            verified_numbers = {
+                str(row['identification_no'])
+                for row in instance.data.values()
+                if 'identification_no' in row
+            }
+            duplicated = present & numbers.astype(str).isin(verified_numbers)
+        else:
+            duplicated = present & numbers.duplicated(keep=False)
+        for index in df.index[duplicated]:
+            invalid[index] = 'Duplicate Identification Number'
+
+        # Check for existence of the identification numbers in the
+        # FarmerReference model
+        if instance.template.type == TEMPLATE_TYPE_CONNECTION:
+            node = self.kwargs.get("node", None)
+            references = FarmerReference.objects.filter(
+                number__in=set(numbers[present].astype(str)),
+                farmer__in=node.get_farmer_suppliers(),
+            ).values_list('number', 'farmer_id')
+            number_farmers = defaultdict(set)
+            for number, farmer_id in references:
+                number_farmers[number].add(farmer_id)
+            fair_ids = (df['fair_id'] if 'fair_id' in df
+                        else pd.Series(None, index=df.index))
+            for index in df.index[present]:
+                farmers = number_farmers.get(str(numbers[index]))
+                if not farmers:
+                    continue
+                fair_id = fair_ids[index]
+                if fair_id and pd.notna(fair_id):
+                    farmers = farmers - {decode(fair_id)}
+                if farmers:
+                    invalid[index] = 'Identification Number Already Exists'
+        return invalid
+
     def check_all_key_exist(self, df_keys=None, check_keys=None):
         if df_keys and check_keys:
             return all(item in df_keys for item in check_keys)
@@ -303,35 +310,21 @@ class DataSheetUploadViewSet(
             dict: A dictionary where the keys are row indices and the values are dictionaries
                 containing the details of duplicate rows and errors.
         """
-        # Find duplicate rows based on the key columns
-        duplicates = df[df.duplicated(subset=key_columns, keep="first")]
-
-        # Prepare a dictionary to store duplicate information
-        duplicate_info = {}
-
-        # Collect duplicate rows and prepare the dictionary
-        for index, row in duplicates.iterrows():
-            if index not in duplicate_info:
-                duplicate_info[index] = row.to_dict()
-
-        # Create a new dictionary to store filtered results
-        filtered_duplicates = {}
-
-        # Filter out entries with a fair_id and copy the valid entries
-        for index, row in duplicate_info.items():
-            if pd.isna(row.get(fair_id_column)):
-                filtered_duplicates[index] = row
+        # Find duplicate rows based on the key columns, excluding the rows
+        # with a fair_id.
+        duplicated = df.duplicated(subset=key_columns, keep="first")
+        if fair_id_column in df:
+            duplicated &= df[fair_id_column].isna()
+        duplicates = df[duplicated]
 
         # Convert NaN and infinite values to None for JSON serialization
-        for index, row in filtered_duplicates.items():
-            for key, value in row.items():
-                if isinstance(value, (float, np.float64)):
-                    if pd.isna(value) or value == float('inf') or value == float('-inf'):
-                        row[key] = None
-                    else:
-                        row[key] = float(value) 
-                elif isinstance(value, pd.Timestamp):
-                    row[key] = value.isoformat()  
+        duplicates = duplicates.replace([np.inf, -np.inf], np.nan)
+        for column in duplicates.select_dtypes(
+                include=["datetime", "datetimetz"]):
+            duplicates[column] = duplicates[column].map(
+                lambda value: value.isoformat() if pd.notna(value) else None)
+        duplicates = duplicates.astype(object).where(duplicates.notna(), None)
+        filtered_duplicates = duplicates.to_dict(orient="index")
 
         # Optionally, add an 'errors' field if needed (example: based on specific criteria)
         for index in filtered_duplicates.keys():
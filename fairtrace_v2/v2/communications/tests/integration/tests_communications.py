@@ -36,3 +36,15 @@ class CommunicationTestCase(CommunicationBaseTestCase):
             notifications_url, format="json", **self.headers
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_read_notifications_with_invalid_ids(self):
+        """Test that invalid ids are skipped while reading notifications."""
+        notification = mixer.blend(Notification, user=self.user, is_read=False)
+        notifications_url = reverse("notifications-read")
+        data = {"ids": [notification.idencode, {"id": 1}, ["id"], "invalid"]}
+        response = self.client.patch(
+            notifications_url, data, format="json", **self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_read)
@@ -1,9 +1,9 @@
 from common.admin import BaseAdmin
+from common.cache import filesystem_cache
 from django.contrib import admin
 from modeltranslation.admin import TranslationAdmin
 
 from . import cache_handlers
-from ..products.models import Batch
 from .models import CITheme, ConsumerInterfaceClaimIntervention
 from .models import ConsumerInterfaceActor
 from .models import ConsumerInterfaceClaim
@@ -30,12 +30,9 @@ def clear_filesystem_cache(modeladmin, request, queryset):
     if queryset.count() > 5:
         raise Exception("Select less than 5 items")
     for item in queryset:
-        batch_ids = cache_handlers.get_batches(item.id)
-        batches = Batch.objects.filter(pk__in=batch_ids)
-        for batch in batches:
-            cache_handlers.clear_ci_map_cache.delay(batch.id)
-            cache_handlers.clear_ci_stage_cache.delay(batch.id)
-            cache_handlers.clear_ci_claim_cache.delay(batch.id)
+        cache_handlers.schedule_ci_rebuilds(
+            filesystem_cache.keys_by_tag(("theme", item.id))
+        )
 
 
 copy_theme.short_description = "Copy theme"
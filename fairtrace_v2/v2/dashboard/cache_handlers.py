@@ -1,10 +1,14 @@
+import time
 from typing import List
 
 from celery import shared_task
 from common.cache import cache_proxy
 from common.cache import filesystem_cache
 from django.apps import apps
+from django.conf import settings
 from django.utils import translation
+from django_redis import get_redis_connection
+from v2.claims.models import AttachedBatchClaim
 from v2.products.models import Batch
 from v2.products.serializers.trace_operational import (
     TraceClaimsWithBatchSerializer,
@@ -13,6 +17,68 @@ from v2.products.serializers.trace_operational import TraceMapSerializer
 from v2.products.serializers.trace_operational import (
     TraceStagesWithBatchSerializer,
 )
+from v2.products.trace_snapshot import delete_snapshots
+from v2.transactions.models import Transaction
+
+# Prefixes of the cached consumer interface responses.
+CI_CACHE_PREFIXES = ("theme", "stage", "map", "claim")
+
+
+def get_dependencies(batch, theme_id=None) -> set:
+    """Returns the (name, id) tags of the objects the CI of a batch is built
+    from.
+
+    These are the batches of the trace with their transactions, actors,
+    products and claims, and the theme. The response cache is tagged with
+    them, so that it can be invalidated when any of them changes.
+    """
+    tags = {("batch", batch.id), ("product", batch.product_id)}
+    if theme_id:
+        tags.add(("theme", theme_id))
+    if not batch.source_transaction_id:
+        return tags
+    transaction_ids = set(
+        batch.source_transaction.get_ancestor_ids(include_self=True)
+    )
+    rows = Transaction.objects.filter(id__in=transaction_ids).values_list(
+        "externaltransaction__source_id",
+        "externaltransaction__destination_id",
+        "internaltransaction__node_id",
+    )
+    node_ids = {_id for row in rows for _id in row if _id}
+    batches = Batch.objects.filter(
+        source_transaction_id__in=transaction_ids
+    ).values_list("id", "product_id")
+    batch_ids = {batch.id} | {_id for _id, _ in batches}
+    claim_ids = AttachedBatchClaim.objects.filter(
+        batch_id__in=batch_ids
+    ).values_list("claim_id", flat=True)
+
+    tags.update(("transaction", _id) for _id in transaction_ids)
+    tags.update(("node", _id) for _id in node_ids)
+    tags.update(("batch", _id) for _id in batch_ids)
+    tags.update(("product", product_id) for _, product_id in batches)
+    tags.update(("claim", _id) for _id in claim_ids)
+    return tags
+
+
+def invalidate_ci_cache(**objects) -> list:
+    """Deletes the cached CI responses depending on any of the objects.
+
+    The objects are given as lists of ids by tag name, and all dependent
+    keys are found with one lookup on the tag index.
+
+    eg:
+        invalidate_ci_cache(node=[12], claim=[3, 4])
+    """
+    tags = [(name, _id) for name, ids in objects.items() for _id in ids]
+    keys = [
+        key
+        for key in filesystem_cache.keys_by_any_tag(*tags)
+        if not key.startswith("connection_")
+    ]
+    filesystem_cache.delete_many(keys)
+    return keys
 
 
 class ThemeCacheHandler:
@@ -37,13 +103,20 @@ class ThemeCacheHandler:
         """Returns a list of cached keys."""
         if not batch_id:
             return self.proxy.keys(self.prefix + "*")
-        return self.proxy.keys(self.prefix + f"_{batch_id}*")
-
-    def build_response(self, batch_id, theme_id, serializer_class) -> dict:
-        """Build response."""
+        return [
+            key
+            for key in self.proxy.keys_by_tag(("batch", batch_id))
+            if key.startswith(self.prefix + "_")
+        ]
+
+    def build_response(
+        self, batch_id, theme_id, serializer_class, rebuild=False
+    ) -> dict:
+        """Build response, with a rebuilt trace snapshot if rebuild is
+        set."""
         theme = self.get_theme(theme_id)
         batch = self.get_batch(batch_id)
-        serializer = serializer_class(batch, theme)
+        serializer = serializer_class(batch, theme, rebuild_snapshot=rebuild)
         return serializer.data
 
     def build_response_cache(
@@ -56,8 +129,11 @@ class ThemeCacheHandler:
             if response:
                 return response
         translation.activate(lan)
-        response = self.build_response(batch_id, theme_id, serializer_class)
-        self.proxy.set(key, response)
+        response = self.build_response(
+            batch_id, theme_id, serializer_class, rebuild=rebuild
+        )
+        tags = get_dependencies(self.get_batch(batch_id), theme_id)
+        self.proxy.set(key, response, tags=tags)
 
     def clear_response_cache(self, keys, rebuild=False):
         """Clears the response cache for the specified keys.
@@ -142,6 +218,9 @@ def rebuild_response(instance, **kwargs):
 def clear_ci_cache(batch_id, prefix, ignore_parents=False):
     """Task to clear CI theme batches and related batches.
 
+    The related responses are the ones tagged with the batch, i.e., whose
+    trace includes it.
+
     Args:
         batch_id: Batch.id
         prefix: map/stage
@@ -154,55 +233,151 @@ def clear_ci_cache(batch_id, prefix, ignore_parents=False):
     if not batch.source_transaction:
         return "NO SOURCE  TRANSACTION FOUND"
 
-    if not ignore_parents:
-        # Getting all related transaction to the source transaction.
-        related_transaction_ids = list(
-            batch.source_transaction.get_parent_transactions().values_list(  # noqa
-                "id", flat=True
-            )
-        )
-
-        batches = handler.batch_model.objects.filter(
-            source_transaction__in=related_transaction_ids
-        ).values_list("id", flat=True)
-        keys = []
-        for batch_id in batches:
-            keys.extend(handler.get_cached_keys(batch_id))
-    else:
-        keys = handler.get_cached_keys(batch_id)
+    delete_snapshots(batch_id)
+    keys = handler.get_cached_keys(batch_id)
+    if ignore_parents:
+        keys = [key for key in keys if key.split("_")[1] == str(batch_id)]
     if not keys:
         return "NO CACHE TO REBUILT"
-    return rebuild_response(handler, keys=keys, rebuild=True)
+    return schedule_ci_rebuilds(keys)
 
 
 def get_batches(instance_id: int) -> List[str]:
-    """Getting batch ids from cached keys.
+    """Getting batch ids of the cached responses of a theme."""
+    keys = filesystem_cache.keys_by_tag(("theme", instance_id))
+    return list({key.split("_")[1] for key in keys})
+
 
-    Assuming we are using filesystem caching.
+# Serializers of the cached CI responses that can be rebuilt, by prefix.
+CI_CACHE_SERIALIZERS = {
+    "stage": TraceStagesWithBatchSerializer,
+    "map": TraceMapSerializer,
+    "claim": TraceClaimsWithBatchSerializer,
+}
+
+# Redis hashes of the rebuild scheduler. Pending holds the time of the
+# first request of every scheduled key and generations the number of the
+# latest request, so that older scheduled tasks know they are superseded.
+CI_REBUILD_PENDING = "ci_rebuild:pending"
+CI_REBUILD_GENERATIONS = "ci_rebuild:generations"
+CI_REBUILD_COUNTERS = "ci_rebuild:counters"
+CI_REBUILD_LATENCIES = "ci_rebuild:latencies"
+CI_REBUILD_LATENCY_SAMPLES = 1000
+
+
+def _rebuild_redis():
+    """Returns the redis client used by the rebuild scheduler."""
+    return get_redis_connection("filesystem")
+
+
+def _rebuild_generation(redis, key) -> int:
+    """Returns the generation of the latest rebuild request of a key."""
+    return int(redis.hget(CI_REBUILD_GENERATIONS, key) or 0)
+
+
+def schedule_ci_rebuild(key):
+    """Schedules a debounced rebuild of a cached CI response.
+
+    The key (prefix_batch_theme_language) is rebuilt CI_REBUILD_DEBOUNCE
+    seconds after its latest request, so that a burst of requests results
+    in a single rebuild. Every request supersedes the previously scheduled
+    task of the key, unless the first pending request is older than
+    CI_REBUILD_MAX_WAIT, in which case it is merged into the scheduled one
+    to prevent continuous edits from postponing the rebuild forever.
+    A pending request older than CI_REBUILD_MAX_WAIT and CI_REBUILD_DEBOUNCE
+    together means that the scheduled task was lost, as it would have
+    cleared it otherwise, and the key is scheduled again.
+
+    Returns the generation of the scheduled rebuild, or None if merged.
     """
-    # Need to change cache if cache backend changes.
-    cache = filesystem_cache
-    keys = cache.keys(f"*_{instance_id}_*")
-    return [key.split("_")[1] for key in keys]
-
-
-# def terminate_active_tasks(batch_id: int, task_name: str) -> None:
-#     # """
-#     # If the rebuild happening again simultaneously, them previous tasks
-#     # will be killed.
-#     # """
-#     #
-#     # # fetch active tasks
-#     # inspect = app.control.inspect()
-#     # active_workers = inspect.active()
-#     #
-#     # # Terminate already running tasks.
-#     # for _, worker in active_workers.items():
-#     #     for _task in worker:
-#     #         if (_task['name'] == task_name
-#     #                 and _task['args'] == [batch_id]):
-#     #             app.control.revoke(_task['id'], terminate=True)
-#     pass
+    redis = _rebuild_redis()
+    now = time.time()
+    redis.hincrby(CI_REBUILD_COUNTERS, "requested", 1)
+    if not redis.hsetnx(CI_REBUILD_PENDING, key, now):
+        first_requested = float(redis.hget(CI_REBUILD_PENDING, key) or now)
+        waited = now - first_requested
+        if waited >= (
+            settings.CI_REBUILD_MAX_WAIT + settings.CI_REBUILD_DEBOUNCE
+        ):
+            redis.hset(CI_REBUILD_PENDING, key, now)
+            redis.hincrby(CI_REBUILD_COUNTERS, "lost", 1)
+        elif waited >= settings.CI_REBUILD_MAX_WAIT:
+            redis.hincrby(CI_REBUILD_COUNTERS, "merged", 1)
+            return None
+    generation = redis.hincrby(CI_REBUILD_GENERATIONS, key, 1)
+    rebuild_ci_cache.apply_async(
+        (key, generation), countdown=settings.CI_REBUILD_DEBOUNCE
+    )
+    return generation
+
+
+def schedule_ci_rebuilds(keys) -> list:
+    """Schedules rebuilds of the cached CI responses that can be rebuilt."""
+    keys = [key for key in keys if key.split("_")[0] in CI_CACHE_SERIALIZERS]
+    for key in keys:
+        schedule_ci_rebuild(key)
+    return [f"{key} - SCHEDULED" for key in keys]
+
+
+def get_ci_rebuild_metrics() -> dict:
+    """Returns the queue depth, counters and latencies (in seconds from
+    the first request to the completion) of the rebuild scheduler."""
+    redis = _rebuild_redis()
+    pipe = redis.pipeline()
+    pipe.hlen(CI_REBUILD_PENDING)
+    pipe.hgetall(CI_REBUILD_COUNTERS)
+    pipe.lrange(CI_REBUILD_LATENCIES, 0, -1)
+    depth, counters, latencies = pipe.execute()
+    latencies = sorted(float(latency) for latency in latencies)
+    metrics = {
+        "queue_depth": depth,
+        **{name.decode(): int(value) for name, value in counters.items()},
+    }
+    if latencies:
+        metrics["latency"] = {
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[int(len(latencies) * 0.95)],
+            "max": latencies[-1],
+        }
+    return metrics
+
+
+@shared_task(name="rebuild-ci-cache", queue="ci_queue")
+def rebuild_ci_cache(key, generation):
+    """Task to rebuild a cached CI response scheduled with
+    schedule_ci_rebuild.
+
+    The rebuild is skipped if a newer one was requested before it started,
+    and its result is discarded if one was requested while it was running.
+    """
+    redis = _rebuild_redis()
+    if _rebuild_generation(redis, key) != generation:
+        redis.hincrby(CI_REBUILD_COUNTERS, "superseded", 1)
+        return f"{key} - SUPERSEDED"
+    requested_on = float(redis.hget(CI_REBUILD_PENDING, key) or time.time())
+    redis.hdel(CI_REBUILD_PENDING, key)
+
+    prefix, batch_id, theme_id, lan = key.split("_")
+    handler = ThemeCacheHandler(prefix=prefix)
+    batch = handler.get_batch(batch_id)
+    if not batch or not handler.get_theme(theme_id):
+        handler.proxy.delete(key)
+        return f"{key} - NOT FOUND"
+    translation.activate(lan)
+    response = handler.build_response(
+        batch_id, theme_id, CI_CACHE_SERIALIZERS[prefix], rebuild=True
+    )
+    if _rebuild_generation(redis, key) != generation:
+        redis.hincrby(CI_REBUILD_COUNTERS, "superseded", 1)
+        return f"{key} - SUPERSEDED"
+    handler.proxy.set(key, response, tags=get_dependencies(batch, theme_id))
+
+    pipe = redis.pipeline()
+    pipe.hincrby(CI_REBUILD_COUNTERS, "completed", 1)
+    pipe.lpush(CI_REBUILD_LATENCIES, time.time() - requested_on)
+    pipe.ltrim(CI_REBUILD_LATENCIES, 0, CI_REBUILD_LATENCY_SAMPLES - 1)
+    pipe.execute()
+    return f"{key} - COMPLETED"
 
 
 @shared_task(name="clear-ci-stage-cache", queue="ci_queue")
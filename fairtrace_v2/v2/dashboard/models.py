@@ -7,8 +7,10 @@ from common.library import _percentage
 from common.models import AbstractBaseModel
 from django.conf import settings
 from django.contrib.postgres import fields
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db import transaction
 from django.utils import timezone
 from django.utils import translation
 from django.utils.crypto import get_random_string
@@ -661,6 +663,9 @@ class NodeStats(AbstractBaseModel):
     supplier_ids = fields.JSONField(null=True, blank=True, default=list)
     farmer_ids = fields.JSONField(null=True, blank=True, default=list)
 
+    # Fields updated by outdate(), which are not saved with the values.
+    OUTDATED_FIELDS = ("is_outdated", "outdated_at", "outdated_by")
+
     @property
     def company_count(self):
         """Get company count."""
@@ -672,115 +677,110 @@ class NodeStats(AbstractBaseModel):
         return _percentage(self.traceable_chains, self.supply_chain_count)
 
     def outdate(self, outdated_by=None):
-        """Make item Outdated."""
+        """Make item Outdated.
+
+        Only the outdated fields are updated, so that the values computed
+        by a recompute running at the same time are not overwritten.
+        """
         self.is_outdated = True
         self.outdated_at = timezone.now()
         self.outdated_by = outdated_by
-        self.save()
+        NodeStats.objects.filter(pk=self.pk).update(
+            is_outdated=True,
+            outdated_at=self.outdated_at,
+            outdated_by=outdated_by,
+            updated_on=self.outdated_at,
+        )
 
     @staticmethod
-    def _operation_count(queryset, supply_chain=None):
-        """To perform function _operation_count."""
-        operation_count = {"supplier": {}, "farmer": {}}
-        for item in queryset:
-            nodesupplychains = item.nodesupplychain_set.all()
-            if supply_chain:
-                nodesupplychains = item.nodesupplychain_set.filter(
-                    supply_chain=supply_chain
-                )
-            for nsc in nodesupplychains:
-                if not nsc.primary_operation:
-                    continue
-                op_id = nsc.primary_operation.id
-                nt = nsc.primary_operation.node_type
-                node_type = (
-                    "supplier"
-                    if nt == sc_constants.NODE_TYPE_COMPANY
-                    else "farmer"
-                )
-                if op_id not in operation_count[node_type]:
-                    operation_count[node_type][op_id] = {
-                        "name": nsc.primary_operation.name,
-                        "count": 1,
-                    }
-                else:
-                    operation_count[node_type][op_id]["count"] += 1
-        operation_count["farmer"] = list(operation_count["farmer"].values())
-        operation_count["supplier"] = list(
-            operation_count["supplier"].values()
+    def outdate_nodes(node_ids, outdated_by=None):
+        """Make the stats of the nodes outdated, creating the missing ones,
+        with a query each."""
+        now = timezone.now()
+        existing = set(
+            NodeStats.objects.filter(node_id__in=node_ids).values_list(
+                "node_id", flat=True
+            )
+        )
+        NodeStats.objects.bulk_create(
+            (
+                NodeStats(node_id=node_id)
+                for node_id in set(node_ids) - existing
+            ),
+            ignore_conflicts=True,
+        )
+        NodeStats.objects.filter(node_id__in=node_ids).update(
+            is_outdated=True,
+            outdated_at=now,
+            outdated_by=outdated_by,
+            updated_on=now,
         )
-        return operation_count
 
-    def update_values(self):
-        """Update dashboard values."""
-        from v2.supply_chains.models import Invitation
+    @staticmethod
+    def get_reload_key(node_id):
+        """Cache key set while a recompute of the stats is queued."""
+        return f"node_stats_reload_{node_id}"
 
-        self.supply_chain_count = self.node.supply_chains.count()
+    def reload(self):
+        """Queue a recompute of the values in the background.
 
-        sup_queryset, sup_tier_data = self.node.get_supplier_chain(
-            fast_mode=True
-        )
-        buy_queryset, buy_tier_data = self.node.get_buyer_chain(fast_mode=True)
-
-        sup_ids = sup_queryset.values_list("id", flat=True)
-        buy_ids = buy_queryset.values_list("id", flat=True)
-        actor_ids = list(sup_ids) + list(buy_ids)
-        all_actors = Node.objects.filter(id__in=actor_ids)
-        farmers = sup_queryset.filter(type=sc_constants.NODE_TYPE_FARM)
-        suppliers = sup_queryset.filter(type=sc_constants.NODE_TYPE_COMPANY)
-
-        comp_ids = [i.id for i in suppliers] + [
-            i.id
-            for i in buy_queryset.filter(type=sc_constants.NODE_TYPE_COMPANY)
-        ]
-        comp_ids_incl_self = comp_ids + [self.node.id]
-        companies = Node.objects.filter(id__in=comp_ids)
-        companies_incl_self = Node.objects.filter(id__in=comp_ids_incl_self)
-        invites = Invitation.objects.filter(
-            inviter__in=companies_incl_self, invitee__in=companies_incl_self
-        )
-        sent_invites = invites.filter(email_sent=True)
-        signed_up_companies = (
-            companies.exclude(invitations_received__in=invites)
-            .distinct("id")
-            .count()
-        )
-        invited_actors = companies.filter(
-            invitations_received__in=sent_invites
-        ).distinct("id")
-        active_actors = (
-            companies.filter(invitations_received__in=sent_invites)
-            .exclude(date_joined=None)
-            .distinct("id")
-        )
+        A single recompute is queued per node at a time, so that the
+        requests for outdated stats, and the outdates of many nodes at
+        once, do not queue a recompute each. The key expires after
+        NODE_STATS_RELOAD_TIMEOUT seconds in case the task is lost.
 
-        self.actor_count = all_actors.count()
-        self.supplier_count = suppliers.count()
-        self.farmer_count = farmers.count()
-        self.invited_actor_count = invited_actors.count() + signed_up_companies
-        self.active_actor_count = active_actors.count() + signed_up_companies
+        Returns whether a recompute was queued.
+        """
+        from v2.supply_chains.cache_resetters import reload_statistics
 
-        self.mapped_actor_count = companies.count() - self.invited_actor_count
-        self.pending_invite_count = (
-                self.invited_actor_count - self.active_actor_count
-        )
+        if not cache.add(
+            self.get_reload_key(self.node_id),
+            True,
+            settings.NODE_STATS_RELOAD_TIMEOUT,
+        ):
+            return False
+        node_id = self.node_id
+        transaction.on_commit(lambda: reload_statistics.delay(node_id))
+        return True
 
-        self.farmer_coorinates = list(farmers.values("latitude", "longitude"))
-        self.supplier_coorinates = list(
-            suppliers.values("latitude", "longitude")
-        )
+    def update_values(self):
+        """Update dashboard values.
+
+        The stats stay outdated if they were outdated again while the values
+        were computed.
+        """
+        from v2.supply_chains.statistics import get_chain_stats
 
-        self.operation_stats = self._operation_count(sup_queryset)
+        outdated_at = self.outdated_at
+        self.supply_chain_count = self.node.supply_chains.count()
 
-        self.buyer_ids = [i.id for i in buy_queryset]
-        self.supplier_ids = [i.id for i in suppliers]
-        self.farmer_ids = [i.id for i in farmers]
+        # The chains of the node are resolved once, along with its chains in
+        # each of its supply chains.
+        node_supply_chains = self.node.nodesupplychain_set.all()
+        sc_ids = [nsc.supply_chain_id for nsc in node_supply_chains]
+        sup_chain, sc_sup_chains = Node.objects.resolve_chains_by_supply_chain(
+            self.node.id, sc_ids
+        )
+        buy_chain, sc_buy_chains = Node.objects.resolve_chains_by_supply_chain(
+            self.node.id, sc_ids, direction=sc_constants.INVITE_RELATION_BUYER
+        )
+        statistics = get_chain_stats(self.node, sup_chain[0], buy_chain[0])
+        for key, value in statistics.items():
+            setattr(self, key, value)
 
         tier_counts = [0]
         chain_lengths = []
         traceable_chains = 0
-        for nsc in self.node.nodesupplychain_set.all():
-            nsc.update_values()
+        node_supply_chains.update_values(
+            chains={
+                nsc.id: (
+                    sc_sup_chains[nsc.supply_chain_id],
+                    sc_buy_chains[nsc.supply_chain_id],
+                )
+                for nsc in node_supply_chains
+            }
+        )
+        for nsc in node_supply_chains:
             tier_counts.append(nsc.tier_count)
             if nsc.chain_length:
                 chain_lengths.append(nsc.chain_length)
@@ -794,6 +794,19 @@ class NodeStats(AbstractBaseModel):
         else:
             self.chain_length = 0
         self.traceable_chains = traceable_chains
-        self.is_outdated = False
         self.last_updated = timezone.now()
-        self.save()
+        if not self.pk:
+            self.is_outdated = False
+            self.save()
+            return
+        self.save(
+            update_fields=[
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.OUTDATED_FIELDS
+            ]
+        )
+        self.is_outdated = not NodeStats.objects.filter(
+            pk=self.pk, outdated_at=outdated_at
+        ).update(is_outdated=False)
@@ -19,8 +19,6 @@ from v2.supply_chains.models import SupplyChain
 from v2.supply_chains.serializers import supply_chain as sc_serializers
 from v2.supply_chains.serializers.node import OperationSerializer
 
-# from v2.supply_chains.cache_resetters import reload_statistics
-
 
 class NodeStatsSerializer(serializers.ModelSerializer):
     """Serialize node stats."""
@@ -359,10 +357,14 @@ class StatsSerializer(serializers.ModelSerializer):
         if self.supply_chain:
             stats["selected_supply_chain"] = self.supply_chain.idencode
 
+        # The stored stats are served right away and flagged with
+        # 'is_outdated' while they are recomputed in the background. They
+        # are only computed here if they were never computed.
         stats_obj, created = NodeStats.objects.get_or_create(node=node)
-        if (created or stats_obj.is_outdated) and not self.labels:
+        if not stats_obj.last_updated and not self.labels:
             stats_obj.update_values()
-            # reload_statistics.delay(stats_obj.id)
+        elif stats_obj.is_outdated and not self.labels:
+            stats_obj.reload()
         node_stats = NodeStatsSerializer(stats_obj).data
         stats["supply_chain_stats"] = []
         if self.supply_chain:
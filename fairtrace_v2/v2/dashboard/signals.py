@@ -1,7 +1,27 @@
+from common.cache import filesystem_cache
+from django.db import transaction as db_transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from v2.dashboard import cache_handlers
-from v2.products.models import Batch
+from v2.transactions.models import Transaction
+
+# Objects the cached CI responses depend on, as the tag name and the
+# attribute holding the tagged id for each sender.
+CI_CACHE_DEPENDENCIES = {
+    "Batch": ("batch", "id"),
+    "Product": ("product", "id"),
+    "Node": ("node", "id"),
+    "Company": ("node", "id"),
+    "Farmer": ("node", "id"),
+    "NodeSupplyChain": ("node", "node_id"),
+    "Claim": ("claim", "id"),
+    "AttachedBatchClaim": ("batch", "batch_id"),
+    "Transaction": ("transaction", "id"),
+    "ExternalTransaction": ("transaction", "id"),
+    "InternalTransaction": ("transaction", "id"),
+}
 
 
 @receiver(post_save)
@@ -18,9 +38,35 @@ def rebuild_cache_with_theme(sender, instance, **kwargs):
         if theme:
             _id = theme.id
     if _id:
-        batch_ids = cache_handlers.get_batches(_id)
-        batches = Batch.objects.filter(pk__in=batch_ids)
-        for batch in batches:
-            cache_handlers.clear_ci_map_cache.delay(batch.id)
-            cache_handlers.clear_ci_stage_cache.delay(batch.id)
-            cache_handlers.clear_ci_claim_cache.delay(batch.id)
+        cache_handlers.schedule_ci_rebuilds(
+            filesystem_cache.keys_by_tag(("theme", _id))
+        )
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_ci_cache(sender, instance, **kwargs):
+    """Invalidates the cached CI responses depending on the instance.
+
+    The responses are rebuilt on their next access.
+    """
+    dependency = CI_CACHE_DEPENDENCIES.get(sender.__name__)
+    if not dependency:
+        return
+    name, attr = dependency
+    _id = getattr(instance, attr)
+    db_transaction.on_commit(
+        lambda: cache_handlers.invalidate_ci_cache(**{name: [_id]})
+    )
+
+
+@receiver(m2m_changed, sender=Transaction.parents.through)
+def invalidate_ci_cache_on_lineage(sender, instance, action, **kwargs):
+    """Invalidates the cached CI responses of transactions whose parents
+    changed."""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    transaction_ids = {instance.id} | set(kwargs.get("pk_set") or ())
+    db_transaction.on_commit(
+        lambda: cache_handlers.invalidate_ci_cache(transaction=transaction_ids)
+    )
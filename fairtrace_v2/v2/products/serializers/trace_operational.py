@@ -10,18 +10,17 @@ from common.exceptions import BadRequest
 from django.conf import settings
 from django.db.models import Case
 from django.db.models import CharField
-from django.db.models import F, IntegerField
+from django.db.models import F
 from django.db.models import OuterRef
 from django.db.models import Q
-from django.db.models import QuerySet
 from django.db.models import Subquery
-from django.db.models import Sum
 from django.db.models import Value
 from django.db.models import When
-from django.db.models.functions import Concat, Left
+from django.db.models.functions import Concat
 from django.template import Context
 from django.template import Template
 from django.utils import translation
+from django.utils.functional import cached_property
 from v2.claims import constants as claim_const
 from v2.claims.models import AttachedBatchClaim, AttachedClaim, \
     AttachedCompanyClaim
@@ -29,16 +28,15 @@ from v2.claims.models import AttachedBatchCriterion
 from v2.claims.models import FieldResponse
 from v2.dashboard.models import ConsumerInterfaceActor
 from v2.dashboard.models import ConsumerInterfaceProduct
-from v2.dashboard.models import ConsumerInterfaceStage
 from v2.dashboard.models import ProgramStat
-from v2.products import constants as prod_const
 from v2.products.constants import INCOMING
 from v2.products.constants import INCOMING_DESCRIPTION
 from v2.products.constants import OUTGOING
 from v2.products.constants import OUTGOING_DESCRIPTION
 from v2.products.constants import PROCESSED
 from v2.products.constants import PROCESSED_DESCRIPTION
-from v2.products.models import Batch, Product
+from v2.products.models import Product
+from v2.products.trace_snapshot import get_snapshot
 from v2.supply_chains import constants as sup_const
 from v2.supply_chains.constants import NODE_TYPE_FARM, GRANTED
 from v2.supply_chains.models import BlockchainWallet
@@ -46,19 +44,24 @@ from v2.supply_chains.models import Company
 from v2.supply_chains.models import Node
 from v2.supply_chains.models import Operation
 from v2.transactions import constants as txn_const
-from v2.transactions.models import ExternalTransaction
-from v2.transactions.models import SourceBatch
 from v2.transactions.models import Transaction
 
 
 class AbstractTraceSerializer(metaclass=abc.ABCMeta):
     """Abstract base serializer class for new storytelling interface apis."""
 
-    def __init__(self, instance, theme, *args, context=None):
-        """To perform function __init__."""
+    def __init__(
+        self, instance, theme, *args, context=None, rebuild_snapshot=False
+    ):
+        """To perform function __init__.
+
+        The trace snapshot of the batch is rebuilt instead of read from the
+        cache if rebuild_snapshot is set.
+        """
 
         self.instance = instance
         self.theme = theme
+        self.rebuild_snapshot = rebuild_snapshot
         self._check_theme()
         if context and "view" in context:
             klass_name = context.get("view").__class__.__name__
@@ -79,36 +82,17 @@ class AbstractTraceSerializer(metaclass=abc.ABCMeta):
             if self.instance.node_id not in batch_chain:
                 raise BadRequest("Batch cannot be traced with this theme")
 
-    def parent_transactions(self):
-        """Force evaluating and start new lazy queryset for reduce query
-        complexity."""
-        # create key with language
-        lan = translation.get_language()
-        key = (
-            f"{self.instance.source_transaction.id}"
-            f"_parent_transactions"
-            f"_{lan}"
-        )
+    @cached_property
+    def snapshot(self):
+        """Trace snapshot of the batch."""
+        return get_snapshot(self.instance, rebuild=self.rebuild_snapshot)
 
-        # get cached transactions if any.
-        cached_parent_transaction = filesystem_cache.get(key)
-        if cached_parent_transaction is not None:
-            return cached_parent_transaction
-        source_transaction = self.instance.source_transaction
-        if source_transaction.result_batches.count() > 1:
-            parent_transactions = source_transaction.get_parent_transactions(
-                batches=Batch.objects.filter(pk=self.instance.pk))
-        else:
-            parent_transactions = source_transaction.get_parent_transactions()
-        transactions_ids = parent_transactions.values_list("id", flat=True)
-        translations = Transaction.objects.filter(
-            pk__in=list(transactions_ids)
+    def parent_transactions(self):
+        """Parent transactions of the batch from the trace snapshot."""
+        return Transaction.objects.filter(
+            pk__in=self.snapshot["transaction_ids"]
         )
 
-        # Caching transactions
-        filesystem_cache.set(key, translations)
-        return translations
-
     @staticmethod
     def involved_actors(transactions):
         """Get actor queryset."""
@@ -160,11 +144,7 @@ class TraceClaimsWithBatchSerializer(AbstractTraceSerializer):
     def get_claims(self) -> list:
         """Main method to called to get traced claims data."""
 
-        transactions = (
-            self.instance.source_transaction.get_parent_transactions()
-        )
-
-        transaction_ids = transactions.values_list("id", flat=True)
+        transaction_ids = self.snapshot["claim_transaction_ids"]
 
         # Getting batch attached claim ids
         attached_claim_ids = list(
@@ -177,7 +157,7 @@ class TraceClaimsWithBatchSerializer(AbstractTraceSerializer):
         # Getting batch node attached company claim ids
         attached_company_claim_ids = list(
             AttachedCompanyClaim.objects.filter(
-                node__in=self.involved_actors(transactions)
+                node__in=self.snapshot["claim_actor_ids"]
             ).values_list("claim_id"))
 
         # pair-up claim and transactions (for batch claims transaction is None)
@@ -516,18 +496,18 @@ class TraceMapSerializer(AbstractTraceSerializer):
 
     def get_map(self):
         """Get actors list with mapped actor ids."""
-        actors_values_fields = ("id", "name", "longitude", "latitude")
-        actors_annotate_fields = self._get_actors_annotations()
-
-        transactions = self.parent_transactions()
-        actors = self.involved_actors(transactions)
-        actors = actors.annotate(**actors_annotate_fields).values(
-            *actors_values_fields
-        )
-        actors = list(actors)
-        connected_node_data = self._get_node_pairs(transactions)
-        external_batch_data = self._get_batch_data(transactions)
-        self.add_external_batches(external_batch_data, actors)
+        snapshot = self.snapshot
+        actors = [
+            {
+                "id": actor["id"],
+                "name": actor["map_name"],
+                "longitude": actor["longitude"],
+                "latitude": actor["latitude"],
+            }
+            for actor in snapshot["actors"].values()
+        ]
+        connected_node_data = self._get_node_pairs(snapshot)
+        self.add_external_batches(snapshot["external_batches"], actors)
         for actor in actors:
             # Batch IDs are prefixed with EX so that they can be distinguished.
             # they cannot be encoded.
@@ -568,33 +548,8 @@ class TraceMapSerializer(AbstractTraceSerializer):
             }
             actors.append(batch_to_actor)
 
-    def _get_batch_data(self, transactions):
-        """To perform function _get_batch_data."""
-        internal_transactions = (
-            self.instance.source_transaction.get_parent_transactions(
-                only_internal=True
-            )
-        )
-        source_batches = SourceBatch.objects.filter(
-            Q(transaction__in=transactions)
-            | Q(transaction__in=internal_transactions),
-            batch__external_source__isnull=False,
-            batch__node__isnull=False,
-        ).annotate(source_id=Case(
-            When(transaction__internaltransaction__isnull=False, 
-                 then="transaction__internaltransaction__node_id"), 
-            default="transaction__externaltransaction__source_id",
-            output_field=IntegerField()
-        )).values(
-            "batch__id", "batch__name", "batch__external_lat", 
-            "batch__external_long", "source_id")
-        return source_batches
-        
-        
-
-
     @staticmethod
-    def _get_node_pairs(transactions):
+    def _get_node_pairs(snapshot):
         """
         creating a key value pair for every connection and group them
         with key
@@ -607,26 +562,13 @@ class TraceMapSerializer(AbstractTraceSerializer):
         """
 
         # source to destination connection
-        external_pairs = list(
-            transactions.filter(
-                transaction_type=txn_const.TRANSACTION_TYPE_EXTERNAL
-            ).values_list(
-                "externaltransaction__source_id",
-                "externaltransaction__destination_id",
-            )
-        )
+        external_pairs = snapshot["external_pairs"]
 
         # destination to source connection
         external_pairs_swap = list(map(lambda x: (x[1], x[0]), external_pairs))
 
         # self node to node connection
-        internal_pairs = list(
-            transactions.filter(
-                transaction_type=txn_const.TRANSACTION_TYPE_INTERNAL
-            )
-            .annotate(destination_id=F("internaltransaction__node_id"))
-            .values_list("internaltransaction__node_id", "destination_id")
-        )
+        internal_pairs = snapshot["internal_pairs"]
 
         combined = itertools.groupby(
             external_pairs + external_pairs_swap + internal_pairs,
@@ -639,22 +581,6 @@ class TraceMapSerializer(AbstractTraceSerializer):
             )
         return data
 
-    @staticmethod
-    def _get_actors_annotations():
-        """To perform function _get_actors_annotations."""
-        return {
-            "name": Case(
-                When(type=sup_const.NODE_TYPE_COMPANY, then="company__name"),
-                When(
-                    type=sup_const.NODE_TYPE_FARM,
-                    farmer__consent_status=sup_const.GRANTED,
-                    then=Concat("farmer__first_name", "farmer__last_name"),
-                ),
-                default=Value("Anonymous"),
-                output_field=CharField(),
-            )
-        }
-
 
 class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
     """Class to handle TraceStagesWithBatchSerializer and functions."""
@@ -667,17 +593,13 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
     def get_stages(self):
         """To perform function get_stages."""
         data = []
-        transactions = self.parent_transactions()
-        actors = self._get_actors(transactions)
+        actors = self._get_actors()
 
-        stage_actors_dict = self.instance.get_parent_actors_levels()
+        stage_actors_dict = self.snapshot["stages"]
         for stage in sorted(stage_actors_dict.keys(), reverse=True):
-            stage_actors_query_set = stage_actors_dict[stage]
             stage_actors_ids = [
                 library.encode(_actor_id)
-                for _actor_id in stage_actors_query_set.order_by(
-                    "-image"
-                ).values_list("id", flat=True)
+                for _actor_id in stage_actors_dict[stage]
             ]
             filtered_stage_actors = list(filter(
                 lambda a: a in actors, stage_actors_ids))
@@ -710,15 +632,14 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
 
             title = library._list_to_sentence(operations)
             image = None
-            if (
-                    self.theme
-                    and self.theme.stages.filter(
-                operation__name__in=operations
-            ).exists()
-            ):
-                stage = self.theme.stages.filter(
-                    operation__name__in=operations
-                ).first()
+            theme_stages = [
+                theme_stage
+                for theme_stage in self.theme_stages
+                if theme_stage.operation
+                and theme_stage.operation.name in operations
+            ]
+            if theme_stages:
+                stage = theme_stages[0]
                 actor_name = stage.actor_name
                 image = stage.image_url
                 title = stage.title
@@ -751,83 +672,26 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
             )
         return data
 
-    def _get_actors(self, transactions) -> dict:
-        actors_values_fields = (
-            "id",
-            "name",
-            "longitude",
-            "latitude",
-            "description_basic",
-            "province",
-            "country",
-            "status",
-            "supply_chains",
-            "transaction_quantity",
-            "image_url",
-            "type",
-        )
-        actors_annotate_fields = self._get_actors_annotations(transactions)
-
-        source_transaction = self.instance.source_transaction
-        actors = self.involved_actors(transactions)
+    @cached_property
+    def theme_stages(self):
+        """Stages of the theme with their operations."""
+        return list(self.theme.stages.select_related("operation"))
 
-        # fetch and annotate with required values
-        actors = actors.annotate(**actors_annotate_fields).values(
-            *actors_values_fields
-        )
-        actors = list(actors.iterator())
-        external_sources = self._get_external_sources(transactions)
-        self._actor_data(
-            actors, source_transaction, transactions, external_sources
-        )
+    def _get_actors(self) -> dict:
+        """Actors of the trace snapshot with the theme applied, by
+        encoded id."""
+        actors = [
+            dict(actor) for actor in self.snapshot["actors"].values()
+        ]
+        self._actor_data(actors)
         return dict(map(lambda a: (a["id"], a), actors))
 
-    @staticmethod
-    def _get_actors_annotations(transactions: QuerySet) -> dict:
-        """Create annotation fields for actors."""
-        out_going_quantity = ExternalTransaction.objects.filter(
-            source_id=OuterRef("pk"), id__in=transactions
-        ).annotate(quantity=Sum("_source_quantity"))
-        return {
-            "name": Case(
-                When(type=sup_const.NODE_TYPE_COMPANY, then="company__name"),
-                When(
-                    type=sup_const.NODE_TYPE_FARM,
-                    farmer__consent_status=sup_const.GRANTED,
-                    then=Concat(
-                        "farmer__first_name", 
-                        Value(" "), 
-                        Left("farmer__last_name", 1),
-                        Value(".")
-                    ),
-                ),
-                default=Value("Anonymous"),
-                output_field=CharField(),
-            ),
-            "transaction_quantity": Subquery(
-                out_going_quantity.values("quantity")[:1],
-                output_field=CharField(),
-            ),
-            "image_url": Case(
-                When(image="", then=Value("")),
-                When(
-                    type=sup_const.NODE_TYPE_FARM,
-                    farmer__consent_status=sup_const.GRANTED,
-                    then=Concat(Value(settings.MEDIA_URL), F("image"))
-                ),
-                output_field=CharField(),
-                default=Value(""),
-            ),
-        }
-
-    def _get_products(self, actor_id, transactions, source_transaction):
-        """To perform function _get_products."""
-        source_txn_product = source_transaction.product
+    def _get_products(self, actors):
+        """Returns the products of each actor, by actor id."""
         product_values = (
             "name",
             "theme_name",
             "description",
-            "direction",
             "theme_description",
             "image_url",
         )
@@ -837,7 +701,16 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
             theme=self.theme, product_id=OuterRef("pk")
         )
 
-        products = Product.objects.order_by().annotate(
+        actor_products = {
+            actor["id"]: self.snapshot["products"][actor["id"]]
+            for actor in actors
+        }
+        product_ids = {
+            product_id
+            for products in actor_products.values()
+            for product_id, _ in products
+        }
+        products = Product.objects.filter(pk__in=product_ids).annotate(
             theme_name=Subquery(
                 theme_product_subquery.values(f"name_{lan}")[:1]
             ),
@@ -854,100 +727,54 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
                 default=Concat(Value(settings.MEDIA_URL), F("theme_image")),
             ),
         )
-
-        outgoing_products_filter = {
-            (
-                "batches__outgoing_transactions__"
-                "externaltransaction__source_id"
-            ): actor_id,
-            "batches__outgoing_transactions__in": transactions,
+        product_data = {
+            product.pop("id"): product
+            for product in products.values("id", *product_values)
         }
-
-        incoming_products_filter = {
-            (
-                "batches__outgoing_transactions__"
-                "externaltransaction__destination_id"
-            ): actor_id,
-            "batches__outgoing_transactions__in": transactions,
+        return {
+            actor_id: [
+                {**product_data[product_id], "direction": direction}
+                for product_id, direction in products
+            ]
+            for actor_id, products in actor_products.items()
         }
-        outgoing_products = products.filter(
-            **outgoing_products_filter
-        ).distinct("id")
-
-        incoming_products = products.filter(
-            **incoming_products_filter
-        ).distinct("id")
-
-        if source_transaction.is_external:
-            show_internal_product = False
-        else:
-            show_internal_product = all(
-                (
-                    source_transaction.internaltransaction.node_id == actor_id,
-                    source_txn_product not in incoming_products,
-                    source_txn_product not in outgoing_products,
-                )
-            )
 
-        common_products = incoming_products.filter(id__in=outgoing_products)
-
-        outgoing_products = (
-            outgoing_products.exclude(pk__in=common_products)
-            .annotate(
-                direction=Value(prod_const.OUTGOING, output_field=CharField())
-            )
-            .values(*product_values)
-        )
-
-        incoming_products = (
-            incoming_products.exclude(pk__in=common_products)
-            .annotate(
-                direction=Value(prod_const.INCOMING, output_field=CharField()),
-            )
-            .values(*product_values)
-        )
+    def _actor_data(self, actors):
+        """To perform function _actor_data."""
+        actor_ids = [actor["id"] for actor in actors]
 
-        common_products = common_products.annotate(
-            direction=Value(
-                prod_const.INCOMING_AND_PROCESSED, output_field=CharField()
+        # Last theme actor of each actor, same as `.last()`.
+        theme_actors = {
+            theme_actor.actor_id: theme_actor
+            for theme_actor in ConsumerInterfaceActor.objects.filter(
+                theme=self.theme, actor_id__in=actor_ids
             )
-        ).values(*product_values)
+        }
 
-        source_txn_products = (
-            products.filter(pk=source_txn_product.id)
-            .annotate(
-                direction=Value(prod_const.PROCESSED, output_field=CharField())
+        actor_claims = defaultdict(list)
+        for node_id, claim_id, name in (
+            AttachedCompanyClaim.objects.filter(node_id__in=actor_ids)
+            .annotate(name=F("claim__name"))
+            .values_list("node_id", "claim_id", "name")
+        ):
+            actor_claims[node_id].append(
+                {"id": library.encode(claim_id), "name": name}
             )
-            .values(*product_values)
-            if show_internal_product
-            else []
-        )
-
-        return (
-                list(source_txn_products)
-                + list(common_products)
-                + list(outgoing_products)
-                + list(incoming_products)
-        )
 
-    @staticmethod
-    def _get_image_id_map(actors: QuerySet):
-        """To perform function _get_image_id_map."""
-        return dict(
-            map(
-                lambda x: (x.id, x.image_url),
-                actors.only("id", "image").distinct("id").iterator(),
+        operations = list(
+            Operation.objects.filter(
+                id__in={
+                    operation_id
+                    for actor in actors
+                    for operation_id in actor["operation_ids"]
+                }
             )
         )
+        actor_products = self._get_products(actors)
+        external_sources = self.snapshot["external_sources"]
 
-    def _actor_data(
-            self, actors, source_transaction, transactions, external_sources
-    ):
-        """To perform function _actor_data."""
         for actor in actors:
-            theme_actor = ConsumerInterfaceActor.objects.filter(
-                theme=self.theme, actor_id=actor["id"]
-            ).last()
+            theme_actor = theme_actors.get(actor["id"])
 
             # Assign theme_actor.image_url if it exists and is not empty
             # Otherwise, assign by popping "image_url" from actor dictionary
@@ -972,34 +799,29 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
                 if theme_actor and theme_actor.name
                 else actor.pop("name", None)
             )
+            actor.pop("map_name")
 
-            claims = AttachedCompanyClaim.objects.filter(
-                node_id=actor["id"]
-            ).annotate(name=F("claim__name")).values_list(
-                "claim_id", "name")
-
-            actor["claims"] = list(
-                map(lambda c: {"id": library.encode(c[0]),
-                               "name": c[1]}, claims))
+            actor["claims"] = actor_claims[actor["id"]]
 
-            supply_chain_id = actor.pop("supply_chains")
-            operation = Operation.objects.filter(
-                primary_node_supplychain__node=actor["id"],
-                primary_node_supplychain__supply_chain=supply_chain_id,
-            ).first()
+            actor.pop("supply_chain")
+            operation_ids = actor.pop("operation_ids")
+            operation = next(
+                (op for op in operations if op.id in operation_ids), None
+            )
             actor["primary_operation"] = (
                 operation.name if operation else "Actor"
             )
             if not actor["image"]:
-                stage_theme = (
-                    ConsumerInterfaceStage.objects.filter(
-                        theme=self.theme,
-                        operation__name__icontains=actor["primary_operation"],
-                    )
-                    .only("image")
-                    .last()
+                primary_operation = actor["primary_operation"].lower()
+                stage_themes = [
+                    theme_stage
+                    for theme_stage in self.theme_stages
+                    if theme_stage.operation
+                    and primary_operation in theme_stage.operation.name.lower()
+                ]
+                theme_image = (
+                    stage_themes[-1].image if stage_themes else None
                 )
-                theme_image = stage_theme.image if stage_theme else None
                 if theme_image:
                     actor["image"] = theme_image.url
             if (
@@ -1012,54 +834,19 @@ class TraceStagesWithBatchSerializer(AbstractTraceSerializer):
                         context = Context(actor)
                         actor["description_basic"] = template.render(context)
 
-            actor["products"] = self._get_products(
-                actor["id"], transactions, source_transaction
-            )
+            actor["products"] = actor_products[actor["id"]]
 
             # source_transaction will be the tracking transaction
-            if actor["id"] in [source_transaction.destination.id]:
-                transaction_quantity = source_transaction._destination_quantity
+            if actor["id"] == self.snapshot["source_destination_id"]:
+                transaction_quantity = self.snapshot[
+                    "source_destination_quantity"
+                ]
                 actor["transaction_quantity"] = transaction_quantity
 
-            actor["external_sources"] = []
-            if actor["id"] in external_sources:
-                actor["external_sources"] = external_sources[actor["id"]]
+            actor["external_sources"] = external_sources.get(actor["id"], [])
 
             actor["id"] = library.encode(actor["id"])
 
-    def _get_external_sources(self, transactions):
-        """Retrieves the external sources associated with the given
-        transactions.
-
-        Args:
-            transactions: A list or queryset of transactions.
-
-        Returns:
-            A dictionary mapping batch nodes to lists of their corresponding
-            external sources.
-        """
-        internal_transactions = (
-            self.instance.source_transaction.get_parent_transactions(
-                only_internal=True
-            )
-        )
-        source_batches = SourceBatch.objects.filter(
-            Q(transaction__in=transactions)
-            | Q(transaction__in=internal_transactions),
-            batch__external_source__isnull=False,
-            batch__node__isnull=False,
-        )
-
-        data_dict = defaultdict(list)
-        [
-            data_dict[node].append(source)
-            for node, source in source_batches.values_list(
-            "batch__node", "batch__external_source"
-        )
-        ]
-
-        return data_dict
-
 
 def get_mapped_wallets(wallets_ids: list) -> dict:
     """
@@ -1283,6 +1070,8 @@ class TraceTransactionsWithBatchActorSerializer(AbstractTraceSerializer):
             data[source_transaction.source.id].append(source_transaction.id)
 
         # cache built data.
-        filesystem_cache.set(key, data)
+        tags = [("transaction", txn.id) for txn in transactions]
+        tags += [("node", actor_id) for actor_id in data]
+        filesystem_cache.set(key, data, tags=tags)
 
         return data
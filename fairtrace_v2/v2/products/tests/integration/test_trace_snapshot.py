@@ -0,0 +1,34 @@
+from django.utils import translation
+from mixer.backend.django import mixer
+from v2.products.models import Batch
+from v2.products.models import Product
+from v2.products.tests.integration.base import ProductsBaseTestCase
+from v2.products.trace_snapshot import delete_snapshots
+from v2.products.trace_snapshot import get_snapshot
+
+
+class TraceSnapshotTestCase(ProductsBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = mixer.blend(Product, supply_chain=self.supply_chain)
+        self.create_external_transaction()
+        self.batch = mixer.blend(
+            Batch,
+            product=self.product,
+            node=self.company,
+            source_transaction=self.transaction,
+        )
+        self.company.name_en = "Cocoa company"
+        self.company.name_nl = "Cacaobedrijf"
+        self.company.save()
+        self.addCleanup(delete_snapshots, self.batch.id)
+
+    def get_company_name(self, language):
+        with translation.override(language):
+            snapshot = get_snapshot(self.batch)
+        return snapshot["actors"][self.company.id]["name"]
+
+    def test_snapshot_is_kept_per_language(self):
+        self.assertEqual(self.get_company_name("en"), "Cocoa company")
+        self.assertEqual(self.get_company_name("nl"), "Cacaobedrijf")
+        self.assertEqual(self.get_company_name("en"), "Cocoa company")
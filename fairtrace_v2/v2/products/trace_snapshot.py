@@ -0,0 +1,377 @@
+"""Precomputed trace of a batch for the consumer interface.
+
+Tracing a batch walks its parent transactions, the actors involved in them
+and the products each actor handled, none of which depend on the theme of
+a request. The snapshot stores all of it once per batch and language, as
+the names and descriptions of the actors are translated fields, so that
+the consumer interface serializers only have to apply the theme on top of
+it.
+
+The snapshot is kept in the operational cache, tagged with the objects it
+was built from so that it is invalidated along with the CI responses, and
+carries SNAPSHOT_VERSION to be rebuilt whenever its structure changes.
+"""
+from collections import defaultdict
+
+from common.cache import filesystem_cache
+from django.conf import settings
+from django.db.models import Case
+from django.db.models import CharField
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Concat
+from django.db.models.functions import Left
+from django.utils import translation
+from v2.products import constants as prod_const
+from v2.supply_chains import constants as sup_const
+from v2.supply_chains.models import Node
+from v2.supply_chains.models import NodeSupplyChain
+from v2.transactions import constants as txn_const
+from v2.transactions.models import ExternalTransaction
+from v2.transactions.models import SourceBatch
+from v2.transactions.models import Transaction
+
+SNAPSHOT_VERSION = 2
+
+
+def get_snapshot_key(batch_id, language=None):
+    """Returns the cache key of the snapshot of a batch in a language, the
+    active one by default."""
+    return f"snapshot_{batch_id}_{language or translation.get_language()}"
+
+
+def delete_snapshots(batch_id):
+    """Deletes the snapshots of a batch in all the languages."""
+    filesystem_cache.delete_many(
+        [get_snapshot_key(batch_id, code) for code, _ in settings.LANGUAGES]
+    )
+
+
+def get_snapshot(batch, rebuild=False) -> dict:
+    """Returns the trace snapshot of the batch, building it if required."""
+    key = get_snapshot_key(batch.id)
+    if not rebuild:
+        snapshot = filesystem_cache.get(key)
+        if snapshot and snapshot["version"] == SNAPSHOT_VERSION:
+            return snapshot
+    snapshot = build_snapshot(batch)
+    filesystem_cache.set(key, snapshot, tags=get_snapshot_tags(snapshot))
+    return snapshot
+
+
+def get_snapshot_tags(snapshot) -> set:
+    """Returns the (name, id) tags of the objects a snapshot is built
+    from."""
+    transaction_ids = set(snapshot["transaction_ids"]) | set(
+        snapshot["claim_transaction_ids"]
+    )
+    node_ids = set(snapshot["actors"]) | set(snapshot["claim_actor_ids"])
+    for level_actor_ids in snapshot["stages"].values():
+        node_ids.update(level_actor_ids)
+    tags = {
+        ("batch", snapshot["batch_id"]),
+        ("language", snapshot["language"]),
+    }
+    tags.update(("transaction", _id) for _id in transaction_ids)
+    tags.update(("node", _id) for _id in node_ids)
+    tags.update(
+        ("batch", batch["batch__id"]) for batch in snapshot["external_batches"]
+    )
+    return tags
+
+
+def build_snapshot(batch) -> dict:
+    """Builds the trace snapshot of the batch.
+
+    The snapshot contains,
+        language: Language of the translated values of the actors.
+        transaction_ids: Parent transactions of the batch.
+        claim_transaction_ids: Parent transactions of the source
+            transaction, used for claims, including the ones of the other
+            result batches.
+        claim_actor_ids: Actors involved in the claim transactions.
+        actors: Values of the actors involved in the transactions, by id.
+        external_pairs: (source, destination) of external transactions.
+        internal_pairs: (node, node) of internal transactions.
+        external_batches: Batches of the trace with an external source.
+        external_sources: External sources of the batches, by node.
+        stages: Actors of each level of the chain, by level.
+        products: (product id, direction) of the products of every actor.
+    """
+    source_transaction = batch.source_transaction
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "batch_id": batch.id,
+        "language": translation.get_language(),
+        "transaction_ids": [],
+        "claim_transaction_ids": [],
+        "claim_actor_ids": [],
+        "actors": {},
+        "external_pairs": [],
+        "internal_pairs": [],
+        "external_batches": [],
+        "external_sources": {},
+        "stages": {
+            level: list(actors.order_by("-image").values_list("id", flat=True))
+            for level, actors in batch.get_parent_actors_levels().items()
+        },
+        "products": {},
+        "source_destination_id": None,
+        "source_destination_quantity": None,
+    }
+    if not source_transaction:
+        return snapshot
+
+    claim_transaction_ids = list(
+        source_transaction.get_parent_transactions().values_list(
+            "id", flat=True
+        )
+    )
+    claim_rows = _transaction_rows(claim_transaction_ids)
+    if source_transaction.result_batches.count() > 1:
+        transaction_ids = list(
+            source_transaction.get_parent_transactions(
+                batches=type(batch).objects.filter(pk=batch.pk)
+            ).values_list("id", flat=True)
+        )
+        rows = _transaction_rows(transaction_ids)
+    else:
+        transaction_ids, rows = claim_transaction_ids, claim_rows
+    internal_transaction_ids = list(
+        source_transaction.get_parent_transactions(
+            only_internal=True
+        ).values_list("id", flat=True)
+    )
+
+    snapshot.update(
+        {
+            "transaction_ids": transaction_ids,
+            "claim_transaction_ids": claim_transaction_ids,
+            "claim_actor_ids": _involved_actor_ids(claim_rows),
+            "external_pairs": [
+                (row[1], row[2])
+                for row in rows
+                if row[0] == txn_const.TRANSACTION_TYPE_EXTERNAL
+            ],
+            "internal_pairs": [
+                (row[3], row[3])
+                for row in rows
+                if row[0] == txn_const.TRANSACTION_TYPE_INTERNAL
+            ],
+            "source_destination_id": source_transaction.destination.id,
+            "source_destination_quantity": (
+                source_transaction._destination_quantity
+            ),
+        }
+    )
+    actor_ids = _involved_actor_ids(rows)
+    snapshot["actors"] = _get_actors(actor_ids, transaction_ids)
+    snapshot["products"] = _get_products(
+        actor_ids, transaction_ids, source_transaction
+    )
+    _set_external_batches(snapshot, transaction_ids + internal_transaction_ids)
+    return snapshot
+
+
+def _transaction_rows(transaction_ids) -> list:
+    """Returns the type and the actors of the transactions."""
+    return list(
+        Transaction.objects.filter(id__in=transaction_ids).values_list(
+            "transaction_type",
+            "externaltransaction__source_id",
+            "externaltransaction__destination_id",
+            "internaltransaction__node_id",
+            "internaltransaction__mode",
+        )
+    )
+
+
+def _involved_actor_ids(rows) -> list:
+    """Returns the actors of the transaction rows.
+
+    These are the source and destination of external transactions and the
+    node of manual internal transactions.
+    """
+    actor_ids = []
+    for _type, source_id, destination_id, node_id, mode in rows:
+        if _type == txn_const.TRANSACTION_TYPE_EXTERNAL:
+            actor_ids += [source_id, destination_id]
+        elif mode == txn_const.TRANSACTION_MODE_MANUAL:
+            actor_ids.append(node_id)
+    return list(dict.fromkeys(_id for _id in actor_ids if _id))
+
+
+def _get_actors(actor_ids, transaction_ids) -> dict:
+    """Returns the values of the actors by id.
+
+    The map and the stages show farmers with different names, so both are
+    kept. Supply chain is the last one of the actor, as a node in many
+    supply chains returns a row for each of them.
+    """
+    farmer_granted = Q(
+        type=sup_const.NODE_TYPE_FARM,
+        farmer__consent_status=sup_const.GRANTED,
+    )
+    rows = (
+        Node.objects.filter(pk__in=actor_ids)
+        .annotate(
+            map_name=Case(
+                When(type=sup_const.NODE_TYPE_COMPANY, then="company__name"),
+                When(
+                    farmer_granted,
+                    then=Concat("farmer__first_name", "farmer__last_name"),
+                ),
+                default=Value("Anonymous"),
+                output_field=CharField(),
+            ),
+            name=Case(
+                When(type=sup_const.NODE_TYPE_COMPANY, then="company__name"),
+                When(
+                    farmer_granted,
+                    then=Concat(
+                        "farmer__first_name",
+                        Value(" "),
+                        Left("farmer__last_name", 1),
+                        Value("."),
+                    ),
+                ),
+                default=Value("Anonymous"),
+                output_field=CharField(),
+            ),
+            image_url=Case(
+                When(image="", then=Value("")),
+                When(
+                    farmer_granted,
+                    then=Concat(Value(settings.MEDIA_URL), F("image")),
+                ),
+                output_field=CharField(),
+                default=Value(""),
+            ),
+            supply_chain=F("supply_chains"),
+        )
+        .values(
+            "id",
+            "map_name",
+            "name",
+            "longitude",
+            "latitude",
+            "description_basic",
+            "province",
+            "country",
+            "status",
+            "supply_chain",
+            "image_url",
+            "type",
+        )
+    )
+    actors = {}
+    for row in rows:
+        actors[row["id"]] = row
+
+    # Quantity of the first outgoing transaction of each actor.
+    quantities = {}
+    for source_id, quantity in ExternalTransaction.objects.filter(
+        id__in=transaction_ids, source_id__in=actor_ids
+    ).values_list("source_id", "_source_quantity"):
+        quantities.setdefault(source_id, quantity)
+
+    operations = defaultdict(list)
+    for (
+        node_id,
+        supply_chain_id,
+        operation_id,
+    ) in NodeSupplyChain.objects.filter(
+        node_id__in=actor_ids, primary_operation__isnull=False
+    ).values_list(
+        "node_id", "supply_chain_id", "primary_operation_id"
+    ):
+        if actors[node_id]["supply_chain"] == supply_chain_id:
+            operations[node_id].append(operation_id)
+
+    for actor_id, actor in actors.items():
+        actor["transaction_quantity"] = quantities.get(actor_id)
+        actor["operation_ids"] = operations[actor_id]
+    return actors
+
+
+def _get_products(actor_ids, transaction_ids, source_transaction) -> dict:
+    """Returns the (product id, direction) of the products of each actor.
+
+    Products of the batches an actor sent are outgoing, the ones it
+    received are incoming and the ones in both are incoming and processed.
+    The product of an internal source transaction is processed by its node
+    if it was neither sent nor received.
+    """
+    outgoing = defaultdict(set)
+    incoming = defaultdict(set)
+    for source_id, destination_id, product_id in SourceBatch.objects.filter(
+        transaction_id__in=transaction_ids
+    ).values_list(
+        "transaction__externaltransaction__source_id",
+        "transaction__externaltransaction__destination_id",
+        "batch__product_id",
+    ):
+        outgoing[source_id].add(product_id)
+        incoming[destination_id].add(product_id)
+
+    source_product_id = source_transaction.product.id
+    products = {}
+    for actor_id in actor_ids:
+        common = incoming[actor_id] & outgoing[actor_id]
+        actor_products = []
+        if (
+            source_transaction.is_internal
+            and source_transaction.internaltransaction.node_id == actor_id
+            and source_product_id not in incoming[actor_id]
+            and source_product_id not in outgoing[actor_id]
+        ):
+            actor_products.append((source_product_id, prod_const.PROCESSED))
+        for product_ids, direction in (
+            (common, prod_const.INCOMING_AND_PROCESSED),
+            (outgoing[actor_id] - common, prod_const.OUTGOING),
+            (incoming[actor_id] - common, prod_const.INCOMING),
+        ):
+            actor_products += [(_id, direction) for _id in sorted(product_ids)]
+        products[actor_id] = actor_products
+    return products
+
+
+def _set_external_batches(snapshot, transaction_ids):
+    """Sets the batches with an external source used in the
+    transactions."""
+    source_batches = (
+        SourceBatch.objects.filter(
+            transaction_id__in=transaction_ids,
+            batch__external_source__isnull=False,
+            batch__node__isnull=False,
+        )
+        .annotate(
+            source_id=Case(
+                When(
+                    transaction__internaltransaction__isnull=False,
+                    then="transaction__internaltransaction__node_id",
+                ),
+                default="transaction__externaltransaction__source_id",
+                output_field=IntegerField(),
+            )
+        )
+        .values(
+            "batch__id",
+            "batch__name",
+            "batch__external_lat",
+            "batch__external_long",
+            "source_id",
+            "batch__node",
+            "batch__external_source",
+        )
+    )
+    external_sources = defaultdict(list)
+    for source_batch in source_batches:
+        external_sources[source_batch.pop("batch__node")].append(
+            source_batch.pop("batch__external_source")
+        )
+        snapshot["external_batches"].append(source_batch)
+    snapshot["external_sources"] = dict(external_sources)
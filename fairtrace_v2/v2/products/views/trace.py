@@ -10,6 +10,7 @@ from django.utils import translation
 from rest_framework import generics
 from rest_framework.response import Response
 from v2.accounts import permissions as user_permissions
+from v2.dashboard.cache_handlers import get_dependencies
 from v2.dashboard.models import CITheme
 from v2.products.models import Batch
 from v2.products.serializers import trace as trace_serializers
@@ -118,7 +119,9 @@ class BaseTraceRetrieveAPIView(generics.RetrieveAPIView):
             context={"request": self.request, "view": self},
         )
         data = serializer.data
-        filesystem_cache.set(key, data)
+        theme_id = extra_objects[0].id if extra_objects else None
+        tags = get_dependencies(instance, theme_id)
+        filesystem_cache.set(key, data, tags=tags)
         return data
 
     def _clean_key(self, key):
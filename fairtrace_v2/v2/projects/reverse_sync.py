@@ -43,6 +43,7 @@ from v2.supply_chains.views.node import CreateListNodeMember
 from v2.supply_chains.views.supply_chain import InviteCompany
 from v2.transactions.constants import (VERIFICATION_METHOD_CARD,
                                        VERIFICATION_METHOD_MANUAL)
+from v2.transactions.context import TransactionContext
 from v2.transactions.models import ExternalTransaction, InternalTransaction
 from v2.transactions.serializers.internal import InternalTransactionSerializer
 from v2.transactions.serializers.other import TransactionDeleteSerializer
@@ -154,6 +155,9 @@ class ReverseSync:
         """
         self.messages = []
         self._supplier_buyer_ids = None
+        # Nodes, products, connections and wallets shared by the
+        # transactions of the sync.
+        self.transaction_context = TransactionContext()
         self.created_on = unix_to_datetime(created_on) if created_on else None
         self.sync = Synchronization.objects.get(id=decode(sync_id))
         try:
@@ -900,12 +904,14 @@ class ReverseSync:
             data["type"] = APP_TRANS_TYPE_INCOMING
         
         try:
-            data["node"] = Node.objects.get(
-                external_id=transaction[node_key]
+            data["node"] = self.transaction_context.get_node_by_external_id(
+                transaction[node_key]
             ).pk
-            data["product"] = Product.objects.get(
-                external_id=transaction["product"]
-            ).idencode
+            data["product"] = (
+                self.transaction_context.get_product_by_external_id(
+                    transaction["product"]
+                ).idencode
+            )
         except Exception as e:
             self.messages.append(f"{str(e)}")
             data = {}
@@ -956,6 +962,7 @@ class ReverseSync:
             return
             
         # Use the appropriate serializer based on whether it's a new or existing transaction
+        context["transaction_context"] = self.transaction_context
         serializer = AppTransactionSerializer(data=data, context=context)
         if ext_txn_instance:
             serializer = TransactionDeleteSerializer(
@@ -1012,6 +1019,7 @@ class ReverseSync:
             )
             return
         
+        context["transaction_context"] = self.transaction_context
         serializer = AppSentTransactionSerializer(data=data, context=context)
         if ext_txn_instance:
             serializer = TransactionDeleteSerializer(
@@ -1042,7 +1050,9 @@ class ReverseSync:
                 None if the product is invalid.
         """
         try:
-            product = Product.objects.get(external_id=transaction["product"])
+            product = self.transaction_context.get_product_by_external_id(
+                transaction["product"]
+            )
         except Exception as e:
             self.messages.append(
                 f"Internal txn {transaction['id']} product-{str(e)}"
@@ -1141,7 +1151,9 @@ class ReverseSync:
             else:
                 # If source is a farm, it's a "buy"/incoming txn for node
                 try:
-                    source_obj = Node.objects.get(external_id=src)
+                    source_obj = (
+                        self.transaction_context.get_node_by_external_id(src)
+                    )
                 except Exception as e:
                     self.messages.append(
                         f"Txn {txn['id']}: Source node Issue-{str(e)})"
@@ -1,12 +1,23 @@
 from common import admin as common_admin
 from django.contrib import admin
 from v2.reports.models import Export
+from v2.reports.models import ExportShard
+
+
+class ExportShardInline(admin.TabularInline):
+    """Shards of the export, while it is generated."""
+
+    model = ExportShard
+    fields = ("index", "first_pk", "last_pk", "rows", "status", "updated_on")
+    readonly_fields = fields
+    extra = 0
 
 
 class ExportAdmin(common_admin.BaseAdmin):
     """Class to handle ExportAdmin and functions."""
 
     autocomplete_fields = ("node",)
+    inlines = (ExportShardInline,)
 
 
 admin.site.register(Export, ExportAdmin)
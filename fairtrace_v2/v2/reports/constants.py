@@ -34,10 +34,17 @@ PENDING = "PEND"
 COMPLETED = "DONE"
 REVOKED = "RVKD"
 FAILED = "FAIL"
+MERGING = "MERG"
 
 STATUS_CHOICES = [
     (PENDING, "PENDING"),
     (COMPLETED, "COMPLETED"),
     (REVOKED, "REVOKED"),
     (FAILED, "FAILED"),
+    (MERGING, "MERGING"),
 ]
+
+# Weight of the latest export in the rolling rows per second.
+ROW_RATE_WEIGHT = 0.2
+# Rows per second assumed before any export of a type is completed.
+DEFAULT_ROW_RATE = 20
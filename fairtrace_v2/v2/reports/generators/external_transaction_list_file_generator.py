@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from common import datasheets
 from common.datasheets.gererators import GeneratorMethod
 from django.conf import settings
@@ -5,6 +7,7 @@ from v2.claims.constants import STATUS_APPROVED
 from v2.claims.models import AttachedBatchClaim
 from v2.products.constants import UNIT_CHOICES
 from v2.products.constants import UNIT_KG
+from v2.products.models import Batch
 from v2.supply_chains.constants import NODE_TYPE_CHOICES
 from v2.transactions.constants import EXTERNAL_TRANS_TYPE_CHOICES
 from v2.transactions.constants import EXTERNAL_TRANS_TYPE_INCOMING
@@ -31,7 +34,7 @@ class ExternalTransactionDataSheet(datasheets.TemplateDataGenerator):
             "Product": "product__name",
             "Quantity": "destination_quantity",
             "Transaction Type": GeneratorMethod("transaction_type"),
-            "Unit": GeneratorMethod("unit"),
+            "Unit": GeneratorMethod("unit", batch=True),
             "Date": "date",
             "Price": "price",
             "Currency": "currency",
@@ -55,18 +58,36 @@ class ExternalTransactionDataSheet(datasheets.TemplateDataGenerator):
             "Buyer Reference Number": "buyer_ref_number",
             "Seller Reference Number": "seller_ref_number",
             "Blockchain Hash": "blockchain_address",
-            "Claims": GeneratorMethod("claims"),
+            "Claims": GeneratorMethod("claims", batch=True),
             "Comments": "comment",
             "Trace URL": GeneratorMethod("trace_url"),
         }
+        select_related = (
+            "source__company",
+            "source__farmer",
+            "destination__company",
+            "destination__farmer",
+        )
 
     @staticmethod
-    def unit(instance):
-        """Returns unit."""
-        try:
-            return dict(UNIT_CHOICES)[int(instance.result_batch.unit)]
-        except Exception as e:
-            return UNIT_KG
+    def unit(items):
+        """Returns unit of the result batch of each transaction, the latest
+        one as with result_batch."""
+        units = {}
+        for transaction_id, unit in (
+            Batch.objects.filter(source_transaction__in=items)
+            .order_by("-created_on")
+            .values_list("source_transaction_id", "unit")
+        ):
+            units.setdefault(transaction_id, unit)
+        choices = dict(UNIT_CHOICES)
+        data = {}
+        for item in items:
+            try:
+                data[item.pk] = choices[int(units[item.pk])]
+            except Exception:
+                data[item.pk] = UNIT_KG
+        return data
 
     @staticmethod
     def source_type(instance):
@@ -88,12 +109,15 @@ class ExternalTransactionDataSheet(datasheets.TemplateDataGenerator):
         return f'=HYPERLINK("{link}", "Transaction Details (Trace)")'
 
     @staticmethod
-    def claims(instance):
-        """Returns claims."""
-        attached_claims = AttachedBatchClaim.objects.filter(
-            batch__in=instance.result_batches.all(), status=STATUS_APPROVED
-        )
-        return ", ".join(attached_claims.values_list("claim__name", flat=True))
+    def claims(items):
+        """Returns approved claims of the result batches of each
+        transaction."""
+        claims = defaultdict(list)
+        for transaction_id, name in AttachedBatchClaim.objects.filter(
+            batch__source_transaction__in=items, status=STATUS_APPROVED
+        ).values_list("batch__source_transaction_id", "claim__name"):
+            claims[transaction_id].append(name)
+        return {item.pk: ", ".join(claims[item.pk]) for item in items}
 
     def transaction_type(self, instance):
         """Returns transaction type."""
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from common import datasheets
 from common.datasheets.gererators import GeneratorMethod
 from django.conf import settings
@@ -42,7 +44,7 @@ class StokeDataSheet(datasheets.TemplateDataGenerator):
             "Creator Name": "creator__name",
             "Creator Email": "creator__email",
             "Blockchain Hash": "source_transaction__blockchain_address",
-            "Claims": GeneratorMethod("claims"),
+            "Claims": GeneratorMethod("claims", batch=True),
             "Comments": "note",
             "Trace URL": GeneratorMethod("trace_url"),
         }
@@ -69,9 +71,11 @@ class StokeDataSheet(datasheets.TemplateDataGenerator):
         return f'=HYPERLINK("{link}", "Batch Details (Trace)")'
 
     @staticmethod
-    def claims(instance):
-        """Returns claims."""
-        attached_claims = AttachedBatchClaim.objects.filter(
-            batch=instance, status=STATUS_APPROVED
-        )
-        return ", ".join(attached_claims.values_list("claim__name", flat=True))
+    def claims(items):
+        """Returns approved claims of each batch."""
+        claims = defaultdict(list)
+        for batch_id, name in AttachedBatchClaim.objects.filter(
+            batch__in=items, status=STATUS_APPROVED
+        ).values_list("batch_id", "claim__name"):
+            claims[batch_id].append(name)
+        return {item.pk: ", ".join(claims[item.pk]) for item in items}
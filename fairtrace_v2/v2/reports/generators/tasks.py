@@ -1,7 +1,18 @@
-import time
+import datetime
+import decimal
+import gzip
+import json
+import tempfile
+from datetime import timedelta
 
 from celery import shared_task
 from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.utils import timezone
 from sentry_sdk import capture_exception
 
 from v2.reports.constants import ADMIN_COMPANY
@@ -14,7 +25,9 @@ from v2.reports.constants import EXTERNAL_TRANSACTION
 from v2.reports.constants import FAILED
 from v2.reports.constants import FARMER
 from v2.reports.constants import INTERNAL_TRANSACTION
+from v2.reports.constants import MERGING
 from v2.reports.constants import PAYMENTS
+from v2.reports.constants import PENDING
 from v2.reports.constants import STOCK
 from v2.reports.generators import AdminCompanyDataSheet
 from v2.reports.generators import AdminFarmerDataSheet
@@ -23,6 +36,7 @@ from v2.reports.generators import InternalTransactionDataSheet
 from v2.reports.generators import NodeDataSheet
 from v2.reports.generators import PaymentDataSheet
 from v2.reports.generators import StokeDataSheet
+from v2.reports.querysets import get_export_queryset
 
 DATA_SHEET_CLASS = {
     STOCK: StokeDataSheet,
@@ -39,25 +53,293 @@ DATA_SHEET_CLASS = {
 
 BUFFER = 5  # Putting a buffer in response time.
 
+# Key of the type of the values tagged in the rows of the shard files.
+SHARD_VALUE_TYPE = "__type__"
+
+
+class ShardRowEncoder(DjangoJSONEncoder):
+    """Encodes the rows of the shard files.
+
+    Dates and decimals are tagged with their type, so that they are decoded
+    back with decode_shard_value and written to the sheet as they were.
+    """
+
+    def default(self, o):
+        """Tag the dates and decimals with their type."""
+        if isinstance(o, datetime.datetime):
+            return {SHARD_VALUE_TYPE: "datetime", "value": o.isoformat()}
+        if isinstance(o, datetime.date):
+            return {SHARD_VALUE_TYPE: "date", "value": o.isoformat()}
+        if isinstance(o, decimal.Decimal):
+            return {SHARD_VALUE_TYPE: "decimal", "value": str(o)}
+        return super().default(o)
+
+
+SHARD_VALUE_DECODERS = {
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "decimal": decimal.Decimal,
+}
+
+
+def decode_shard_value(obj):
+    """Decodes the values tagged by ShardRowEncoder."""
+    if SHARD_VALUE_TYPE in obj:
+        return SHARD_VALUE_DECODERS[obj[SHARD_VALUE_TYPE]](obj["value"])
+    return obj
+
+
+def _elapsed(instance):
+    """Returns the seconds since the export was created."""
+    return (timezone.now() - instance.created_on).total_seconds()
+
+
+def plan_shards(instance, queryset):
+    """Creates the shards of the export, splitting the items of the
+    queryset in ranges of 'EXPORT_SHARD_SIZE' in the export order."""
+    shard_model = apps.get_model("reports", "ExportShard")
+    qs, _ = DATA_SHEET_CLASS[instance.export_type].order_by_key(queryset)
+    size = settings.EXPORT_SHARD_SIZE
+    shards = []
+    pks = qs.values_list("pk", flat=True).iterator(chunk_size=10000)
+    for index, pk in enumerate(pks):
+        if index % size == 0:
+            shards.append(
+                shard_model(
+                    export=instance,
+                    index=len(shards),
+                    first_pk=pk,
+                    last_pk=pk,
+                )
+            )
+        shards[-1].last_pk = pk
+    return shard_model.objects.bulk_create(shards)
+
+
+def _dispatch_shard(shard):
+    """Queues the generation of a shard."""
+    type(shard).objects.filter(pk=shard.pk).update(updated_on=timezone.now())
+    generate_export_shard.delay(shard.id)
+
 
 @shared_task(name="generate_file", queue="high")
-def generate_file(instance_id, pks, model, app, file_name):
-    """Generate file according to the template and type."""
-    st = time.time()
+def generate_file(instance_id, file_name):
+    """Generate file according to the template and type.
+
+    The queryset is rebuilt from the filters of the export and split in
+    shards, which are generated concurrently and merged into the file once
+    all of them are completed. The shards of an export that was already
+    planned are only queued again.
+
+    The export is touched before planning, so that it is planned again by
+    'resume_exports' if the worker restarts while planning it, and locked
+    while planning, so that it is only planned once.
+    """
     export_model = apps.get_model("reports", "Export")
-    qs_model = apps.get_model(app, model)
     instance = export_model.objects.get(id=instance_id)
-    queryset = qs_model.objects.filter(pk__in=pks)
+    export_model.objects.filter(pk=instance.pk).update(
+        updated_on=timezone.now()
+    )
+    try:
+        with db_transaction.atomic():
+            instance = export_model.objects.select_for_update().get(
+                id=instance_id
+            )
+            shards = list(instance.shards.all())
+            if not shards:
+                queryset = get_export_queryset(instance)
+                instance.rows = queryset.count()
+                instance.save(update_fields=["rows"])
+                shards = plan_shards(instance, queryset)
+    except Exception as err:
+        _fail(instance, err)
+        return
+    if not shards:
+        merge_export.delay(instance_id, file_name)
+        return
+    for shard in shards:
+        if shard.status != COMPLETED:
+            _dispatch_shard(shard)
+
+
+@shared_task(name="generate_export_shard", queue="high")
+def generate_export_shard(shard_id):
+    """Generates the rows of a shard into its intermediate file."""
+    shard_model = apps.get_model("reports", "ExportShard")
+    shard = shard_model.objects.select_related("export").get(id=shard_id)
+    instance = shard.export
+    if shard.status == COMPLETED or instance.status != PENDING:
+        return
+    try:
+        data_sheet = DATA_SHEET_CLASS[instance.export_type](instance)
+        queryset = get_export_queryset(instance).filter(
+            pk__range=sorted((shard.first_pk, shard.last_pk))
+        )
+        progress = _progress(instance, shard)
+        write_shard_rows(shard, data_sheet.iter_data(queryset, progress))
+        data_sheet.close()
+    except Exception as err:
+        _fail(instance, err)
+        return
+    shard_model.objects.filter(pk=shard.pk).update(
+        status=COMPLETED, updated_on=timezone.now()
+    )
+    _shard_completed(instance.id)
+
+
+def _progress(instance, shard):
+    """Returns a callback writing the rows done of the shard and the
+    estimated time of completion of the export, from the rows per second of
+    all of its shards so far."""
+    shard_model = type(shard)
+    export_model = type(instance)
+
+    def update(done):
+        shard_model.objects.filter(pk=shard.pk).update(
+            rows=done, updated_on=timezone.now()
+        )
+        total_done = instance.shards.aggregate(done=Sum("rows"))["done"]
+        elapsed = _elapsed(instance)
+        etc = round(elapsed * instance.rows / max(total_done, 1))
+        export_model.objects.filter(pk=instance.pk).update(etc=etc)
+
+    return update
+
+
+def _shard_completed(instance_id):
+    """Queues the merge once every shard of the export is completed.
+
+    The export is locked while checking the shards, so that the merge is
+    queued once even if the last shards complete at the same time.
+    """
+    export_model = apps.get_model("reports", "Export")
+    with db_transaction.atomic():
+        instance = export_model.objects.select_for_update().get(id=instance_id)
+        if instance.status != PENDING:
+            return
+        if instance.shards.exclude(status=COMPLETED).exists():
+            return
+        instance.status = MERGING
+        instance.save(update_fields=["status", "updated_on"])
+    merge_export.delay(instance_id, instance.file_name)
+
+
+def write_shard_rows(shard, rows):
+    """Writes the rows into the intermediate file of the shard.
+
+    Rows are written as JSON lines in a gzip file, so that the merge can
+    read them back one at a time.
+    """
+    with tempfile.TemporaryFile() as temp:
+        with gzip.GzipFile(fileobj=temp, mode="wb") as file:
+            for row in rows:
+                line = json.dumps(row, cls=ShardRowEncoder) + "\n"
+                file.write(line.encode())
+        temp.seek(0)
+        shard.file.save(f"shard_{shard.index}.jsonl.gz", File(temp))
+
+
+def iter_shard_rows(shards, heartbeat=None):
+    """Yields the rows of the intermediate files of the shards in order.
+
+    'heartbeat' is called before reading every shard.
+    """
+    for shard in shards:
+        if heartbeat:
+            heartbeat()
+        with shard.file.open("rb") as stored, gzip.GzipFile(
+            fileobj=stored, mode="rb"
+        ) as file:
+            for line in file:
+                yield json.loads(line, object_hook=decode_shard_value)
+
+
+def _claim_merge(export_model, instance_id):
+    """Marks the export as merging and returns it, or None if it is not
+    waiting for a merge or another merge is claiming it."""
+    with db_transaction.atomic():
+        instance = (
+            export_model.objects.select_for_update(skip_locked=True)
+            .filter(id=instance_id, status__in=(PENDING, MERGING))
+            .first()
+        )
+        if not instance:
+            return None
+        instance.status = MERGING
+        instance.save(update_fields=["status", "updated_on"])
+    return instance
+
+
+@shared_task(name="merge_export", queue="high")
+def merge_export(instance_id, file_name):
+    """Merges the shards of the export into its file.
+
+    The export is touched while merging, so that resume_exports does not
+    consider a long merge interrupted and queue another one.
+    """
+    export_model = apps.get_model("reports", "Export")
+    instance = _claim_merge(export_model, instance_id)
+    if not instance:
+        return
+
+    def heartbeat():
+        export_model.objects.filter(pk=instance.pk).update(
+            updated_on=timezone.now()
+        )
+
+    shards = list(instance.shards.all())
     try:
         data_sheet = DATA_SHEET_CLASS[instance.export_type](instance)
-        data_sheet.to_sheet(queryset)
+        data_sheet.write_sheet(iter_shard_rows(shards, heartbeat))
+        heartbeat()
         data_sheet.save_to_instance(file_name)
         data_sheet.close()
     except Exception as err:
-        instance.status = FAILED
-        instance.save(update_fields=["status"])
-        capture_exception(err)
-    et = time.time() - st
+        _fail(instance, err)
+        return
+    for shard in shards:
+        shard.file.delete(save=False)
+    instance.shards.all().delete()
+    et = _elapsed(instance)
+    export_model.update_row_rate(instance.export_type, instance.rows, et)
     instance.status = COMPLETED
     instance.atc = round(et) + BUFFER
-    instance.save(update_fields=["status", "atc", "file"])
+    instance.save(update_fields=["status", "atc", "file", "updated_on"])
+
+
+def _fail(instance, err):
+    """Marks the export as failed, unless it is already completed or
+    failed by another task."""
+    type(instance).objects.filter(
+        pk=instance.pk, status__in=(PENDING, MERGING)
+    ).update(status=FAILED, updated_on=timezone.now())
+    instance.refresh_from_db(fields=["status"])
+    capture_exception(err)
+
+
+@shared_task(name="resume_exports")
+def resume_exports():
+    """Queues again the plans, shards and merges that were interrupted.
+
+    Plans, shards and merges are interrupted when a worker restarts while
+    running them, and are considered so when they were not updated for
+    'EXPORT_SHARD_TIMEOUT' seconds. An export is being planned while it is
+    pending without shards.
+    """
+    export_model = apps.get_model("reports", "Export")
+    shard_model = apps.get_model("reports", "ExportShard")
+    stale = timezone.now() - timedelta(seconds=settings.EXPORT_SHARD_TIMEOUT)
+    for instance in export_model.objects.filter(
+        status=PENDING, shards__isnull=True, updated_on__lt=stale
+    ):
+        instance.save(update_fields=["updated_on"])
+        generate_file.delay(instance.id, instance.file_name)
+    for shard in shard_model.objects.filter(
+        export__status=PENDING, updated_on__lt=stale
+    ).exclude(status=COMPLETED):
+        _dispatch_shard(shard)
+    for instance in export_model.objects.filter(
+        status=MERGING, updated_on__lt=stale
+    ):
+        instance.save(update_fields=["updated_on"])
+        merge_export.delay(instance.id, instance.file_name)
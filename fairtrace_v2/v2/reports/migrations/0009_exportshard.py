@@ -0,0 +1,43 @@
+# Generated by Django 2.2.6 on 2026-10-16 10:00
+
+import common.library
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reports', '0008_auto_20230417_1130'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='export',
+            name='status',
+            field=models.CharField(choices=[('PEND', 'PENDING'), ('DONE', 'COMPLETED'), ('RVKD', 'REVOKED'), ('FAIL', 'FAILED'), ('MERG', 'MERGING')], default='PEND', max_length=4),
+        ),
+        migrations.CreateModel(
+            name='ExportShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('index', models.PositiveIntegerField()),
+                ('first_pk', models.IntegerField()),
+                ('last_pk', models.IntegerField()),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('file', models.FileField(blank=True, null=True, upload_to=common.library.get_file_path_without_random)),
+                ('status', models.CharField(choices=[('PEND', 'PENDING'), ('DONE', 'COMPLETED'), ('RVKD', 'REVOKED'), ('FAIL', 'FAILED'), ('MERG', 'MERGING')], default='PEND', max_length=4)),
+                ('creator', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='creator_exportshard_objects', to=settings.AUTH_USER_MODEL)),
+                ('export', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='reports.Export')),
+                ('updater', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updater_exportshard_objects', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('index',),
+                'unique_together': {('export', 'index')},
+            },
+        ),
+    ]
@@ -1,12 +1,15 @@
 from common import models as common_models
 from common.library import get_file_path_without_random
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 from django_extensions.db.fields import json
+from v2.reports.constants import DEFAULT_ROW_RATE
 from v2.reports.constants import EXCEL
 from v2.reports.constants import EXPORT_TYPE_CHOICES
 from v2.reports.constants import FILE_TYPE_CHOICES
 from v2.reports.constants import PENDING
+from v2.reports.constants import ROW_RATE_WEIGHT
 from v2.reports.constants import STATUS_CHOICES
 from v2.reports.managers import ExportQuerySet
 from v2.supply_chains.models import Node
@@ -41,26 +44,40 @@ class Export(common_models.AbstractBaseModel):
 
     @property
     def initial_etc(self):
-        """To calculate estimated time of completion from previous entries.
+        """To calculate estimated time of completion from the rolling rows
+        per second of the export type.
 
         * Return: etc for a row.
         """
         if not self.etc or self.etc == 0:  # Note Check this
-            # noinspection PyUnresolvedReferences
-            model = self._meta.model
-            atc_rows_map = model.objects.filter(
-                export_type=self.export_type
-            ).values_list("atc", "rows")
-            atc_rows_map = dict(atc_rows_map)
-            atc_sum = sum(atc_rows_map.keys())
-            rows_sum = sum(atc_rows_map.values())
-            try:
-                # Adding a 20 % extra in estimate.
-                return (atc_sum / rows_sum) * 1.2
-            except ZeroDivisionError:
-                return 0.05
+            # Adding a 20 % extra in estimate.
+            return 1.2 / self.get_row_rate(self.export_type)
         return self.etc / self.rows
 
+    @staticmethod
+    def _row_rate_key(export_type):
+        """Returns the cache key of the rows per second of a type."""
+        return f"export_row_rate_{export_type}"
+
+    @classmethod
+    def get_row_rate(cls, export_type) -> float:
+        """Returns the rolling rows per second of the export type."""
+        return cache.get(cls._row_rate_key(export_type)) or DEFAULT_ROW_RATE
+
+    @classmethod
+    def update_row_rate(cls, export_type, rows, seconds):
+        """Adds the rows per second of a completed export to the rolling
+        rate of its type."""
+        if not rows or seconds <= 0:
+            return
+        key = cls._row_rate_key(export_type)
+        rate = cache.get(key)
+        if rate:
+            rate += ROW_RATE_WEIGHT * (rows / seconds - rate)
+        else:
+            rate = rows / seconds
+        cache.set(key, rate, None)
+
     @property
     def initial_file_name(self) -> str:
         """Generate file_name for the new file."""
@@ -71,3 +88,35 @@ class Export(common_models.AbstractBaseModel):
             now = timezone.now()
             return prefix + now.strftime("_%Y_%m_%d_%H_%M_%S") + extension
         return str(self.file_name)
+
+
+class ExportShard(common_models.AbstractBaseModel):
+    """Model to store a range of the items of an export.
+
+    The items of large exports are split in ranges of the pk, each of them
+    generated by a separate task into an intermediate file, which are merged
+    into the file of the export once every shard is completed. Shards are
+    kept until then so that an interrupted export can be resumed.
+    """
+
+    export = models.ForeignKey(
+        Export, on_delete=models.CASCADE, related_name="shards"
+    )
+    index = models.PositiveIntegerField()
+    first_pk = models.IntegerField()
+    last_pk = models.IntegerField()
+    rows = models.PositiveIntegerField(default=0)
+    file = models.FileField(
+        upload_to=get_file_path_without_random, blank=True, null=True
+    )
+    status = models.CharField(
+        max_length=4, choices=STATUS_CHOICES, default=PENDING
+    )
+
+    class Meta:
+        ordering = ("index",)
+        unique_together = ("export", "index")
+
+    def __str__(self):
+        """To perform function __str__."""
+        return f"{self.export_id} | {self.index}"
@@ -0,0 +1,146 @@
+"""Querysets of the exports.
+
+The queryset of an export is built from its type, node and filters, so that
+it can be rebuilt in the worker generating the file instead of passing the
+ids of the items to the task.
+"""
+from common.library import decode
+from common.library import filter_queryset
+from django.db.models import Q
+from django.db.models import Subquery
+from v2.products.filters import BatchFilter
+from v2.products.models import Batch
+from v2.projects.models import Payment
+from v2.reports.constants import ADMIN_COMPANY
+from v2.reports.constants import ADMIN_EXTERNAL_TRANSACTION
+from v2.reports.constants import ADMIN_FARMER
+from v2.reports.constants import COMPANY
+from v2.reports.constants import CONNECTIONS
+from v2.reports.constants import EXTERNAL_TRANSACTION
+from v2.reports.constants import FARMER
+from v2.reports.constants import INTERNAL_TRANSACTION
+from v2.reports.constants import PAYMENTS
+from v2.reports.constants import STOCK
+from v2.supply_chains.constants import NODE_TYPE_COMPANY
+from v2.supply_chains.constants import NODE_TYPE_FARM
+from v2.supply_chains.filters import CompanyFilter
+from v2.supply_chains.filters import FarmerFilter
+from v2.supply_chains.models import Company
+from v2.supply_chains.models import Farmer
+from v2.supply_chains.models import SupplyChain
+from v2.transactions.filters import ExternalTransactionFilter
+from v2.transactions.filters import InternalTransactionFilter
+from v2.transactions.models import ExternalTransaction
+from v2.transactions.models import InternalTransaction
+
+
+def get_export_queryset(instance):
+    """Returns the filtered queryset of the export.
+
+    Filters joining to-many relations return an item once for every
+    matching related object, so the items are selected by pk from the
+    filtered queryset, in the pk order of its first ordering.
+    """
+    qs = EXPORT_QUERYSETS[instance.export_type](instance)
+    ordering = qs.query.order_by or qs.model._meta.ordering
+    pk_ordering = "pk"
+    if ordering and str(ordering[0]).startswith("-"):
+        pk_ordering = "-pk"
+    return qs.model._default_manager.filter(
+        pk__in=Subquery(qs.order_by().values("pk"))
+    ).order_by(pk_ordering)
+
+
+def get_stoke_qs(instance):
+    """Get filtered queryset."""
+    qs = Batch.objects.filter(node=instance.node, current_quantity__gt=0)
+    filterset_class = BatchFilter
+    return filter_queryset(
+        filterset_class, instance.filters, qs, node=instance.node
+    )
+
+
+def get_internal_transaction_qs(instance):
+    """Get filtered queryset."""
+    qs = InternalTransaction.objects.filter(node=instance.node)
+    filterset_class = InternalTransactionFilter
+    return filter_queryset(
+        filterset_class, instance.filters, qs, node=instance.node
+    )
+
+
+def get_external_transaction_qs(instance):
+    """Get filtered queryset."""
+    qs = ExternalTransaction.objects.filter(
+        Q(source=instance.node) | Q(destination=instance.node)
+    )
+    filterset_class = ExternalTransactionFilter
+    return filter_queryset(
+        filterset_class, instance.filters, qs, node=instance.node
+    )
+
+
+def get_connection_qs(instance):
+    """Get filtered queryset."""
+    filters = {}
+    if "supply_chain" in instance.filters:
+        filters["supply_chain"] = SupplyChain.objects.get(
+            pk=decode(instance.filters["supply_chain"])
+        )
+    node = instance.node
+    suppliers, _ = node.get_supplier_chain(include_self=True, **filters)
+    buyers, _ = node.get_buyer_chain(**filters)
+    return suppliers | buyers
+
+
+def get_farmer_qs(instance):
+    """Get filtered queryset."""
+    qs = get_connection_qs(instance)
+    return qs.filter(type=NODE_TYPE_FARM)
+
+
+def get_company_qs(instance):
+    """Get filtered queryset."""
+    qs = get_connection_qs(instance)
+    return qs.filter(type=NODE_TYPE_COMPANY)
+
+
+def get_admin_company_qs(instance):
+    """Get filtered queryset for admin_company."""
+    qs = Company.objects.all()
+    filterset_class = CompanyFilter
+    return filter_queryset(filterset_class, instance.filters, qs)
+
+
+def get_admin_farmer_qs(instance):
+    """Get filtered queryset for admin_farmer."""
+    qs = Farmer.objects.all()
+    filterset_class = FarmerFilter
+    return filter_queryset(filterset_class, instance.filters, qs)
+
+
+def get_admin_transaction_qs(instance):
+    """Get filtered queryset for admin_transaction."""
+    qs = ExternalTransaction.objects.all()
+    filterset_class = ExternalTransactionFilter
+    return filter_queryset(filterset_class, instance.filters, qs)
+
+
+def get_payment_qs(instance):
+    """Get filtered queryset for payments."""
+    qs = Payment.objects.all()
+    return qs.filter_by_data(instance.filters)
+
+
+EXPORT_QUERYSETS = {
+    STOCK: get_stoke_qs,
+    INTERNAL_TRANSACTION: get_internal_transaction_qs,
+    EXTERNAL_TRANSACTION: get_external_transaction_qs,
+    CONNECTIONS: get_connection_qs,
+    FARMER: get_farmer_qs,
+    COMPANY: get_company_qs,
+    ADMIN_COMPANY: get_admin_company_qs,
+    ADMIN_FARMER: get_admin_farmer_qs,
+    ADMIN_EXTERNAL_TRANSACTION: get_admin_transaction_qs,
+    PAYMENTS: get_payment_qs,
+}
@@ -0,0 +1,49 @@
+from mixer.backend.django import mixer
+from v2.products.models import Batch
+from v2.products.models import Product
+from v2.reports.constants import INTERNAL_TRANSACTION
+from v2.reports.models import Export
+from v2.reports.querysets import get_export_queryset
+from v2.reports.tests.integration.base import ReportsBaseTestCase
+from v2.transactions.models import InternalTransaction
+from v2.transactions.models import SourceBatch
+
+
+class ExportQuerysetTestCase(ReportsBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            name="Cocoa beans", supply_chain=self.supply_chain
+        )
+
+    def create_transaction(self, batch_count):
+        transaction = mixer.blend(
+            InternalTransaction, node=self.company, archived=False
+        )
+        for _ in range(batch_count):
+            batch = mixer.blend(
+                Batch,
+                node=self.company,
+                product=self.product,
+                current_quantity=10,
+            )
+            mixer.blend(SourceBatch, transaction=transaction, batch=batch)
+        return transaction
+
+    def test_search_match_in_many_batches_is_exported_once(self):
+        first = self.create_transaction(batch_count=2)
+        second = self.create_transaction(batch_count=1)
+        export = mixer.blend(
+            Export,
+            node=self.company,
+            export_type=INTERNAL_TRANSACTION,
+            filters={"search": "cocoa"},
+        )
+
+        queryset = get_export_queryset(export)
+
+        self.assertEqual(queryset.count(), 2)
+        self.assertEqual(
+            list(queryset.values_list("pk", flat=True)),
+            sorted([first.pk, second.pk], reverse=True),
+        )
@@ -0,0 +1,199 @@
+from datetime import date
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
+from mixer.backend.django import mixer
+from v2.products.models import Batch
+from v2.products.models import Product
+from v2.reports.constants import COMPLETED
+from v2.reports.constants import FAILED
+from v2.reports.constants import MERGING
+from v2.reports.constants import PENDING
+from v2.reports.constants import STOCK
+from v2.reports.generators import tasks
+from v2.reports.models import Export
+from v2.reports.models import ExportShard
+from v2.reports.querysets import get_export_queryset
+from v2.reports.tests.integration.base import ReportsBaseTestCase
+
+
+class RecordingDataSheet:
+    """Data sheet keeping the rows written to it instead of a file."""
+
+    rows = None
+
+    def __init__(self, instance):
+        RecordingDataSheet.rows = None
+
+    def write_sheet(self, rows):
+        RecordingDataSheet.rows = list(rows)
+
+    def save_to_instance(self, file_name):
+        pass
+
+    def close(self):
+        pass
+
+
+@override_settings(EXPORT_SHARD_SIZE=2)
+class ExportTaskTestCase(ReportsBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        product = Product.objects.create(
+            name=self.faker.name(), supply_chain=self.supply_chain
+        )
+        self.batches = [
+            mixer.blend(
+                Batch,
+                node=self.company,
+                product=product,
+                current_quantity=10,
+            )
+            for _ in range(5)
+        ]
+        self.export = mixer.blend(
+            Export,
+            node=self.company,
+            export_type=STOCK,
+            filters={},
+            status=PENDING,
+        )
+
+    def create_shard(self, index, rows, **fields):
+        shard = mixer.blend(
+            ExportShard,
+            export=self.export,
+            index=index,
+            first_pk=index,
+            last_pk=index,
+            **fields
+        )
+        tasks.write_shard_rows(shard, rows)
+        return shard
+
+    def make_stale(self, queryset):
+        stale = timezone.now() - timedelta(
+            seconds=settings.EXPORT_SHARD_TIMEOUT + 1
+        )
+        queryset.update(updated_on=stale)
+
+    def test_plan_shards(self):
+        shards = tasks.plan_shards(
+            self.export, get_export_queryset(self.export)
+        )
+
+        pks = sorted((batch.pk for batch in self.batches), reverse=True)
+        self.assertEqual(
+            [(shard.index, shard.first_pk, shard.last_pk) for shard in shards],
+            [(0, pks[0], pks[1]), (1, pks[2], pks[3]), (2, pks[4], pks[4])],
+        )
+
+    @mock.patch.object(tasks.generate_export_shard, "delay")
+    def test_generate_file_queues_the_planned_shards(self, delay):
+        tasks.generate_file(self.export.id, "export.xlsx")
+
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.rows, 5)
+        shard_ids = self.export.shards.values_list("id", flat=True)
+        self.assertCountEqual(
+            [call.args[0] for call in delay.call_args_list], shard_ids
+        )
+
+    def test_shard_rows_keep_their_values(self):
+        rows = [
+            {
+                "Created On": timezone.now(),
+                "Date": date(2023, 5, 17),
+                "Quantity": Decimal("12.300"),
+                "Name": "Cocoa",
+                "Count": 2,
+                "Comment": None,
+            }
+        ]
+        shard = self.create_shard(0, rows)
+
+        read_rows = list(tasks.iter_shard_rows([shard]))
+
+        self.assertEqual(read_rows, rows)
+        self.assertEqual(
+            [type(value) for value in read_rows[0].values()],
+            [type(value) for value in rows[0].values()],
+        )
+
+    @mock.patch.dict(tasks.DATA_SHEET_CLASS, {STOCK: RecordingDataSheet})
+    def test_merge_writes_the_shards_in_order(self):
+        self.create_shard(1, [{"Row": 2}, {"Row": 3}])
+        self.create_shard(0, [{"Row": 0}, {"Row": 1}])
+        self.export.status = MERGING
+        self.export.save()
+
+        tasks.merge_export(self.export.id, "export.xlsx")
+
+        self.export.refresh_from_db()
+        self.assertEqual(
+            RecordingDataSheet.rows, [{"Row": row} for row in range(4)]
+        )
+        self.assertEqual(self.export.status, COMPLETED)
+        self.assertFalse(self.export.shards.exists())
+
+    @mock.patch.dict(tasks.DATA_SHEET_CLASS, {STOCK: RecordingDataSheet})
+    def test_completed_export_is_not_merged_again(self):
+        self.export.status = COMPLETED
+        self.export.save()
+
+        tasks.merge_export(self.export.id, "export.xlsx")
+
+        self.assertIsNone(RecordingDataSheet.rows)
+
+    def test_fail_keeps_completed_status(self):
+        self.export.status = COMPLETED
+        self.export.save()
+
+        tasks._fail(self.export, Exception("Shard file not found"))
+
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.status, COMPLETED)
+
+    def test_fail_pending_export(self):
+        tasks._fail(self.export, Exception("Shard file not found"))
+
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.status, FAILED)
+
+    @mock.patch.object(tasks.generate_file, "delay")
+    @mock.patch.object(tasks.merge_export, "delay")
+    @mock.patch.object(tasks.generate_export_shard, "delay")
+    def test_resume_exports(self, shard_delay, merge_delay, file_delay):
+        stale_shard = self.create_shard(0, [])
+        self.create_shard(1, [])
+        completed_shard = self.create_shard(2, [], status=COMPLETED)
+        self.make_stale(
+            ExportShard.objects.filter(
+                id__in=[stale_shard.id, completed_shard.id]
+            )
+        )
+        merging = mixer.blend(
+            Export, node=self.company, export_type=STOCK, status=MERGING
+        )
+        mixer.blend(
+            Export, node=self.company, export_type=STOCK, status=MERGING
+        )
+        planning = mixer.blend(
+            Export, node=self.company, export_type=STOCK, status=PENDING
+        )
+        mixer.blend(
+            Export, node=self.company, export_type=STOCK, status=PENDING
+        )
+        self.make_stale(
+            Export.objects.filter(id__in=[merging.id, planning.id])
+        )
+
+        tasks.resume_exports()
+
+        shard_delay.assert_called_once_with(stale_shard.id)
+        merge_delay.assert_called_once_with(merging.id, merging.file_name)
+        file_delay.assert_called_once_with(planning.id, planning.file_name)
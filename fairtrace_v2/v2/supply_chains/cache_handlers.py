@@ -1,44 +1,131 @@
-from celery import shared_task
+"""Cache of the connection maps of the nodes.
+
+The map of a node in a supply chain is cached with the version of the
+graph of the supply chain in its key. The version is bumped when a
+connection or a connection tag of the supply chain is written, when a node
+joins or leaves it or changes its primary operation in it, when the
+managers of a node in it change, or when a node in it is updated, which
+makes all the maps cached with the previous version unreachable at once
+instead of rebuilding the map of every company in the chain. Maps are
+rebuilt when next requested, by a single request at a time.
+"""
+import time
+
 from common.cache import filesystem_cache
-from django.apps import apps
-from v2.reports.constants import FARMER
-from v2.supply_chains.serializers.supply_chain import MapConnectionsSerializer
-
-
-def _get_cached_keys(nodes):
-    """Get only cached keys from the set of nodes."""
-    cache = filesystem_cache
-    keys = []
-    for node in nodes.iterator():
-        keys.extend(cache.keys(f"connection_{node.id}_*"))
-    return keys
-
-
-@shared_task(name="rebuild_connection_cache", queue="high")
-def _rebuild_cache(keys):
-    """delete and rebuild cache with the keys."""
-    serializer_class = MapConnectionsSerializer
-    for key in keys:
-        # format of the key is as the following,
-        # 'connection_{node_id}_{supply_chain_id}_{language_code}'.
-        _split = key.split("_")
-        node_id = _split[1]
-        supply_chain = _split[2]
-        node = apps.get_model("supply_chains", "Node").objects.get(pk=node_id)
-        serializer = serializer_class(node)
-        data = serializer.to_representation(node, sc_id=supply_chain)
-        filesystem_cache.set(key, data)
-
-
-def clear_connection_cache(node_id):
-    """This will clear the connection cache and rebuild it."""
-    node = apps.get_model("supply_chains", "Node").objects.get(pk=node_id)
-    suppliers = (
-        node.get_supplier_chain(include_self=True)[0]
-        .exclude(type=FARMER)
-        .only("id")
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import translation
+
+
+def _graph_version_key(supply_chain_id):
+    """Cache key of the graph version of a supply chain."""
+    return f"connection_graph_version_{supply_chain_id}"
+
+
+def _init_graph_version(key):
+    """Sets the initial graph version, the current time in milliseconds,
+    so that the version keeps increasing if it is evicted from the cache."""
+    cache.add(key, int(time.time() * 1000), None)
+
+
+def get_graph_version(supply_chain_id) -> int:
+    """Returns the graph version of a supply chain."""
+    key = _graph_version_key(supply_chain_id)
+    _init_graph_version(key)
+    return cache.get(key)
+
+
+def bump_graph_version(supply_chain_id) -> int:
+    """Bumps the graph version of a supply chain."""
+    key = _graph_version_key(supply_chain_id)
+    _init_graph_version(key)
+    return cache.incr(key)
+
+
+def bump_graph_versions_on_commit(supply_chain_ids):
+    """Bumps the graph versions of the supply chains once the transaction
+    is committed, so that maps built before the commit are not cached
+    with the new version."""
+    supply_chain_ids = set(supply_chain_ids)
+
+    def _bump():
+        for supply_chain_id in supply_chain_ids:
+            bump_graph_version(supply_chain_id)
+
+    transaction.on_commit(_bump)
+
+
+def get_connection_map_key(node_id, supply_chain_id):
+    """Returns the cache key of the map of a node in a supply chain.
+
+    The format of the key is as the following,
+    'connection_{node_id}_{supply_chain_id}_{version}_{language_code}'.
+    """
+    return "connection_%s_%s_%s_%s" % (
+        node_id,
+        supply_chain_id,
+        get_graph_version(supply_chain_id),
+        translation.get_language(),
+    )
+
+
+def _old_version_keys(key, node_id, supply_chain_id):
+    """Returns the keys of the maps of a node cached with other versions
+    than the one of the key, in any language."""
+    version = key.split("_")[3]
+    return [
+        old_key
+        for old_key in filesystem_cache.keys_by_tag(
+            ("node", node_id), ("supply_chain", supply_chain_id)
+        )
+        if old_key.split("_")[3] != version
+    ]
+
+
+def get_connection_map(node_id, supply_chain_id, build):
+    """Returns the map of a node in a supply chain from the cache, building
+    it with `build` if it is not cached.
+
+    Only one request builds a missing map, while the others wait for it for
+    up to CONNECTION_MAP_LOCK_TIMEOUT seconds, and build it themselves if
+    it is still missing then. The maps of the node cached with previous
+    versions are deleted when it is built, while the maps of the current
+    version in the other languages are kept.
+    """
+    key = get_connection_map_key(node_id, supply_chain_id)
+    data = filesystem_cache.get(key)
+    if data is not None:
+        return data
+    lock_key = f"{key}_lock"
+    if cache.add(lock_key, True, settings.CONNECTION_MAP_LOCK_TIMEOUT):
+        try:
+            data = build()
+            filesystem_cache.delete_many(
+                _old_version_keys(key, node_id, supply_chain_id)
+            )
+            filesystem_cache.set(
+                key, data, settings.CONNECTION_MAP_CACHE_TIMEOUT
+            )
+        finally:
+            cache.delete(lock_key)
+        return data
+    deadline = time.monotonic() + settings.CONNECTION_MAP_LOCK_TIMEOUT
+    while time.monotonic() < deadline and cache.get(lock_key):
+        time.sleep(0.2)
+        data = filesystem_cache.get(key)
+        if data is not None:
+            return data
+    return filesystem_cache.get(key) or build()
+
+
+def clear_connection_cache(*node_ids):
+    """This will clear the connection cache of the supply chains of the
+    nodes."""
+    from v2.supply_chains.models import NodeSupplyChain
+
+    bump_graph_versions_on_commit(
+        NodeSupplyChain.objects.filter(node_id__in=node_ids).values_list(
+            "supply_chain_id", flat=True
+        )
     )
-    buyers = node.get_buyer_chain()[0].exclude(type=FARMER).only("id")
-    connections = suppliers | buyers
-    keys = _get_cached_keys(connections)
-    _rebuild_cache.delay(keys)
@@ -1,23 +1,37 @@
 from celery import shared_task
+from django.core.cache import cache
 from v2.dashboard.models import NodeStats
+from v2.supply_chains.constants import INVITE_RELATION_BUYER
 from v2.supply_chains.constants import NODE_TYPE_COMPANY
 from v2.supply_chains.models import Node
 
 
 @shared_task(name="reload_related_statistics", queue="low")
 def reload_related_statistics(node_id):
-    """Reload related statistics."""
+    """Reload related statistics.
+
+    The stats of all the connected companies are outdated at once. They
+    are recomputed when next requested, with reload_statistics.
+    """
     node = Node.objects.get(id=node_id)
     print(f"Flagging  stats of connections of {node.full_name}")
-    buyer_chain, tier_data = node.get_buyer_chain()
-    if buyer_chain:
-        buyer_chain = buyer_chain.filter(type=NODE_TYPE_COMPANY)
-    for actor in buyer_chain:
-        stats, created = NodeStats.objects.get_or_create(node=actor)
-        stats.outdate(outdated_by=node)
-    supplier_chain, tier_data = node.get_supplier_chain()
-    supplier_chain = supplier_chain.filter(type=NODE_TYPE_COMPANY)
-    for actor in supplier_chain:
-        stats, created = NodeStats.objects.get_or_create(node=actor)
-        stats.outdate(outdated_by=node)
+    buyer_ids, tier_data = Node.objects.resolve_chains(
+        [node.id], direction=INVITE_RELATION_BUYER
+    )[node.id]
+    supplier_ids, tier_data = Node.objects.resolve_chains([node.id])[node.id]
+    actor_ids = Node.objects.filter(
+        id__in=buyer_ids + supplier_ids, type=NODE_TYPE_COMPANY
+    ).values_list("id", flat=True)
+    NodeStats.outdate_nodes(list(actor_ids), outdated_by=node)
     print(f"Flagging  stats of connections of {node.full_name} complete.")
+
+
+@shared_task(name="reload_statistics", queue="low")
+def reload_statistics(node_id):
+    """Recompute the statistics of a node, queued with NodeStats.reload."""
+    try:
+        stats = NodeStats.objects.filter(node_id=node_id).first()
+        if stats and stats.is_outdated:
+            stats.update_values()
+    finally:
+        cache.delete(NodeStats.get_reload_key(node_id))
@@ -248,3 +248,18 @@ CONSENT_STATUS_TYPES = (
     (REVOKED, "Consent Revoked"),
     (UNKNOWN, "Consent Unknown"),
 )
+
+# Fields identifying a farmer, hashed in Farmer.fingerprint to look up
+# duplicates.
+FARMER_FINGERPRINT_FIELDS = (
+    "first_name",
+    "last_name",
+    "street",
+    "city",
+    "country",
+    "province",
+    "zipcode",
+    "email",
+    "identification_no",
+    "phone",
+)
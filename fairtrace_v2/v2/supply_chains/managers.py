@@ -1,9 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from django.apps import apps
 
+from common import library as comm_lib
 from common.library import decode
 from django.conf import settings
+from django.db import connection
 from django.db import models
 from django.db.models import Count, Case, When, CharField, Subquery, F
 from django.db.models import Q
@@ -11,7 +14,8 @@ from django.db.models import Value
 from django.db.models.functions import Trunc, Concat
 from pytz import timezone
 from v2.supply_chains.constants import NODE_STATUS_ACTIVE, NODE_TYPE_FARM, \
-    NODE_TYPE_COMPANY, CONNECTION_STATUS_VERIFIED
+    NODE_TYPE_COMPANY, CONNECTION_STATUS_VERIFIED, INVITE_RELATION_SUPPLIER, \
+    INVITE_RELATION_BUYER
 
 
 class NodeQuerySet(models.QuerySet):
@@ -219,6 +223,171 @@ class NodeQuerySet(models.QuerySet):
         """Returns only non-active Nodes."""
         return self.exclude(status=NODE_STATUS_ACTIVE)
 
+    def resolve_chains(
+        self,
+        node_ids,
+        supply_chain=None,
+        direction=INVITE_RELATION_SUPPLIER,
+        include_self=False,
+    ):
+        """Resolves the supplier or buyer chains of many nodes at once.
+
+        All chains are fetched with a single Neo4j query instead of one
+        get_supplier_chain/get_buyer_chain call per node.
+
+        Args:
+            node_ids(list)      : Ids of the nodes to resolve chains of.
+            supply_chain(obj)   : Supply chain to restrict the chains to.
+            direction(int)      : INVITE_RELATION_SUPPLIER for the supplier
+                                  chains and INVITE_RELATION_BUYER for the
+                                  buyer chains.
+            include_self(bool)  : Include the node in its chain ids.
+        Returns:
+            A dict mapping every node id to a tuple of its chain ids and its
+            tier data, in the format returned by get_supplier_chain and
+            get_buyer_chain in fast mode.
+        """
+        from v2.supply_chains.models import NodeGraphModel
+
+        nodes = self.model.objects.filter(id__in=node_ids).values(
+            "id", "graph_uid", "type"
+        )
+        uid_map, chains = {}, {}
+        for node in nodes:
+            if node["graph_uid"]:
+                uid_map[node["graph_uid"]] = node
+            chains[node["id"]] = self._new_chain(node, direction, include_self)
+        rows = []
+        if uid_map:
+            rows = NodeGraphModel.map_chains(
+                uid_map.keys(), self._graph_relation(direction), supply_chain
+            )
+        for uid, *row in rows:
+            self._add_to_chain(chains[uid_map[uid]["id"]], direction, row)
+        return {
+            node_id: (list(chain_ids), tier_data)
+            for node_id, (chain_ids, tier_data) in chains.items()
+        }
+
+    def resolve_chains_by_supply_chain(
+        self, node_id, supply_chain_ids, direction=INVITE_RELATION_SUPPLIER
+    ):
+        """Resolves the chain of a node across supply chains and in each of
+        the supply chains with a single Neo4j query.
+
+        The chain is fetched once with the supply chain of every actor row,
+        and is partitioned by it, instead of being resolved again for every
+        supply chain.
+
+        Args:
+            node_id(int)            : Id of the node.
+            supply_chain_ids(list)  : Ids of the supply chains to resolve the
+                                      chain in.
+            direction(int)          : INVITE_RELATION_SUPPLIER or
+                                      INVITE_RELATION_BUYER.
+        Returns:
+            A tuple of the chain across supply chains and a dict mapping
+            every supply chain id to the chain in it, each as a tuple of the
+            chain ids and the tier data like with resolve_chains.
+        """
+        from v2.supply_chains.models import NodeGraphModel
+
+        node = self.model.objects.values("id", "graph_uid", "type").get(
+            id=node_id
+        )
+        chain = self._new_chain(node, direction)
+        sc_chains = {
+            sc_id: self._new_chain(node, direction)
+            for sc_id in supply_chain_ids
+        }
+        rows = []
+        if node["graph_uid"]:
+            rows = NodeGraphModel.map_chains(
+                [node["graph_uid"]],
+                self._graph_relation(direction),
+                by_supply_chain=True,
+            )
+        for _uid, sc_id, *row in rows:
+            self._add_to_chain(chain, direction, row)
+            if sc_id in sc_chains:
+                self._add_to_chain(sc_chains[sc_id], direction, row)
+        return (
+            (list(chain[0]), chain[1]),
+            {
+                sc_id: (list(chain_ids), tier_data)
+                for sc_id, (chain_ids, tier_data) in sc_chains.items()
+            },
+        )
+
+    @staticmethod
+    def _graph_relation(direction):
+        """Returns the cypher relation to map the chains of a direction
+        with."""
+        from v2.supply_chains.models.cypher import BUYERS
+        from v2.supply_chains.models.cypher import SUPPLIERS
+
+        if direction == INVITE_RELATION_SUPPLIER:
+            return SUPPLIERS
+        return BUYERS
+
+    def _new_chain(self, node, direction, include_self=False):
+        """Returns the chain ids and tier data of a node, before its actors
+        are added."""
+        chain_ids = {node["id"]} if include_self else set()
+        self_item = self._tier_item(
+            node["id"], comm_lib._encode(node["id"]), node["type"], 0, 0
+        )
+        if direction == INVITE_RELATION_SUPPLIER:
+            self_item["connected_to"][0]["email_sent"] = True
+        return chain_ids, {node["id"]: self_item}
+
+    def _add_to_chain(self, chain, direction, row):
+        """Adds an actor row of map_chains, without the source uid and the
+        supply chain id, to a chain."""
+        chain_ids, tier_data = chain
+        node_id, idencode, _type, min_tier, max_tier, dist = row
+        chain_ids.add(node_id)
+        # Matches the chain mapping, where suppliers keep the shortest
+        # tier and buyers the most negative one.
+        if direction == INVITE_RELATION_SUPPLIER:
+            tier = min_tier
+        else:
+            tier = -max_tier
+        if node_id in tier_data:
+            tier_data[node_id]["distance"] = min(
+                dist, tier_data[node_id]["distance"]
+            )
+            tier_data[node_id]["tier"] = min(
+                tier, tier_data[node_id]["tier"]
+            )
+        else:
+            tier_data[node_id] = self._tier_item(
+                node_id, idencode, _type, tier, dist
+            )
+
+    @staticmethod
+    def _tier_item(node_id, idencode, node_type, tier, distance):
+        """Tier data of a chain actor, without connection details."""
+        return {
+            "iddecode": node_id,
+            "id": idencode,
+            "connected_to": [
+                {
+                    "parent_name": "",
+                    "parent_id": 0,
+                    "connection_status": 0,
+                    "email_sent": None,
+                    "labels": [],
+                    "supplier_for": [],
+                    "buyer_for": [],
+                    "managers": [],
+                }
+            ],
+            "distance": distance,
+            "tier": tier,
+            "type": node_type,
+        }
+
 
 class NodeSupplyChainQuerySet(models.QuerySet):
     """NodeSupplyChainQuerySet is an additional layer to handle queryset level
@@ -238,6 +407,74 @@ class NodeSupplyChainQuerySet(models.QuerySet):
         """exclude test nodes."""
         return self.filter(node__is_test=False)
 
+    def resolve_chains(self):
+        """Resolves the supplier and buyer chains of every node supply
+        chain.
+
+        Chains are resolved with one query per supply chain and direction,
+        for all nodes in it at once.
+
+        Returns:
+            A dict mapping every node supply chain id to a tuple of its
+            (supplier chain ids, tier data) and (buyer chain ids, tier data).
+        """
+        node_model = apps.get_model("supply_chains", "Node")
+        supply_chain_model = apps.get_model("supply_chains", "SupplyChain")
+        items = list(self.values_list("id", "node_id", "supply_chain_id"))
+        grouped = {}
+        for nsc_id, node_id, sc_id in items:
+            grouped.setdefault(sc_id, []).append(node_id)
+        supply_chains = supply_chain_model.objects.in_bulk(grouped.keys())
+
+        chains = {}
+        for sc_id, node_ids in grouped.items():
+            supply_chain = supply_chains[sc_id]
+            chains[sc_id] = (
+                node_model.objects.resolve_chains(node_ids, supply_chain),
+                node_model.objects.resolve_chains(
+                    node_ids, supply_chain, direction=INVITE_RELATION_BUYER
+                ),
+            )
+        return {
+            nsc_id: (chains[sc_id][0][node_id], chains[sc_id][1][node_id])
+            for nsc_id, node_id, sc_id in items
+        }
+
+    def update_values(self, chains=None):
+        """Updates the statistics of every node supply chain, resolving the
+        chains in bulk unless they are given, as returned by
+        resolve_chains.
+
+        The node supply chains are independent, so they are updated on a
+        pool of NODE_STATS_WORKERS threads. They are updated one after the
+        other in a transaction, which the threads would not be part of.
+        """
+        if chains is None:
+            chains = self.resolve_chains()
+        node_supply_chains = list(self)
+        workers = min(settings.NODE_STATS_WORKERS, len(node_supply_chains))
+        if workers <= 1 or connection.in_atomic_block:
+            for nsc in node_supply_chains:
+                nsc.update_values(chains=chains[nsc.id])
+            return True
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_update_in_thread, nsc, chains[nsc.id])
+                for nsc in node_supply_chains
+            ]
+            for future in futures:
+                future.result()
+        return True
+
+
+def _update_in_thread(node_supply_chain, chains):
+    """Updates the statistics of a node supply chain on a thread of the
+    pool, closing the database connection of the thread once done."""
+    try:
+        node_supply_chain.update_values(chains=chains)
+    finally:
+        connection.close()
+
 
 class ReferenceQuerySet(models.QuerySet):
     """ReferenceQuerySet is an additional layer to handle queryset level
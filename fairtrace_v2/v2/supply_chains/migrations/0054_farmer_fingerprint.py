@@ -0,0 +1,38 @@
+# Generated by Django 2.2.6 on 2026-10-16 10:00
+from django.db import migrations, models
+
+from common.library import hash_fingerprint
+from v2.supply_chains.constants import FARMER_FINGERPRINT_FIELDS
+
+BATCH_SIZE = 1000
+
+
+def set_fingerprints(apps, schema_editor):
+    """Set the fingerprint of the existing farmers."""
+    farmer_model = apps.get_model('supply_chains', 'Farmer')
+    farmers = farmer_model.objects.only(*FARMER_FINGERPRINT_FIELDS)
+    batch = []
+    for farmer in farmers.iterator(chunk_size=BATCH_SIZE):
+        farmer.fingerprint = hash_fingerprint(
+            *(getattr(farmer, field) for field in FARMER_FINGERPRINT_FIELDS))
+        batch.append(farmer)
+        if len(batch) >= BATCH_SIZE:
+            farmer_model.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    farmer_model.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supply_chains', '0053_auto_20250617_1543'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmer',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(set_fingerprints, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,62 @@
-"""Raw cypher queries used for fetching data from Neo4j."""
+"""Raw cypher queries used for fetching data from Neo4j.
+
+Values are always passed as query parameters instead of being formatted
+into the query, so that Neo4j can reuse the cached plan of each query
+shape.
+"""
 
 CYPHER_BASE_QUERY = (
-    "MATCH (source:NodeGraphModel {{uid: '{source.uid}'}}){}"
+    "MATCH (source:NodeGraphModel {{uid: $source_uid}}){}"
     "[rel_start:BUYS_FROM]{}"
     "(conn_start:ConnectionGraphModel "
     "{supply_chain_filter}){}[tags:BUYER_TAG*0..]{}"
     "(conn_end:ConnectionGraphModel){}[rel_end:BUYS_FROM]{}"
     "(root:NodeGraphModel {target_node_filter})"
     "{where_conditions}"
-    "RETURN DISTINCT root, conn_start, conn_end, tags"
+    "RETURN DISTINCT root, conn_start, conn_end, tags{detail_columns}"
+)
+
+# Resolves the chains of many source nodes at once. Only the tier and
+# distance of every actor is returned, aggregated per source, with both the
+# shortest and the longest tier since suppliers and buyers use either. The
+# rows can also be aggregated per supply chain of the first connection,
+# which is the one a chain is restricted to a supply chain by.
+CYPHER_MULTI_SOURCE_QUERY = (
+    "UNWIND $source_uids AS source_uid "
+    "MATCH (source:NodeGraphModel {{uid: source_uid}}){}"
+    "[rel_start:BUYS_FROM]{}"
+    "(conn_start:ConnectionGraphModel "
+    "{supply_chain_filter}){}[tags:BUYER_TAG*0..]{}"
+    "(conn_end:ConnectionGraphModel){}[rel_end:BUYS_FROM]{}"
+    "(root:NodeGraphModel) "
+    "RETURN source.uid, {supply_chain_column}"
+    "root.ft_node_id, root.ft_node_idencode, root.type, "
+    "min(size(tags)) + 1, max(size(tags)) + 1, "
+    "min((conn_start.distance + conn_end.distance) / 2 "
+    "+ reduce(total = 0.0, tag IN tags | total + tag.distance))"
 )
+
+# Additional columns returned when the details of the connection to the
+# parent node are required. The parent is the node at the other end of
+# `conn_end`, and supplier_for/buyer_for are the nodes of the connections
+# tagged to it.
+SUPPLIER_DETAIL_COLUMNS = (
+    ", head([(conn_end)<-[:BUYS_FROM]-(parent:NodeGraphModel) | parent])"
+    " AS parent"
+)
+BUYER_DETAIL_COLUMNS = (
+    ", head([(conn_end)-[:BUYS_FROM]->(parent:NodeGraphModel) | parent])"
+    " AS parent"
+)
+TAG_DETAIL_COLUMNS = (
+    ", [(conn_end)-[:BUYER_TAG]->(:ConnectionGraphModel)"
+    "<-[:BUYS_FROM]-(buyer:NodeGraphModel) | buyer.ft_node_idencode]"
+    " AS supplier_for"
+    ", [(conn_end)<-[:BUYER_TAG]-(:ConnectionGraphModel)"
+    "-[:BUYS_FROM]->(supplier:NodeGraphModel) | supplier.ft_node_idencode]"
+    " AS buyer_for"
+)
+
 # Relations
 SUPPLIERS = 1
 BUYERS = 2
@@ -23,6 +70,9 @@ ROOT = 0
 START_CONN = 1
 END_CONN = 2
 TAGS = 3
+PARENT = 4
+SUPPLIER_FOR = 5
+BUYER_FOR = 6
 
 
 def construct_query(
@@ -31,29 +81,72 @@ def construct_query(
     supply_chain=None,
     target_node=None,
     start_connections=None,
+    details=False,
 ):
-    """Construct query for graph data fetch."""
-    supply_chain_filter = (
-        "{supply_chain_id: %d}" % supply_chain.id if supply_chain else ""
-    )
-    target_node_filter = "{uid: '%s'}" % target_node.uid if target_node else ""
+    """Construct query for graph data fetch.
+
+    Returns the query along with its parameters. With `details`, the
+    parent node and the supplier_for/buyer_for lists of every row are
+    returned as well (see PARENT, SUPPLIER_FOR and BUYER_FOR).
+    """
+    params = {"source_uid": source.uid}
+    supply_chain_filter = ""
+    if supply_chain:
+        supply_chain_filter = "{supply_chain_id: $supply_chain_id}"
+        params["supply_chain_id"] = supply_chain.id
+    target_node_filter = ""
+    if target_node:
+        target_node_filter = "{uid: $target_uid}"
+        params["target_uid"] = target_node.uid
     where_conditions = ""
     if relation == SUPPLIERS:
         directions = SUPPLIER_RELATION_DIRECIONS
+        detail_columns = SUPPLIER_DETAIL_COLUMNS
     else:
         directions = BUYER_RELATION_DIRECIONS
+        detail_columns = BUYER_DETAIL_COLUMNS
     conditions = []
     if start_connections is not None:
-        uids = [c.graph_uid for c in start_connections]
-        conditions.append("conn_start.uid in ['{}']".format("', '".join(uids)))
+        conditions.append("conn_start.uid IN $start_uids")
+        params["start_uids"] = [c.graph_uid for c in start_connections]
     if conditions:
-        where_conditions = "WHERE " + " and ".join(conditions)
+        where_conditions = " WHERE " + " and ".join(conditions) + " "
     cypher_base = CYPHER_BASE_QUERY.format(
         *directions,
-        source=source,
         supply_chain_filter=supply_chain_filter,
         target_node_filter=target_node_filter,
         where_conditions=where_conditions,
+        detail_columns=detail_columns + TAG_DETAIL_COLUMNS if details else "",
     )
 
-    return cypher_base
+    return cypher_base, params
+
+
+def construct_multi_source_query(
+    source_uids, relation, supply_chain=None, by_supply_chain=False
+):
+    """Construct query to fetch the chains of many nodes at once.
+
+    Every returned row is (source uid, node id, node idencode, node type,
+    shortest tier, longest tier, shortest distance). With
+    `by_supply_chain`, the rows are per supply chain as well, with its id
+    after the source uid.
+    """
+    params = {"source_uids": list(source_uids)}
+    supply_chain_filter = ""
+    if supply_chain:
+        supply_chain_filter = "{supply_chain_id: $supply_chain_id}"
+        params["supply_chain_id"] = supply_chain.id
+    if relation == SUPPLIERS:
+        directions = SUPPLIER_RELATION_DIRECIONS
+    else:
+        directions = BUYER_RELATION_DIRECIONS
+    supply_chain_column = ""
+    if by_supply_chain:
+        supply_chain_column = "conn_start.supply_chain_id, "
+    query = CYPHER_MULTI_SOURCE_QUERY.format(
+        *directions,
+        supply_chain_filter=supply_chain_filter,
+        supply_chain_column=supply_chain_column,
+    )
+    return query, params
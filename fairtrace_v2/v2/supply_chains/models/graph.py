@@ -13,11 +13,15 @@ from django.utils import timezone
 from django.utils.timezone import datetime
 from neomodel import cardinality
 
+from .cypher import BUYER_FOR
 from .cypher import BUYERS
+from .cypher import construct_multi_source_query
 from .cypher import construct_query
 from .cypher import END_CONN
+from .cypher import PARENT
 from .cypher import ROOT
 from .cypher import START_CONN
+from .cypher import SUPPLIER_FOR
 from .cypher import SUPPLIERS
 from .cypher import TAGS
 
@@ -119,43 +123,67 @@ class NodeGraphModel(BaseStructuredNode):
         return True
 
     def map_suppliers(
-        self, supply_chain=None, start_connections=None, target_node=None
+        self,
+        supply_chain=None,
+        start_connections=None,
+        target_node=None,
+        details=False,
     ):
         """To perform function map_suppliers."""
-        query = construct_query(
+        query, params = construct_query(
             source=self,
             relation=SUPPLIERS,
             supply_chain=supply_chain,
             start_connections=start_connections,
             target_node=target_node,
+            details=details,
         )
-        data, col = self.cypher(query)
+        data, col = self.cypher(query, params)
         return data
 
     def map_buyers(
-        self, supply_chain=None, start_connections=None, target_node=None
+        self,
+        supply_chain=None,
+        start_connections=None,
+        target_node=None,
+        details=False,
     ):
         """To perform function map_buyers."""
-        query = construct_query(
+        query, params = construct_query(
             source=self,
             relation=BUYERS,
             supply_chain=supply_chain,
             start_connections=start_connections,
             target_node=target_node,
+            details=details,
         )
-        data, col = self.cypher(query)
+        data, col = self.cypher(query, params)
+        return data
+
+    @staticmethod
+    def map_chains(
+        source_uids, relation, supply_chain=None, by_supply_chain=False
+    ):
+        """Maps the chains of many nodes in a single query.
+
+        See construct_multi_source_query for the returned rows.
+        """
+        query, params = construct_multi_source_query(
+            source_uids, relation, supply_chain, by_supply_chain
+        )
+        data, col = neomodel.db.cypher_query(query, params)
         return data
 
     def search_suppliers(self, destination, supply_chain=None):
         """To perform function search_suppliers."""
-        query = construct_query(
+        query, params = construct_query(
             source=self,
             relation=SUPPLIERS,
             supply_chain=supply_chain,
             target_node=destination,
         )
 
-        data, col = self.cypher(query)
+        data, col = self.cypher(query, params)
         connections = {}
         for chain_item in data:
             supply_chain_id = chain_item[END_CONN]["supply_chain_id"]
@@ -180,14 +208,14 @@ class NodeGraphModel(BaseStructuredNode):
 
     def search_buyers(self, destination, supply_chain=None):
         """To perform function search_buyers."""
-        query = construct_query(
+        query, params = construct_query(
             source=self,
             relation=BUYERS,
             supply_chain=supply_chain,
             target_node=destination,
         )
 
-        data, col = self.cypher(query)
+        data, col = self.cypher(query, params)
         connections = {}
         for chain_item in data:
             supply_chain_id = chain_item[END_CONN]["supply_chain_id"]
@@ -222,7 +250,9 @@ class NodeGraphModel(BaseStructuredNode):
         if include_self:
             chain_ids.append(self.ft_node_id)
 
-        data = self.map_suppliers(supply_chain, start_connections)
+        data = self.map_suppliers(
+            supply_chain, start_connections, details=not fast_mode
+        )
         tier_data = {
             self.ft_node_id: {
                 "iddecode": self.ft_node_id,
@@ -267,21 +297,15 @@ class NodeGraphModel(BaseStructuredNode):
                 buyer_for = []
             else:
                 conn_graph = ConnectionGraphModel.inflate(chain_item[END_CONN])
-                parent = conn_graph.buyer.single()
+                parent = NodeGraphModel.inflate(chain_item[PARENT])
                 connection_status = conn_graph.status
                 email_sent = conn_graph.email_sent
                 labels = conn_graph.labels
                 parent_id = parent.ft_node_idencode
                 parent_name = parent.full_name
                 managers = parent.managers
-                supplier_for = [
-                    i.buyer.single().ft_node_idencode
-                    for i in conn_graph.buyer_tag.all()
-                ]
-                buyer_for = [
-                    i.supplier.single().ft_node_idencode
-                    for i in conn_graph.supplier_tag.all()
-                ]
+                supplier_for = chain_item[SUPPLIER_FOR]
+                buyer_for = chain_item[BUYER_FOR]
 
             item_data = {
                 "iddecode": node_id,
@@ -334,7 +358,9 @@ class NodeGraphModel(BaseStructuredNode):
         if include_self:
             chain_ids.append(self.ft_node_id)
 
-        data = self.map_buyers(supply_chain, start_connections)
+        data = self.map_buyers(
+            supply_chain, start_connections, details=not fast_mode
+        )
         tier_data = {
             self.ft_node_id: {
                 "iddecode": self.ft_node_id,
@@ -379,21 +405,15 @@ class NodeGraphModel(BaseStructuredNode):
                 buyer_for = []
             else:
                 conn_graph = ConnectionGraphModel.inflate(chain_item[END_CONN])
-                parent = conn_graph.supplier.single()
+                parent = NodeGraphModel.inflate(chain_item[PARENT])
                 connection_status = conn_graph.status
                 email_sent = conn_graph.email_sent
                 labels = conn_graph.labels
                 parent_id = parent.ft_node_idencode
                 parent_name = parent.full_name
                 managers = parent.managers
-                supplier_for = [
-                    i.buyer.single().ft_node_idencode
-                    for i in conn_graph.buyer_tag.all()
-                ]
-                buyer_for = [
-                    i.supplier.single().ft_node_idencode
-                    for i in conn_graph.supplier_tag.all()
-                ]
+                supplier_for = chain_item[SUPPLIER_FOR]
+                buyer_for = chain_item[BUYER_FOR]
 
             item_data = {
                 "iddecode": node_id,
@@ -807,9 +807,11 @@ class Node(AbstractBaseModel, Address):
         """Update the cache."""
         from v2.supply_chains.serializers.functions import (
             serialize_node_basic, serialize_node_blockchain)
+        from v2.supply_chains.cache_handlers import clear_connection_cache
 
         serialize_node_basic(self, force_reload=True)
         serialize_node_blockchain(self, force_reload=True)
+        clear_connection_cache(self.id)
         return True
 
     @property
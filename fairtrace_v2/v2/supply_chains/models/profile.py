@@ -7,6 +7,7 @@ from datetime import timedelta
 from common.library import _decrypt
 from common.library import _encrypt
 from common.library import _get_file_path
+from common.library import hash_fingerprint
 from common.library import _percentage
 from common.exceptions import BadRequest
 from common.models import AbstractBaseModel
@@ -370,12 +371,29 @@ class Farmer(Node, AbstractPerson):
     consent_status = models.CharField(
         max_length=20, choices=CONSENT_STATUS_TYPES, default=GRANTED
     )
+    fingerprint = models.CharField(
+        max_length=32, default="", blank=True, db_index=True, editable=False
+    )
 
     def __init__(self, *args, **kwargs):
         """To perform function __init__."""
         kwargs["type"] = constants.NODE_TYPE_FARM
         super(Farmer, self).__init__(*args, **kwargs)
 
+    @staticmethod
+    def get_fingerprint(values):
+        """Returns the fingerprint of the identity fields of a farmer.
+
+        Farmers with the same FARMER_FINGERPRINT_FIELDS have the same
+        fingerprint, so that possible duplicates of a farmer are looked up
+        with the index on it instead of comparing all the fields.
+
+        Parameters:
+        - values: Mapping of the identity fields to their values.
+        """
+        fields = constants.FARMER_FINGERPRINT_FIELDS
+        return hash_fingerprint(*(values.get(field) for field in fields))
+
     def clean(self):
         """Cleans and validates the farmer's data.
 
@@ -405,6 +423,9 @@ class Farmer(Node, AbstractPerson):
         - **kwargs: Arbitrary keyword arguments.
         """
         self.new_instance = not self.pk
+        self.fingerprint = self.get_fingerprint(vars(self))
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "fingerprint"}
         super().save(*args, **kwargs)
         self.log_activity()
         self.create_identification_ref()
@@ -29,7 +29,7 @@ from v2.supply_chains.constants import (BLOCKCHAIN_WALLET_TYPE_HEDERA,
                                         INVITE_RELATION_SUPPLIER,
                                         NODE_INVITED_BY_CHOICES,
                                         NODE_INVITED_BY_COMPANY,
-                                        NODE_TYPE_COMPANY, NODE_TYPE_FARM)
+                                        NODE_TYPE_FARM)
 from v2.transactions import constants as txn_constants
 
 from ..managers import NodeSupplyChainQuerySet
@@ -152,112 +152,53 @@ class NodeSupplyChain(AbstractBaseModel):
         """To perform function company_count."""
         return self.actor_count - self.farmer_count
 
-    @staticmethod
-    def _operation_count(queryset, supply_chain=None):
-        """To perform function _operation_count."""
-        operation_count = {"supplier": {}, "farmer": {}}
-        for item in queryset:
-            nodesupplychains = item.nodesupplychain_set.filter(
-                supply_chain=supply_chain
+    def get_chains(self, labels=None, chains=None):
+        """Returns the supplier and buyer chains of the node in the supply
+        chain.
+
+        `chains` can be passed when they have already been resolved in bulk
+        with NodeSupplyChainQuerySet.resolve_chains.
+        """
+        if labels:
+            sup_queryset, sup_tier_data = self.node.get_supplier_chain(
+                supply_chain=self.supply_chain, fast_mode=True, labels=labels
             )
-            for nsc in nodesupplychains:
-                if not nsc.primary_operation:
-                    continue
-                op_id = nsc.primary_operation.id
-                nt = nsc.primary_operation.node_type
-                node_type = "supplier" if nt == NODE_TYPE_COMPANY else "farmer"
-                if op_id not in operation_count[node_type]:
-                    operation_count[node_type][op_id] = {
-                        "name": nsc.primary_operation.name,
-                        "count": 1,
-                    }
-                else:
-                    operation_count[node_type][op_id]["count"] += 1
-        operation_count["farmer"] = list(operation_count["farmer"].values())
-        operation_count["supplier"] = list(
-            operation_count["supplier"].values()
+            buy_queryset, buy_tier_data = self.node.get_buyer_chain(
+                supply_chain=self.supply_chain, fast_mode=True, labels=labels
+            )
+            return sup_queryset, sup_tier_data, buy_queryset, buy_tier_data
+        if chains is None:
+            chains = NodeSupplyChain.objects.filter(
+                id=self.id
+            ).resolve_chains()[self.id]
+        (sup_ids, sup_tier_data), (buy_ids, buy_tier_data) = chains
+        return (
+            Node.objects.filter(id__in=sup_ids),
+            sup_tier_data,
+            Node.objects.filter(id__in=buy_ids),
+            buy_tier_data,
         )
-        return operation_count
 
-    def get_stats_values(self, labels=None):
+    def get_stats_values(self, labels=None, chains=None):
         """To perform function get_stats_values."""
-        from v2.supply_chains.models import Invitation
-
-        statistics = {}
-        sup_queryset, sup_tier_data = self.node.get_supplier_chain(
-            supply_chain=self.supply_chain, fast_mode=True, labels=labels
-        )
-        buy_queryset, buy_tier_data = self.node.get_buyer_chain(
-            supply_chain=self.supply_chain, fast_mode=True, labels=labels
-        )
-
-        sup_ids = sup_queryset.values_list("id", flat=True)
-        buy_ids = buy_queryset.values_list("id", flat=True)
-        actor_ids = list(sup_ids) + list(buy_ids)
-        all_actors = Node.objects.filter(id__in=actor_ids)
-        farmers = sup_queryset.filter(type=NODE_TYPE_FARM)
-        suppliers = sup_queryset.filter(type=NODE_TYPE_COMPANY)
-        comp_ids = [i.id for i in suppliers] + [
-            i.id for i in buy_queryset.filter(type=NODE_TYPE_COMPANY)
-        ]
-        comp_ids = list(set(comp_ids))
-        comp_ids_incl_self = comp_ids + [self.node.id]
-        companies = Node.objects.filter(id__in=comp_ids)
-        companies_incl_self = Node.objects.filter(id__in=comp_ids_incl_self)
-
-        invites = Invitation.objects.filter(
-            inviter__in=companies_incl_self,
-            invitee__in=companies_incl_self,
-            connection__supply_chain=self.supply_chain,
-        )
-        sent_invites = invites.filter(email_sent=True)
-        signed_up_companies = (
-            companies.exclude(invitations_received__in=invites)
-            .distinct("id")
-            .count()
-        )
-        invited_actors = companies.filter(
-            invitations_received__in=sent_invites
-        ).distinct("id")
-        active_actors = (
-            companies.filter(invitations_received__in=sent_invites)
-            .exclude(date_joined=None)
-            .distinct("id")
+        from v2.supply_chains.statistics import get_chain_stats
+
+        (
+            sup_queryset,
+            sup_tier_data,
+            buy_queryset,
+            buy_tier_data,
+        ) = self.get_chains(labels, chains)
+
+        statistics = get_chain_stats(
+            self.node,
+            sup_queryset.values_list("id", flat=True),
+            buy_queryset.values_list("id", flat=True),
+            self.supply_chain,
         )
-
-        statistics["actor_count"] = all_actors.count()
-        statistics["supplier_count"] = suppliers.count()
-        statistics["farmer_count"] = farmers.count()
         statistics["company_count"] = (
             statistics["actor_count"] - statistics["farmer_count"]
         )
-        statistics["invited_actor_count"] = (
-            invited_actors.count() + signed_up_companies
-        )
-        statistics["active_actor_count"] = (
-            active_actors.count() + signed_up_companies
-        )
-        statistics["mapped_actor_count"] = (
-            companies.count() - statistics["invited_actor_count"]
-        )
-        statistics["pending_invite_count"] = (
-            statistics["invited_actor_count"]
-            - statistics["active_actor_count"]
-        )
-
-        statistics["farmer_coorinates"] = list(
-            farmers.values("latitude", "longitude")
-        )
-        statistics["supplier_coorinates"] = list(
-            suppliers.values("latitude", "longitude")
-        )
-
-        statistics["operation_stats"] = self._operation_count(
-            sup_queryset, self.supply_chain
-        )
-        statistics["buyer_ids"] = [i.id for i in buy_queryset]
-        statistics["supplier_ids"] = [i.id for i in suppliers]
-        statistics["farmer_ids"] = [i.id for i in farmers]
 
         sup_length = abs(max([i["tier"] for i in sup_tier_data.values()]))
         buy_length = abs(min([i["tier"] for i in buy_tier_data.values()]))
@@ -272,20 +213,25 @@ class NodeSupplyChain(AbstractBaseModel):
 
         complexity = 0
         complexity += statistics["tier_count"] * 5
-        complexity += companies.count()
+        complexity += (
+            statistics["mapped_actor_count"]
+            + statistics["invited_actor_count"]
+        )
         complexity += statistics["chain_length"] / 10000
         complexity += statistics["farmer_count"] / 5
         statistics["complexity"] = complexity
 
         return statistics
 
-    def update_values(self):
+    def update_values(self, chains=None):
         """To perform function update_values."""
-        statistics = self.get_stats_values()
+        statistics = self.get_stats_values(chains=chains)
         statistics.pop("company_count")
         for key, value in statistics.items():
             setattr(self, key, value)
-        self.save()
+        # Only the statistics are saved, which do not change the connection
+        # maps of the supply chain.
+        self.save(update_fields=[*statistics, "updated_on"])
         return True
 
     def make_active(self):
@@ -120,6 +120,27 @@ def get_node_data(node=None, node_id=None, force_reload=False):
     return data
 
 
+def get_nodes_data(nodes) -> dict:
+    """Returns the data of many nodes by id.
+
+    The cached data of all the nodes is read at once, and only the nodes
+    missing from the cache are serialized with get_node_data.
+    """
+    language = translation.get_language()
+    keys = {
+        node.id: "node_basic_data_%s_%s"
+        % (common_lib._encode(node.id), language)
+        for node in nodes
+    }
+    cached = cache.get_many(keys.values())
+    data = {}
+    for node in nodes:
+        data[node.id] = cached.get(keys[node.id]) or get_node_data(
+            node, force_reload=True
+        )
+    return data
+
+
 def serialize_node_basic(
     node=None, node_id=None, force_reload=False, many=False
 ):
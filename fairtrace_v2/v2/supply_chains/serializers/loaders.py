@@ -0,0 +1,66 @@
+"""Batch loaders of the data serialized for the nodes of a chain.
+
+Serializing the nodes of a supplier or buyer chain one at a time reads the
+data of every node from the cache, and queries its primary operation and
+whether it is managed by the node viewing the chain, separately. The
+loaders fetch this data for all the nodes of the chain at once, so that the
+chain is serialized with a fixed number of queries whatever its size.
+"""
+from common import library as comm_lib
+from v2.supply_chains.models import NodeSupplyChain
+from v2.supply_chains.serializers.functions import get_nodes_data
+
+
+class ChainNodeLoader:
+    """Loads the data of the nodes of a chain in a supply chain."""
+
+    def __init__(self, nodes, supply_chain_id=None):
+        """Initialize with the nodes of the chain and the supply chain of
+        the primary operations."""
+        self.nodes = list(nodes)
+        self.supply_chain_id = supply_chain_id
+        self._basic_data = None
+        self._primary_operations = None
+
+    @property
+    def basic_data(self) -> dict:
+        """Data of the nodes from serialize_node_basic, by node id."""
+        if self._basic_data is None:
+            self._basic_data = get_nodes_data(self.nodes)
+        return self._basic_data
+
+    @property
+    def primary_operations(self) -> dict:
+        """Primary operations of the nodes in the supply chain, by node
+        id."""
+        if self._primary_operations is None:
+            self._primary_operations = {}
+            if self.supply_chain_id:
+                self._load_primary_operations()
+        return self._primary_operations
+
+    def _load_primary_operations(self):
+        """Loads the primary operation of the latest node supply chain of
+        every node with one."""
+        node_supply_chains = (
+            NodeSupplyChain.objects.filter(
+                node_id__in=[node.id for node in self.nodes],
+                supply_chain_id=self.supply_chain_id,
+                primary_operation__isnull=False,
+            )
+            .values_list(
+                "node_id", "primary_operation_id", "primary_operation__name"
+            )
+            .order_by("-created_on")
+        )
+        # Keep the latest one of every node, the first in the default
+        # ordering of the node supply chains.
+        for node_id, operation_id, name in node_supply_chains:
+            self._primary_operations.setdefault(
+                node_id,
+                {"id": comm_lib._encode(operation_id), "name": name},
+            )
+
+    def get_primary_operation(self, node) -> dict:
+        """Returns the primary operation of a node in the supply chain."""
+        return self.primary_operations.get(node.id, {"id": None, "name": None})
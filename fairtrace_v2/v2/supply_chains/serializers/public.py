@@ -40,12 +40,18 @@ class NodeBasicSerializer(serializers.ModelSerializer):
     tier_data: dict = {}
     pseudonymize = False
     can_manage = False
+    basic_data = None
 
     def __init__(self, *args, **kwargs):
-        """To perform function __init__."""
+        """To perform function __init__.
+
+        'basic_data' is the data of the node from serialize_node_basic, when
+        it has already been loaded with that of other nodes.
+        """
         self.pseudonymize = kwargs.pop("pseudonymize", False)
         self.tier_data = kwargs.pop("tier_data", {})
         self.can_manage = kwargs.pop("can_manage", False)
+        self.basic_data = kwargs.pop("basic_data", None)
         super(NodeBasicSerializer, self).__init__(*args, **kwargs)
 
     class Meta:
@@ -62,11 +68,7 @@ class NodeBasicSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         """To perform function to_representation."""
-        data = serialize_node_basic(instance)
-        if instance.is_company():
-            data["email_sent"] = instance.email_sent
-        else:
-            data["email_sent"] = False
+        data = self.basic_data or serialize_node_basic(instance)
         if self.tier_data:
             data["tier"] = self.tier_data[instance.id]["tier"]
             data["connected_to"] = self.tier_data[instance.id]["connected_to"]
@@ -74,6 +76,10 @@ class NodeBasicSerializer(serializers.ModelSerializer):
                 i.pop("email_sent") for i in data["connected_to"]
             ]
             data["email_sent"] = all(email_sent_check)
+        elif instance.is_company():
+            data["email_sent"] = instance.email_sent
+        else:
+            data["email_sent"] = False
 
         data["add_connections"] = False
         data["pseudonimized"] = False
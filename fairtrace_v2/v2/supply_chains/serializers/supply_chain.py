@@ -31,6 +31,7 @@ from v2.supply_chains.models.profile import FarmerReference
 from v2.supply_chains.serializers import node as node_serializers
 from v2.supply_chains.serializers.node import (NodeSerializer,
                                                OperationSerializer)
+from v2.supply_chains.serializers.loaders import ChainNodeLoader
 from v2.supply_chains.serializers.public import NodeBasicSerializer
 from v2.supply_chains.tasks import upload_bulk_connection_transaction
 from v2.transactions import constants as trans_constants
@@ -409,6 +410,7 @@ class ConnectionsSerializer(serializers.ModelSerializer):
     """Class to handle ConnectionsSerializer and functions."""
 
     managed_nodes = None
+    managed_ids = None
     supply_chain = None
 
     class Meta:
@@ -417,42 +419,39 @@ class ConnectionsSerializer(serializers.ModelSerializer):
 
     def can_manage(self, node):
         """To perform function can_manage."""
-        return node in self.managed_nodes
+        return node.id in self.managed_ids
 
     def can_read(self, node):
         """To perform function can_read."""
         return (
             node.disclosure_level == NODE_DISCLOSURE_FULL
-            or node in self.managed_nodes
+            or node.id in self.managed_ids
         )
 
     def get_node_data(self, nodes, tier_data, supply_chain_id):
-        """To perform function get_node_data."""
+        """To perform function get_node_data.
+
+        The data of all the nodes is loaded at once with a ChainNodeLoader.
+        """
         if not supply_chain_id:
             encoded_supply_chain_id = self.context["request"].query_params.get(
                 "supply_chain", None
             )
             supply_chain_id = comm_lib._decode(encoded_supply_chain_id)
+        loader = ChainNodeLoader(nodes, supply_chain_id)
         data = []
-        for node in nodes:
+        for node in loader.nodes:
             node_data = NodeBasicSerializer(
                 node,
                 tier_data=tier_data,
                 pseudonymize=not (self.can_read(node)),
                 can_manage=self.can_manage(node),
+                basic_data=loader.basic_data[node.id],
             ).data
             # add primary_operation to the node list.
-            node_data["primary_operation"] = {"id": None, "name": None}
-            if supply_chain_id:
-                nsc = node.nodesupplychain_set.filter(
-                    supply_chain_id=supply_chain_id,
-                    primary_operation__isnull=False,
-                ).first()
-                if nsc:
-                    node_data["primary_operation"] = {
-                        "id": nsc.primary_operation.idencode,
-                        "name": nsc.primary_operation.name,
-                    }
+            node_data["primary_operation"] = loader.get_primary_operation(
+                node
+            )
             data.append(node_data)
         return data
 
@@ -469,6 +468,9 @@ class ConnectionsSerializer(serializers.ModelSerializer):
         self.managed_nodes = instance.get_managed_nodes(
             supply_chain=supply_chain
         )
+        self.managed_ids = set(
+            self.managed_nodes.values_list("id", flat=True)
+        )
         self.supply_chain = supply_chain
 
         supplier_query, supplier_tier_data = instance.get_supplier_chain(
@@ -1,10 +1,20 @@
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 
+from .cache_handlers import bump_graph_versions_on_commit
+from .cache_handlers import clear_connection_cache
 from .cache_resetters import reload_related_statistics
 from .models import Connection
 from .models import ConnectionTag
 from .models import Node
+from .models import NodeManager
+from .models import NodeSupplyChain
+
+# Fields of the node supply chains shown in the connection maps.
+NODE_SUPPLY_CHAIN_MAP_FIELDS = {"node", "supply_chain", "primary_operation"}
 
 
 @receiver(pre_delete, sender=Node)
@@ -29,6 +39,64 @@ def delete_connection_graph_node(sender, instance, **kwargs):
     return True
 
 
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+def bump_connection_graph_version(sender, instance, **kwargs):
+    """Invalidates the connection maps of the supply chain."""
+    bump_graph_versions_on_commit([instance.supply_chain_id])
+
+
+@receiver(post_save, sender=ConnectionTag)
+@receiver(post_delete, sender=ConnectionTag)
+def bump_connection_tag_graph_version(sender, instance, **kwargs):
+    """Invalidates the connection maps of the supply chain of the tag."""
+    bump_graph_versions_on_commit(
+        Connection.objects.filter(
+            id=instance.supplier_connection_id
+        ).values_list("supply_chain_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=NodeSupplyChain)
+@receiver(post_delete, sender=NodeSupplyChain)
+def bump_node_supply_chain_graph_version(
+    sender, instance, update_fields=None, **kwargs
+):
+    """Invalidates the connection maps of the supply chain, which show the
+    nodes in it with their primary operations.
+
+    Saving only the statistics of the node supply chain does not change
+    the maps.
+    """
+    if update_fields is not None and not (
+        set(update_fields) & NODE_SUPPLY_CHAIN_MAP_FIELDS
+    ):
+        return
+    bump_graph_versions_on_commit([instance.supply_chain_id])
+
+
+@receiver(post_save, sender=NodeManager)
+@receiver(post_delete, sender=NodeManager)
+def bump_node_manager_graph_version(sender, instance, **kwargs):
+    """Invalidates the connection maps of the supply chains of the node and
+    its manager, which show the nodes the manager can manage."""
+    clear_connection_cache(instance.node_id, instance.manager_id)
+
+
+@receiver(m2m_changed, sender=Node.managers.through)
+def bump_managers_graph_version(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Invalidates the connection maps when managers are added to or
+    removed from nodes, which does not save the NodeManager objects.
+
+    Clearing the managers deletes the NodeManager objects, which is handled
+    by bump_node_manager_graph_version.
+    """
+    if action in ("post_add", "post_remove"):
+        clear_connection_cache(instance.id, *pk_set)
+
+
 @receiver(pre_delete, sender=ConnectionTag)
 def delete_connection_tag_rel(sender, instance, **kwargs):
     """To perform function lete_connection_tag_rel."""
@@ -0,0 +1,139 @@
+"""Statistics of the actors in the chains of a node.
+
+The dashboard stats of a node (NodeStats) and of a node in a supply chain
+(NodeSupplyChain) are computed from the ids of the suppliers and buyers in
+its chains. They are computed here with a fixed number of queries, however
+many actors are in the chains: one for the suppliers, one for the buyers,
+one grouped by operation and one with the invitation counts.
+"""
+from django.db.models import Count
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Q
+from v2.supply_chains.constants import NODE_TYPE_COMPANY
+from v2.supply_chains.constants import NODE_TYPE_FARM
+from v2.supply_chains.models import Invitation
+from v2.supply_chains.models import Node
+from v2.supply_chains.models import NodeSupplyChain
+
+
+def get_operation_stats(node_ids, supply_chain=None) -> dict:
+    """Returns the number of actors by primary operation.
+
+    Every supply chain of the nodes is counted, or only the supply chain
+    if one is given.
+    """
+    node_supply_chains = NodeSupplyChain.objects.filter(
+        node_id__in=node_ids, primary_operation__isnull=False
+    )
+    if supply_chain:
+        node_supply_chains = node_supply_chains.filter(
+            supply_chain=supply_chain
+        )
+    operations = (
+        node_supply_chains.values(
+            "primary_operation",
+            "primary_operation__name",
+            "primary_operation__node_type",
+        )
+        .annotate(count=Count("id"))
+        .order_by("primary_operation")
+    )
+    operation_count = {"supplier": [], "farmer": []}
+    for operation in operations:
+        node_type = (
+            "supplier"
+            if operation["primary_operation__node_type"] == NODE_TYPE_COMPANY
+            else "farmer"
+        )
+        operation_count[node_type].append(
+            {
+                "name": operation["primary_operation__name"],
+                "count": operation["count"],
+            }
+        )
+    return operation_count
+
+
+def get_invitation_counts(node, company_ids, supply_chain=None) -> dict:
+    """Returns the number of companies invited, signed up and active.
+
+    Only the invitations between the companies and the node are considered,
+    and only those of connections in the supply chain if one is given.
+    Companies without any such invitation have signed up on their own.
+    """
+    invites = Invitation.objects.filter(
+        invitee=OuterRef("pk"),
+        inviter_id__in=[*company_ids, node.id],
+    )
+    if supply_chain:
+        invites = invites.filter(connection__supply_chain=supply_chain)
+    return (
+        Node.objects.filter(id__in=company_ids)
+        .annotate(
+            has_invite=Exists(invites),
+            has_sent_invite=Exists(invites.filter(email_sent=True)),
+        )
+        .aggregate(
+            companies=Count("id"),
+            signed_up=Count("id", filter=Q(has_invite=False)),
+            invited=Count("id", filter=Q(has_sent_invite=True)),
+            active=Count(
+                "id",
+                filter=Q(has_sent_invite=True, date_joined__isnull=False),
+            ),
+        )
+    )
+
+
+def get_chain_stats(node, sup_ids, buy_ids, supply_chain=None) -> dict:
+    """Returns the statistics of the actors in the chains of a node.
+
+    Parameters:
+    - node: The node.
+    - sup_ids: Ids of the suppliers in the chain of the node.
+    - buy_ids: Ids of the buyers in the chain of the node.
+    - supply_chain: The supply chain of the chains, if any.
+
+    Returns the counts, the coordinates and the ids of the actors, and the
+    operation stats. The companies in the chains are either mapped or
+    invited.
+    """
+    actor_ids = set()
+    suppliers, farmers = [], []
+    for node_id, node_type, latitude, longitude in Node.objects.filter(
+        id__in=sup_ids
+    ).values_list("id", "type", "latitude", "longitude"):
+        actor_ids.add(node_id)
+        coordinates = {"latitude": latitude, "longitude": longitude}
+        if node_type == NODE_TYPE_FARM:
+            farmers.append((node_id, coordinates))
+        elif node_type == NODE_TYPE_COMPANY:
+            suppliers.append((node_id, coordinates))
+    buyer_ids, company_ids = [], {node_id for node_id, _ in suppliers}
+    for node_id, node_type in Node.objects.filter(id__in=buy_ids).values_list(
+        "id", "type"
+    ):
+        actor_ids.add(node_id)
+        buyer_ids.append(node_id)
+        if node_type == NODE_TYPE_COMPANY:
+            company_ids.add(node_id)
+
+    counts = get_invitation_counts(node, company_ids, supply_chain)
+    invited_actor_count = counts["invited"] + counts["signed_up"]
+    active_actor_count = counts["active"] + counts["signed_up"]
+    return {
+        "actor_count": len(actor_ids),
+        "supplier_count": len(suppliers),
+        "farmer_count": len(farmers),
+        "invited_actor_count": invited_actor_count,
+        "active_actor_count": active_actor_count,
+        "mapped_actor_count": counts["companies"] - invited_actor_count,
+        "pending_invite_count": invited_actor_count - active_actor_count,
+        "farmer_coorinates": [coordinates for _, coordinates in farmers],
+        "supplier_coorinates": [coordinates for _, coordinates in suppliers],
+        "operation_stats": get_operation_stats(sup_ids, supply_chain),
+        "buyer_ids": buyer_ids,
+        "supplier_ids": [node_id for node_id, _ in suppliers],
+        "farmer_ids": [node_id for node_id, _ in farmers],
+    }
@@ -0,0 +1,155 @@
+from unittest import mock
+
+from common.cache import filesystem_cache
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import translation
+from mixer.backend.django import mixer
+from v2.supply_chains import cache_handlers
+from v2.supply_chains.constants import NODE_TYPE_COMPANY
+from v2.supply_chains.models import Company
+from v2.supply_chains.models import Connection
+from v2.supply_chains.models import NodeManager
+from v2.supply_chains.models import NodeSupplyChain
+from v2.supply_chains.models import SupplyChain
+from v2.supply_chains.tests.integration.base import SupplyChainBaseTestCase
+
+
+class ConnectionCacheTestCase(SupplyChainBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Bump the versions right away, the test transaction is never
+        # committed.
+        patcher = mock.patch.object(cache_handlers, "transaction")
+        patcher.start().on_commit.side_effect = lambda func: func()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.clear_maps)
+        self.other_supply_chain = mixer.blend(SupplyChain)
+        self.other = mixer.blend(Company, type=NODE_TYPE_COMPANY)
+        self.other_node_supply_chain = mixer.blend(
+            NodeSupplyChain,
+            node=self.other,
+            supply_chain=self.other_supply_chain,
+            primary_operation=self.operation,
+        )
+
+    def clear_maps(self):
+        filesystem_cache.delete_many(
+            filesystem_cache.keys_by_tag(("node", self.company.id))
+        )
+
+    def get_versions(self):
+        return [
+            cache_handlers.get_graph_version(supply_chain.id)
+            for supply_chain in (self.supply_chain, self.other_supply_chain)
+        ]
+
+    def assertBumped(self, versions, bumped):
+        self.assertEqual(
+            [new > old for old, new in zip(versions, self.get_versions())],
+            bumped,
+        )
+
+    def get_map(self, build):
+        return cache_handlers.get_connection_map(
+            self.company.id, self.supply_chain.id, build
+        )
+
+    def test_connection_bumps_version(self):
+        versions = self.get_versions()
+
+        mixer.blend(
+            Connection,
+            buyer=self.company,
+            supplier=self.other,
+            supply_chain=self.supply_chain,
+        )
+
+        self.assertBumped(versions, [True, False])
+
+    def test_node_supply_chain_bumps_version(self):
+        versions = self.get_versions()
+
+        self.other_node_supply_chain.primary_operation = None
+        self.other_node_supply_chain.save()
+
+        self.assertBumped(versions, [False, True])
+
+    def test_node_supply_chain_statistics_do_not_bump_version(self):
+        versions = self.get_versions()
+
+        self.other_node_supply_chain.farmer_count = 2
+        self.other_node_supply_chain.save(
+            update_fields=["farmer_count", "updated_on"]
+        )
+
+        self.assertBumped(versions, [False, False])
+
+    def test_managers_bump_versions(self):
+        versions = self.get_versions()
+
+        self.company.managers.add(self.other)
+
+        self.assertBumped(versions, [True, True])
+        versions = self.get_versions()
+
+        NodeManager.objects.filter(node=self.company).delete()
+
+        self.assertBumped(versions, [True, True])
+
+    def test_missing_map_is_built_once(self):
+        build = mock.Mock(return_value={"nodes": []})
+
+        self.assertEqual(self.get_map(build), {"nodes": []})
+        self.assertEqual(self.get_map(build), {"nodes": []})
+        build.assert_called_once_with()
+
+    def test_map_built_by_lock_holder_is_waited_for(self):
+        key = cache_handlers.get_connection_map_key(
+            self.company.id, self.supply_chain.id
+        )
+        build = mock.Mock(return_value={"nodes": ["waiter"]})
+        cache.add(f"{key}_lock", True, 30)
+        self.addCleanup(cache.delete, f"{key}_lock")
+
+        with mock.patch.object(
+            cache_handlers.time,
+            "sleep",
+            side_effect=lambda _: filesystem_cache.set(key, {"nodes": []}),
+        ):
+            data = self.get_map(build)
+
+        self.assertEqual(data, {"nodes": []})
+        build.assert_not_called()
+
+    @override_settings(CONNECTION_MAP_LOCK_TIMEOUT=0)
+    def test_map_is_built_when_lock_holder_times_out(self):
+        key = cache_handlers.get_connection_map_key(
+            self.company.id, self.supply_chain.id
+        )
+        build = mock.Mock(return_value={"nodes": []})
+        cache.add(f"{key}_lock", True, 30)
+        self.addCleanup(cache.delete, f"{key}_lock")
+
+        self.assertEqual(self.get_map(build), {"nodes": []})
+        build.assert_called_once_with()
+
+    def test_build_deletes_maps_of_previous_versions(self):
+        with translation.override("en"):
+            old_key = cache_handlers.get_connection_map_key(
+                self.company.id, self.supply_chain.id
+            )
+            filesystem_cache.set(old_key, {"nodes": ["old"]})
+            cache_handlers.bump_graph_version(self.supply_chain.id)
+            with translation.override("nl"):
+                other_language_key = cache_handlers.get_connection_map_key(
+                    self.company.id, self.supply_chain.id
+                )
+                filesystem_cache.set(other_language_key, {"nodes": ["nl"]})
+
+            self.get_map(lambda: {"nodes": ["en"]})
+
+        self.assertIsNone(filesystem_cache.get(old_key))
+        self.assertEqual(
+            filesystem_cache.get(other_language_key), {"nodes": ["nl"]}
+        )
@@ -8,7 +8,6 @@ from django.db import transaction
 from django.db.models import F
 from django.db.models import Q
 from django.http import HttpResponse
-from django.utils import translation
 from rest_framework import generics
 from rest_framework import viewsets
 from rest_framework.exceptions import ValidationError
@@ -21,6 +20,7 @@ from v2.products.constants import PRODUCT_TYPE_LOCAL
 from v2.products.filters import ProductFilter
 from v2.products.models import Product
 from v2.supply_chains import permissions as sc_permissions
+from v2.supply_chains.cache_handlers import get_connection_map
 from v2.supply_chains.constants import (
     INVITE_RELATION_BUYER, INVITE_RELATION_SUPPLIER, NODE_TYPE_FARM
 )
@@ -101,29 +101,22 @@ class MapConnectionView(generics.RetrieveAPIView):
         data = self._cache_response(instance, supply_chain)
         return Response(data)
 
-    def _cache_response(self, instance, *args):
-        """To perform function _cache_response."""
-        # if not self.cache_prefix:
-        #     self.cache_prefix = self.__class__.__name__
-        # key = '_'.join([self.cache_prefix, str(instance.id),
-        #                 *[str(decode(obj)) for obj in args]])
-        # key = self._clean_key(key)
-        # data = filesystem_cache.get(key)
-        # if data:
-        #     return data
+    def _cache_response(self, instance, supply_chain=None):
+        """Returns the map of the node in the supply chain, cached with the
+        graph version of the supply chain."""
+        supply_chain_id = decode(supply_chain) if supply_chain else None
+        if not supply_chain_id:
+            return self._get_map(instance)
+        return get_connection_map(
+            instance.id, supply_chain_id, lambda: self._get_map(instance)
+        )
+
+    def _get_map(self, instance):
+        """Serializes the map of the node."""
         serializer = self.serializer_class(
             instance, context={"request": self.request}
         )
-        data = serializer.data
-        # filesystem_cache.set(key, data)
-        return data
-
-    @staticmethod
-    def _clean_key(key):
-        """To perform function _clean_key."""
-        current_language = translation.get_language()
-        key = key + "_" + current_language
-        return key
+        return serializer.data
 
 
 class TableConnectionView(generics.RetrieveAPIView):
@@ -385,8 +378,10 @@ class NodeSupplyChains(generics.ListAPIView):
             node=self.kwargs["pk"]
         ).order_by("-actor_count")
         node_stats = NodeStats.objects.get(node=self.kwargs["pk"])
-        if node_stats.is_outdated:
+        if not node_stats.last_updated:
             node_stats.update_values()
+        elif node_stats.is_outdated:
+            node_stats.reload()
         return node_supply_chain
 
 
@@ -0,0 +1,330 @@
+"""Set-based creation of incoming transactions from farmers.
+
+Creating a transaction with ExternalTransactionSerializer takes dozens of
+queries, most of them to check the same node, product and connections
+again, and to save every object one at a time. For bulk uploads the rows
+are validated up front and the transactions created in chunks, inserting
+the transactions, the batches of the farmers and the buyer, the source
+batches, the batch parents and farmers, the payments and the links to the
+data sheet with a single query each.
+
+The objects created are the same as with the serializer for an incoming
+transaction with 'force_create'.
+"""
+from collections import OrderedDict
+
+from common.drf_custom import fields as custom_fields
+from django.db import transaction as django_transaction
+from django.db.models import F
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+from rest_framework import serializers
+from v2.products import constants as prod_constants
+from v2.products.models import Batch
+from v2.products.models import BatchFarmerMapping
+from v2.projects import constants as project_constants
+from v2.projects.models import Payment
+from v2.supply_chains import constants as sc_constants
+from v2.supply_chains.models import Farmer
+from v2.transactions import constants as trans_constants
+from v2.transactions.context import TransactionContext
+from v2.transactions.models import ExternalTransaction
+from v2.transactions.models import SourceBatch
+from v2.transactions.models import Transaction
+from v2.transactions.tasks import transaction_follow_up
+
+CHUNK_SIZE = 500
+
+
+class IncomingTransactionRowSerializer(serializers.Serializer):
+    """Serializer to validate a row of a bulk transaction upload."""
+
+    quantity = custom_fields.RoundingDecimalField(
+        max_digits=25, decimal_places=3, min_value=0.01
+    )
+    price = serializers.FloatField(required=False, allow_null=True)
+    date = serializers.DateTimeField(required=False)
+    invoice_number = serializers.CharField(
+        required=False, allow_blank=True, max_length=100
+    )
+    comment = serializers.CharField(
+        required=False, allow_blank=True, max_length=1000
+    )
+    buyer_ref_number = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True, max_length=200
+    )
+    seller_ref_number = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True, max_length=200
+    )
+
+
+class BulkIncomingTransactionCreator:
+    """Creates incoming transactions from farmers to a node in bulk.
+
+    Rows are added with the farmer node they are received from, and are
+    created in chunks of CHUNK_SIZE with create(). Each chunk is created in
+    its own transaction. The connections and wallets are read from the
+    TransactionContext of the job, if one is given.
+    """
+
+    def __init__(
+        self,
+        node,
+        user,
+        product,
+        unit,
+        currency,
+        data_sheet=None,
+        transaction_context=None,
+    ):
+        """Initialize with the values common to all the transactions."""
+        self.node = node
+        self.user = user
+        self.product = product
+        self.unit = unit
+        self.currency = currency
+        self.data_sheet = data_sheet
+        self.transaction_context = transaction_context or TransactionContext()
+        self.rows = OrderedDict()
+
+    @property
+    def connected_ids(self) -> set:
+        """Ids of the nodes connected to the node in the supply chain."""
+        return self.transaction_context.get_connected_ids(
+            self.node, self.product.supply_chain
+        )
+
+    def add(self, key, farmer, data) -> dict:
+        """Validates a row and adds it to be created.
+
+        Returns the errors of the row, if any.
+        """
+        if farmer.type != sc_constants.NODE_TYPE_FARM:
+            return {
+                "node": [
+                    "Incoming transaction can only be created from farmer"
+                ]
+            }
+        serializer = IncomingTransactionRowSerializer(data=data)
+        if not serializer.is_valid():
+            return serializer.errors
+        self.rows[key] = (farmer, serializer.validated_data)
+        return {}
+
+    def create(self):
+        """Creates the transactions of the rows added, by chunk.
+
+        Returns the keys of the rows created, and the keys of the chunks
+        that could not be created with the exception raised.
+        """
+        created, failed = [], []
+        keys = list(self.rows)
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start : start + CHUNK_SIZE]  # noqa: E203
+            try:
+                self._create_chunk(chunk)
+            except Exception as e:
+                failed.append((chunk, e))
+            else:
+                created += chunk
+        self.rows.clear()
+        return created, failed
+
+    @django_transaction.atomic
+    def _create_chunk(self, keys):
+        """Creates the transactions of a chunk of rows."""
+        rows = [self.rows[key] for key in keys]
+        not_connected = {
+            farmer.idencode
+            for farmer, _ in rows
+            if farmer.id not in self.connected_ids
+        }
+        if not_connected:
+            raise ValueError(
+                "Only connected companies can create transaction.: "
+                f"{', '.join(sorted(not_connected))}"
+            )
+        full_name = Concat("first_name", Value(" "), "last_name")
+        names = dict(
+            Farmer.objects.filter(id__in={farmer.id for farmer, _ in rows})
+            .annotate(full_name=full_name)
+            .values_list("id", "full_name")
+        )
+        transfer_name = f"Created for transferring to {self.node.full_name}"
+        transactions = self._create_transactions(rows)
+        farmer_batches = self._create_batches(
+            (
+                Batch(
+                    node=farmer,
+                    product=self.product,
+                    name=transfer_name,
+                    initial_quantity=data["quantity"],
+                    current_quantity=0,
+                    unit=self.unit,
+                    type=prod_constants.BATCH_TYPE_INTERMEDIATE,
+                )
+                for farmer, data in rows
+            )
+        )
+        result_batches = self._create_batches(
+            (
+                Batch(
+                    product=self.product,
+                    node=self.node,
+                    initial_quantity=data["quantity"],
+                    current_quantity=data["quantity"],
+                    unit=self.unit,
+                    name=f"Purchased from {names[farmer.id]}",
+                    creator=self.user,
+                    updater=self.user,
+                    source_transaction_id=transaction.id,
+                    note=data.get("comment", ""),
+                    buyer_ref_number=data.get("buyer_ref_number"),
+                    seller_ref_number=data.get("seller_ref_number"),
+                )
+                for transaction, (farmer, data) in zip(transactions, rows)
+            )
+        )
+        SourceBatch.objects.bulk_create(
+            SourceBatch(
+                transaction_id=transaction.id,
+                batch=batch,
+                quantity=batch.initial_quantity,
+                creator=self.user,
+                updater=self.user,
+            )
+            for transaction, batch in zip(transactions, farmer_batches)
+        )
+        Batch.parents.through.objects.bulk_create(
+            Batch.parents.through(
+                from_batch_id=result_batch.id, to_batch_id=farmer_batch.id
+            )
+            for result_batch, farmer_batch in zip(
+                result_batches, farmer_batches
+            )
+        )
+        batch_farmers = [
+            BatchFarmerMapping(batch=batch, farmer_id=farmer.id)
+            for batch, (farmer, _) in zip(farmer_batches, rows)
+        ]
+        if self.node.type == sc_constants.NODE_TYPE_COMPANY:
+            batch_farmers += [
+                BatchFarmerMapping(batch=batch, farmer_id=farmer.id)
+                for batch, (farmer, _) in zip(result_batches, rows)
+            ]
+        BatchFarmerMapping.objects.bulk_create(
+            batch_farmers, ignore_conflicts=True
+        )
+        self._create_payments(transactions, rows, names)
+
+        if self.product.type == prod_constants.PRODUCT_TYPE_LOCAL:
+            self.product.owners.add(self.node)
+        if self.data_sheet:
+            self.data_sheet.added_transactions.add(
+                *(transaction.id for transaction in transactions)
+            )
+        transaction_ids = [transaction.id for transaction in transactions]
+        farmers = {farmer.id: farmer for farmer, _ in rows}
+        django_transaction.on_commit(
+            lambda: self._post_commit(transaction_ids, farmers.values())
+        )
+
+    def _create_transactions(self, rows) -> list:
+        """Creates the transactions of the rows.
+
+        bulk_create does not support multi-table inheritance, so the
+        Transaction rows are bulk created first and the ExternalTransaction
+        rows are inserted with their pointers, and with their fingerprints,
+        which are set by ExternalTransaction.save() otherwise.
+        """
+        now = timezone.now()
+        parents = Transaction.objects.bulk_create(
+            Transaction(
+                transaction_type=trans_constants.TRANSACTION_TYPE_EXTERNAL,
+                date=data.get("date", now),
+                invoice_number=data.get("invoice_number", ""),
+                comment=data.get("comment", ""),
+                _source_quantity=data["quantity"],
+                _destination_quantity=data["quantity"],
+                creator=self.user,
+                updater=self.user,
+            )
+            for _, data in rows
+        )
+        Transaction.objects.filter(
+            id__in=[parent.id for parent in parents]
+        ).update(number=F("id") + 2200)
+        transactions = [
+            ExternalTransaction(
+                transaction_ptr=parent,
+                source=farmer,
+                destination=self.node,
+                price=data.get("price"),
+                currency=self.currency,
+                type=trans_constants.EXTERNAL_TRANS_TYPE_INCOMING,
+                buyer_ref_number=data.get("buyer_ref_number"),
+                seller_ref_number=data.get("seller_ref_number"),
+                fingerprint=ExternalTransaction.get_fingerprint(
+                    farmer.id, parent.date, self.currency, data.get("price")
+                ),
+            )
+            for parent, (farmer, data) in zip(parents, rows)
+        ]
+        ExternalTransaction.objects._insert(
+            transactions,
+            fields=ExternalTransaction._meta.local_concrete_fields,
+        )
+        for parent, transaction in zip(parents, transactions):
+            transaction.id = parent.id
+        return transactions
+
+    @staticmethod
+    def _create_batches(batches) -> list:
+        """Bulk creates batches and sets their numbers."""
+        batches = Batch.objects.bulk_create(batches)
+        Batch.objects.filter(id__in=[batch.id for batch in batches]).update(
+            number=F("id") + 1200
+        )
+        return batches
+
+    def _create_payments(self, transactions, rows, names):
+        """Creates the base price payments of the transactions with a price,
+        as done by ExternalTransaction.save()."""
+        payments = []
+        for transaction, (farmer, data) in zip(transactions, rows):
+            if not data.get("price"):
+                continue
+            payments.append(
+                Payment(
+                    transaction_id=transaction.id,
+                    amount=data["price"],
+                    source=self.node,
+                    destination=farmer,
+                    currency=self.currency,
+                    invoice_number=data.get("invoice_number", ""),
+                    payment_type=project_constants.BASE_TRANSACTION,
+                    method=project_constants.NO_VERIFICATION,
+                    description=(
+                        f" {self.node.full_name} paid Base price to "
+                        f"{names[farmer.id]} for product {self.product.name}"
+                    ),
+                    creator=self.user,
+                    updater=self.user,
+                )
+            )
+        Payment.objects.bulk_create(payments)
+
+    def _post_commit(self, transaction_ids, farmers):
+        """Sets the wallets of the transactions and queues their follow-up
+        tasks."""
+        destination_wallet = self.transaction_context.get_wallet(self.node)
+        for farmer in farmers:
+            ExternalTransaction.objects.filter(
+                id__in=transaction_ids, source=farmer
+            ).update(
+                source_wallet=self.transaction_context.get_wallet(farmer),
+                destination_wallet=destination_wallet,
+            )
+        for transaction_id in transaction_ids:
+            transaction_follow_up.delay(transaction_id)
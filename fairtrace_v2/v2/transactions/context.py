@@ -0,0 +1,112 @@
+"""Job-scoped context for creating transactions.
+
+Creating a transaction with ExternalTransactionSerializer looks up the
+product, the connections of the node in the supply chain and the wallets of
+both parties. When many transactions are created for the same nodes, like
+in bulk uploads or the reverse sync, the same objects are queried again for
+every transaction.
+
+A TransactionContext is created once per request or job and passed to the
+serializers as context["transaction_context"]. The objects are loaded when
+first used and kept for the lifetime of the context, which should therefore
+not outlive the job.
+"""
+from v2.products.models import Product
+from v2.supply_chains.models import Node
+from v2.supply_chains.models import Operation
+
+
+class TransactionContext:
+    """Caches the objects looked up when creating transactions."""
+
+    def __init__(self):
+        """Initialize empty caches."""
+        self._products = {}
+        self._external_products = {}
+        self._external_nodes = {}
+        self._connected_ids = {}
+        self._wallets = {}
+        self._operations = {}
+
+    def add_product(self, product):
+        """Adds an already loaded product to the context."""
+        self._products[product.id] = product
+        if product.external_id:
+            self._external_products[product.external_id] = product
+
+    def get_product(self, product_id) -> Product:
+        """Returns the product with the id.
+
+        Raises Product.DoesNotExist like Product.objects.get.
+        """
+        if product_id not in self._products:
+            self.add_product(
+                Product.objects.select_related("supply_chain").get(
+                    id=product_id
+                )
+            )
+        return self._products[product_id]
+
+    def get_product_by_external_id(self, external_id) -> Product:
+        """Returns the product with the external id."""
+        if external_id not in self._external_products:
+            self.add_product(
+                Product.objects.select_related("supply_chain").get(
+                    external_id=external_id
+                )
+            )
+        return self._external_products[external_id]
+
+    def get_node_by_external_id(self, external_id) -> Node:
+        """Returns the node with the external id."""
+        if external_id not in self._external_nodes:
+            self._external_nodes[external_id] = Node.objects.get(
+                external_id=external_id
+            )
+        return self._external_nodes[external_id]
+
+    def get_connected_ids(self, node, supply_chain) -> set:
+        """Ids of the nodes connected to the node in the supply chain."""
+        key = (node.id, supply_chain.id)
+        if key not in self._connected_ids:
+            self._connected_ids[key] = set(
+                node.get_connections(supply_chain=supply_chain).values_list(
+                    "id", flat=True
+                )
+            )
+        return self._connected_ids[key]
+
+    def add_connection(self, node, supply_chain, connected_node):
+        """Records a connection created after the connections of the node
+        were loaded."""
+        key = (node.id, supply_chain.id)
+        if key in self._connected_ids:
+            self._connected_ids[key].add(connected_node.id)
+
+    def get_wallet(self, node):
+        """Returns the blockchain wallet of the node, setting it up if the
+        node does not have one."""
+        if node.id not in self._wallets:
+            self._wallets[node.id] = node.setup_blockchain_account()
+        return self._wallets[node.id]
+
+    def get_operation(self, name, supply_chain, node_type):
+        """Returns the operation matching the name in the supply chain.
+
+        The operation is matched by name, then by the start of the name,
+        and any operation of the node type is used if neither matches.
+        Returns None if the supply chain has no operation for the node
+        type.
+        """
+        name = name.strip()
+        key = (name.lower(), supply_chain.id, node_type)
+        if key not in self._operations:
+            operations = Operation.objects.filter(
+                supply_chains=supply_chain, node_type=node_type
+            )
+            self._operations[key] = (
+                operations.filter(name__iexact=name).last()
+                or operations.filter(name__istartswith=name).last()
+                or operations.last()
+            )
+        return self._operations[key]
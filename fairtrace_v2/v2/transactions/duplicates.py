@@ -0,0 +1,222 @@
+"""Set-based duplicate checks for the rows of bulk upload sheets.
+
+The rows of a sheet are checked for farmers and transactions that already
+exist before the sheet is uploaded. Checking a row filters farmers and
+transactions on all their identity fields, joined with the supply chains of
+the nodes, so checking a sheet row by row takes two queries per row.
+
+Farmers and external transactions store a fingerprint of their identity
+fields, see Farmer.get_fingerprint and ExternalTransaction.get_fingerprint.
+The possible duplicates of all the rows are loaded with a single indexed
+query on the fingerprints, and compared with the rows field by field, as
+the filters on the fields did, so that the result is the same as checking
+every row on its own.
+"""
+import decimal
+import re
+from collections import defaultdict
+
+from common import library as comm_lib
+from common.excel_templates.constants import VALUE_CHANGED
+from common.excel_templates.constants import VALUE_NEW
+from common.excel_templates.constants import VALUE_UNCHANGED
+from django.utils import timezone
+from v2.products.models import Batch
+from v2.supply_chains.constants import FARMER_FINGERPRINT_FIELDS
+from v2.supply_chains.models import Farmer
+from v2.transactions.constants import BULK_UPLOAD_TYPE_TXN
+from v2.transactions.constants import DUPLICATE_EX_TXN
+from v2.transactions.constants import DUPLICATE_FARMER
+from v2.transactions.models import ExternalTransaction
+
+# Fields of the transactions compared with the rows.
+TRANSACTION_FIELDS = (
+    "source",
+    "date",
+    "currency",
+    "price",
+    "result_batches__product",
+    "result_batches__current_quantity",
+    "source__nodesupplychain__primary_operation",
+)
+
+
+def _prep(value):
+    """Returns the value as compared by a lookup on a CharField."""
+    return value if value is None else str(value)
+
+
+def _farmer_values(row) -> dict:
+    """Returns the identity fields of the farmer of a row."""
+    values = {field: _prep(row[field]) for field in FARMER_FINGERPRINT_FIELDS}
+    dial_code = re.sub("[(),a-z,A-Z]", "", row["dial_code"])
+    values["phone"] = str(dial_code) + str(row["phone"])
+    return values
+
+
+def find_duplicate_farmers(rows) -> list:
+    """Returns the id of the farmer matching each row, or None.
+
+    A farmer matches a row if all the identity fields are the same and the
+    farmer has the primary operation of the row in a supply chain.
+    """
+    operation_field = "nodesupplychain__primary_operation"
+    row_values = [_farmer_values(row) for row in rows]
+    fingerprints = [Farmer.get_fingerprint(values) for values in row_values]
+    candidates = defaultdict(list)
+    farmers = (
+        Farmer.objects.filter(fingerprint__in=set(fingerprints))
+        .values(
+            "id", "fingerprint", operation_field, *FARMER_FINGERPRINT_FIELDS
+        )
+        .order_by("id")
+    )
+    for farmer in farmers:
+        candidates[farmer["fingerprint"]].append(farmer)
+
+    duplicates = []
+    for row, values, fingerprint in zip(rows, row_values, fingerprints):
+        operation = comm_lib._decode(row["primary_operation"])
+        duplicates.append(
+            next(
+                (
+                    farmer["id"]
+                    for farmer in candidates[fingerprint]
+                    if farmer[operation_field] == operation
+                    and all(
+                        farmer[field] == value
+                        for field, value in values.items()
+                    )
+                ),
+                None,
+            )
+        )
+    return duplicates
+
+
+def _quantity(value):
+    """Returns the quantity as compared by a lookup on the quantity of the
+    batches, rounded to the decimal places of the field."""
+    field = Batch._meta.get_field("current_quantity")
+    quantity = field.to_python(comm_lib.convert_float(value))
+    context = decimal.Context(prec=field.max_digits)
+    return quantity.quantize(
+        decimal.Decimal(1).scaleb(-field.decimal_places), context=context
+    )
+
+
+def _transaction_values(row) -> dict:
+    """Returns the fields of the transaction of a row, or None if the
+    row is not from an existing farmer."""
+    if not row["id"]:
+        return None
+    return {
+        "source": comm_lib._decode(row["id"]),
+        "date": comm_lib._string_to_datetime(row["transaction_date"]),
+        "currency": _prep(row["currency"]),
+        "price": comm_lib.convert_float(row["price_per_unit"]),
+        "result_batches__product": comm_lib._decode(row["product_id"]),
+        "result_batches__current_quantity": _quantity(row["quantity"]),
+        "source__nodesupplychain__primary_operation": comm_lib._decode(
+            row["primary_operation"]
+        ),
+    }
+
+
+def _transaction_fingerprint(values) -> str:
+    """Returns the fingerprint of the fields of a transaction."""
+    return ExternalTransaction.get_fingerprint(
+        values["source"], values["date"], values["currency"], values["price"]
+    )
+
+
+def find_duplicate_transactions(rows) -> list:
+    """Returns the id of the external transaction matching each row, or
+    None.
+
+    A transaction matches a row if it is from the farmer of the row, on
+    the day of the row, with the same currency and price, and has a result
+    batch of the product with the quantity of the row. Rows of new farmers
+    do not match any transaction.
+    """
+    row_values = [_transaction_values(row) for row in rows]
+    fingerprints = [
+        _transaction_fingerprint(values) if values else None
+        for values in row_values
+    ]
+    candidates = defaultdict(list)
+    transactions = (
+        ExternalTransaction.objects.filter(
+            fingerprint__in=set(fingerprints) - {None}
+        )
+        .values("id", "fingerprint", *TRANSACTION_FIELDS)
+        .order_by("id")
+    )
+    for transaction in transactions:
+        transaction["date"] = (
+            timezone.localtime(transaction["date"]).date().isoformat()
+        )
+        candidates[transaction["fingerprint"]].append(transaction)
+
+    duplicates = []
+    for values, fingerprint in zip(row_values, fingerprints):
+        duplicates.append(
+            next(
+                (
+                    transaction["id"]
+                    for transaction in candidates[fingerprint]
+                    if all(
+                        transaction[field] == value
+                        for field, value in values.items()
+                    )
+                ),
+                None,
+            )
+            if values
+            else None
+        )
+    return duplicates
+
+
+def validate_rows(rows, bulk_upload_type) -> list:
+    """Checks the rows of a bulk upload sheet for duplicates.
+
+    Returns the result of each row, with whether the row is a duplicate,
+    the type and id of the duplicate, the status of the farmer and, for
+    transaction uploads, the status of the transaction.
+    """
+    results = []
+    farmer_ids = find_duplicate_farmers(rows)
+    for row, farmer_id in zip(rows, farmer_ids):
+        data = {
+            "duplicate": False,
+            "duplicate_type": "",
+            "farmer_status": VALUE_UNCHANGED,
+            "duplicate_id": "",
+        }
+        if farmer_id and not row["id"]:
+            data["duplicate"] = True
+            data["duplicate_type"] = DUPLICATE_FARMER
+            data["duplicate_id"] = comm_lib._encode(farmer_id)
+            data["farmer_status"] = VALUE_NEW
+        elif not row["id"]:
+            data["farmer_status"] = VALUE_NEW
+        elif not farmer_id:
+            data["farmer_status"] = VALUE_CHANGED
+        results.append(data)
+
+    if bulk_upload_type != BULK_UPLOAD_TYPE_TXN:
+        return results
+
+    transaction_ids = find_duplicate_transactions(rows)
+    for data, transaction_id in zip(results, transaction_ids):
+        data["transaction_status"] = VALUE_NEW
+        if not transaction_id:
+            continue
+        data["transaction_status"] = VALUE_UNCHANGED
+        if not data["duplicate"]:
+            data["duplicate"] = True
+            data["duplicate_id"] = comm_lib._encode(transaction_id)
+        if not data["duplicate_type"]:
+            data["duplicate_type"] = DUPLICATE_EX_TXN
+    return results
@@ -0,0 +1,173 @@
+"""Maintenance of the transaction lineage closure table.
+
+TransactionLineage stores one row per (ancestor, descendant) pair of the
+transaction graph with the length of the shortest path between them.
+Adding an edge is a single set-based insert joining the ancestors of the
+parent with the descendants of the child. Removing an edge can break
+paths that are still reachable another way, so the ancestor rows of every
+affected descendant are recomputed from the live m2m instead.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db import transaction as db_transaction
+
+from .models import Transaction
+from .models import TransactionLineage
+
+LINEAGE_TABLE = TransactionLineage._meta.db_table
+
+_parents = Transaction._meta.get_field("parents")
+EDGE_TABLE = _parents.m2m_db_table()
+CHILD_COLUMN = _parents.m2m_column_name()
+PARENT_COLUMN = _parents.m2m_reverse_name()
+
+# Walks the edge table upwards from the descendants selected by `{seed}`
+# and returns every reachable ancestor with its shortest distance.
+WALK_SQL = f"""
+    WITH RECURSIVE walk(descendant_id, ancestor_id, depth) AS (
+        SELECT "{CHILD_COLUMN}", "{PARENT_COLUMN}", 1
+        FROM "{EDGE_TABLE}"
+        WHERE {{seed}}
+        UNION
+        SELECT walk.descendant_id, edge."{PARENT_COLUMN}", walk.depth + 1
+        FROM "{EDGE_TABLE}" edge
+        JOIN walk ON edge."{CHILD_COLUMN}" = walk.ancestor_id
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth)
+    FROM walk
+    GROUP BY ancestor_id, descendant_id
+"""
+
+ADD_EDGE_SQL = f"""
+    INSERT INTO "{LINEAGE_TABLE}" (ancestor_id, descendant_id, depth)
+    SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+    FROM (
+        SELECT ancestor_id, depth FROM "{LINEAGE_TABLE}"
+        WHERE descendant_id = %(parent)s
+        UNION ALL SELECT %(parent)s, 0
+    ) up
+    CROSS JOIN (
+        SELECT descendant_id, depth FROM "{LINEAGE_TABLE}"
+        WHERE ancestor_id = %(child)s
+        UNION ALL SELECT %(child)s, 0
+    ) down
+    ON CONFLICT (ancestor_id, descendant_id)
+    DO UPDATE SET depth = LEAST("{LINEAGE_TABLE}".depth, EXCLUDED.depth)
+"""
+
+
+def _insert_sql(seed):
+    """Insert statement storing the result of WALK_SQL for `seed`."""
+    return (
+        f'INSERT INTO "{LINEAGE_TABLE}" (ancestor_id, descendant_id, depth) '
+        + WALK_SQL.format(seed=seed)
+    )
+
+
+def is_enabled():
+    """Whether lineage lookups should be served from the closure table.
+
+    The table is always maintained, but reads are only switched over once
+    it has been backfilled with `rebuild_transaction_lineage`.
+    """
+    return getattr(settings, "TRANSACTION_LINEAGE_ENABLED", False)
+
+
+def add_edges(edges):
+    """Adds lineage rows for new (child_id, parent_id) edges."""
+    with connection.cursor() as cursor:
+        for child_id, parent_id in edges:
+            cursor.execute(
+                ADD_EDGE_SQL, {"child": child_id, "parent": parent_id}
+            )
+
+
+def affected_descendants(transaction_ids):
+    """Returns the transactions whose ancestry depends on the given ones."""
+    ids = set(transaction_ids)
+    ids |= set(
+        TransactionLineage.objects.filter(
+            ancestor_id__in=transaction_ids
+        ).values_list("descendant_id", flat=True)
+    )
+    return ids
+
+
+def refresh(descendant_ids):
+    """Recomputes the ancestor rows of the given transactions."""
+    descendant_ids = list(descendant_ids)
+    if not descendant_ids:
+        return 0
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM "{LINEAGE_TABLE}" WHERE descendant_id = ANY(%s)',
+            [descendant_ids],
+        )
+        cursor.execute(
+            _insert_sql(f'"{CHILD_COLUMN}" = ANY(%s)'), [descendant_ids]
+        )
+        return cursor.rowcount
+
+
+def _id_chunks(chunk_size):
+    """Yields (start, end) ranges covering all transaction ids."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT MIN("{CHILD_COLUMN}"), MAX("{CHILD_COLUMN}") '
+            f'FROM "{EDGE_TABLE}"'
+        )
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        yield start, start + chunk_size - 1
+
+
+def _range_seed():
+    """Seed condition selecting edges of a range of descendants."""
+    return f'"{CHILD_COLUMN}" BETWEEN %s AND %s'
+
+
+def rebuild(chunk_size=5000):
+    """Rebuilds the whole closure table from the live m2m.
+
+    Descendants are processed in id ranges, each committed separately, to
+    keep the recursive walk and the write set of a statement bounded.
+
+    Yields the (start, end, rows) of every processed range.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE "{LINEAGE_TABLE}"')
+    for start, end in _id_chunks(chunk_size):
+        with db_transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(_insert_sql(_range_seed()), [start, end])
+            yield start, end, cursor.rowcount
+
+
+def check(chunk_size=5000):
+    """Compares the closure table against the live m2m.
+
+    Yields a dict per id range with the number of `missing` rows, that are
+    derivable from the m2m but not stored, and `extra` rows, that are
+    stored but not derivable, where depths are compared as well.
+    """
+    for start, end in _id_chunks(chunk_size):
+        sql = f"""
+            WITH expected AS ({WALK_SQL.format(seed=_range_seed())}),
+            stored AS (
+                SELECT ancestor_id, descendant_id, depth
+                FROM "{LINEAGE_TABLE}"
+                WHERE descendant_id BETWEEN %s AND %s
+            )
+            SELECT
+                (SELECT COUNT(*) FROM (
+                    SELECT * FROM expected EXCEPT SELECT * FROM stored
+                ) missing),
+                (SELECT COUNT(*) FROM (
+                    SELECT * FROM stored EXCEPT SELECT * FROM expected
+                ) extra)
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [start, end, start, end])
+            missing, extra = cursor.fetchone()
+        yield {"start": start, "end": end, "missing": missing, "extra": extra}
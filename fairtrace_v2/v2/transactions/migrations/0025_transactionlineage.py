@@ -0,0 +1,26 @@
+# Generated by Django 2.2.6 on 2026-10-16 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0024_auto_20250408_1258'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionLineage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=1)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_lineage', to='transactions.Transaction')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_lineage', to='transactions.Transaction')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+    ]
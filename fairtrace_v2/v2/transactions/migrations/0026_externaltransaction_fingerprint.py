@@ -0,0 +1,45 @@
+# Generated by Django 2.2.6 on 2026-10-16 10:00
+from django.db import migrations, models
+from django.utils import timezone
+
+from common.library import hash_fingerprint
+
+BATCH_SIZE = 1000
+
+
+def set_fingerprints(apps, schema_editor):
+    """Set the fingerprint of the existing external transactions, as
+    ExternalTransaction.get_fingerprint does."""
+    transaction_model = apps.get_model('transactions', 'ExternalTransaction')
+    transactions = transaction_model.objects.only(
+        'source_id', 'date', 'currency', 'price')
+    batch = []
+    for transaction in transactions.iterator(chunk_size=BATCH_SIZE):
+        date = transaction.date
+        if timezone.is_aware(date):
+            date = timezone.localtime(date)
+        price = transaction.price
+        transaction.fingerprint = hash_fingerprint(
+            transaction.source_id, date.date(), transaction.currency,
+            None if price is None else float(price))
+        batch.append(transaction)
+        if len(batch) >= BATCH_SIZE:
+            transaction_model.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    transaction_model.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0025_transactionlineage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='externaltransaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(set_fingerprints, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 """Models for transactions."""
 import json
 import os
+from datetime import datetime
 
 from common import library as comm_lib
 from common.currencies import CURRENCY_CHOICES
@@ -294,6 +295,97 @@ class Transaction(AbstractBaseModel, GraphModel):
             products |= parent.get_absolute_source_products()
         return products.order_by().distinct("id")
 
+    def _lineage_queryset(self, ids, include_self):
+        """Returns transactions in a lineage id subquery."""
+        query = models.Q(id__in=ids)
+        if include_self:
+            query |= models.Q(id=self.id)
+        return (
+            Transaction.objects.filter(query).order_by("-id").distinct("id")
+        )
+
+    def _lineage_ids(self, ids, include_self):
+        """Returns the set of ids in a lineage id subquery."""
+        ids = set(ids)
+        if include_self:
+            ids.add(self.id)
+        return ids
+
+    def _ancestor_lineage(self, max_depth):
+        """Ancestor ids of the transaction from the closure table."""
+        links = TransactionLineage.objects.filter(descendant_id=self.id)
+        if max_depth is not None:
+            links = links.filter(depth__lte=max_depth)
+        return links.values_list("ancestor_id", flat=True)
+
+    def _descendant_lineage(self, max_depth):
+        """Descendant ids of the transaction from the closure table."""
+        links = TransactionLineage.objects.filter(ancestor_id=self.id)
+        if max_depth is not None:
+            links = links.filter(depth__lte=max_depth)
+        return links.values_list("descendant_id", flat=True)
+
+    def get_ancestors(self, include_self=False, batches=None, max_depth=None):
+        """Serves ancestors from the lineage closure table when enabled.
+
+        Pruning by batches depends on the path taken and is left to the
+        graph traversal.
+        """
+        from .lineage import is_enabled
+
+        if batches or not is_enabled():
+            return super().get_ancestors(
+                include_self=include_self,
+                batches=batches,
+                max_depth=max_depth,
+            )
+        return self._lineage_queryset(
+            self._ancestor_lineage(max_depth), include_self
+        )
+
+    def get_descendants(self, include_self=False, max_depth=None):
+        """Serves descendants from the lineage closure table when
+        enabled."""
+        from .lineage import is_enabled
+
+        if not is_enabled():
+            return super().get_descendants(
+                include_self=include_self, max_depth=max_depth
+            )
+        return self._lineage_queryset(
+            self._descendant_lineage(max_depth), include_self
+        )
+
+    def get_ancestor_ids(
+        self, include_self=False, batches=None, max_depth=None
+    ):
+        """Serves ancestor ids from the lineage closure table when
+        enabled."""
+        from .lineage import is_enabled
+
+        if batches or not is_enabled():
+            return super().get_ancestor_ids(
+                include_self=include_self,
+                batches=batches,
+                max_depth=max_depth,
+            )
+        return self._lineage_ids(
+            self._ancestor_lineage(max_depth), include_self
+        )
+
+    def get_descendant_ids(self, include_self=False, max_depth=None):
+        """Serves descendant ids from the lineage closure table when
+        enabled."""
+        from .lineage import is_enabled
+
+        if not is_enabled():
+            return super().get_descendant_ids(
+                include_self=include_self, max_depth=max_depth
+            )
+        return self._lineage_ids(
+            self._descendant_lineage(max_depth), include_self
+        )
+
     def get_parent_transactions(self, only_internal=False, batches=None):
         """To perform function get_parent_transactions."""
         if batches:
@@ -516,6 +608,10 @@ class ExternalTransaction(
         max_length=200, default="", null=True, blank=True
     )
 
+    fingerprint = models.CharField(
+        max_length=32, default="", blank=True, db_index=True, editable=False
+    )
+
     objects = ExternalTransactionQuerySet.as_manager()
 
     def __init__(self, *args, **kwargs):
@@ -523,6 +619,23 @@ class ExternalTransaction(
         kwargs["transaction_type"] = constants.TRANSACTION_TYPE_EXTERNAL
         super(ExternalTransaction, self).__init__(*args, **kwargs)
 
+    @staticmethod
+    def get_fingerprint(source_id, date, currency, price):
+        """Returns the fingerprint of the fields identifying a transaction.
+
+        Transactions from the same source, on the same day, with the same
+        currency and price have the same fingerprint, so that possible
+        duplicates are looked up with the index on it. The day is taken in
+        the current timezone, as with a 'date__date' lookup.
+        """
+        if isinstance(date, datetime):
+            if timezone.is_aware(date):
+                date = timezone.localtime(date)
+            date = date.date()
+        if price is not None:
+            price = float(price)
+        return comm_lib.hash_fingerprint(source_id, date, currency, price)
+
     def save(self, *args, **kwargs):
         """Saves the instance and performs additional operations.
 
@@ -535,6 +648,11 @@ class ExternalTransaction(
         - *args: Variable-length argument list.
         - **kwargs: Arbitrary keyword arguments.
         """
+        self.fingerprint = self.get_fingerprint(
+            self.source_id, self.date, self.currency, self.price
+        )
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "fingerprint"}
         super().save(*args, **kwargs)
         self.update_payments()
 
@@ -1432,3 +1550,41 @@ class TransactionAttachment(AbstractBaseModel):
         """Returns a string representation of the transaction attachment."""
         file_name = os.path.basename(self.attachment.name)
         return f"{self.transaction.number} : {file_name} - {self.pk}"
+
+
+class TransactionLineage(models.Model):
+    """Closure table of the transaction graph.
+
+    Every transaction is linked to each of its ancestors, so that lineage
+    lookups are indexed reads instead of graph traversals. The table is
+    maintained incrementally from the `parents` m2m signal, see
+    v2.transactions.lineage.
+
+    Attributes:
+        ancestor(obj)   : Transaction upstream in the graph.
+        descendant(obj) : Transaction downstream in the graph.
+        depth(int)      : Length of the shortest path between the two.
+    """
+
+    ancestor = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name="descendant_lineage",
+    )
+    descendant = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name="ancestor_lineage",
+    )
+    depth = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+
+    def __str__(self):
+        """Returns a string representation of the lineage link."""
+        return "%s -> %s (%s)" % (
+            self.ancestor_id,
+            self.descendant_id,
+            self.depth,
+        )
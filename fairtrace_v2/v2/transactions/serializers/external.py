@@ -26,6 +26,7 @@ from v2.supply_chains.models import Node
 from v2.supply_chains.serializers.public import NodeBasicSerializer
 from v2.supply_chains.serializers.public import NodeWalletSerializer
 from v2.transactions import constants as trans_constants
+from v2.transactions.context import TransactionContext
 from v2.transactions.models import ExternalTransaction
 from v2.transactions.models import SourceBatch
 from v2.transactions.tasks import transaction_follow_up
@@ -202,6 +203,9 @@ class ExternalTransactionSerializer(serializers.ModelSerializer):
             self.current_node = self.context["view"].kwargs["node"]
         except Exception:
             self.current_node = self.context["node"]
+        self.transaction_context = self.context.get(
+            "transaction_context"
+        ) or TransactionContext()
 
     def check_if_rejectable(self, instance):
         """Transaction can only be rejected is it's batched have not been
@@ -267,9 +271,9 @@ class ExternalTransactionSerializer(serializers.ModelSerializer):
                     "Incoming transaction can only be created from farmer"
                 )
 
-        Product.objects.get(
-            id=common_lib._decode(self.initial_data["product"])
-        ).supply_chain
+        self.transaction_context.get_product(
+            common_lib._decode(self.initial_data["product"])
+        )
 
     def get_buyer_supplier(self, node):
         """Get buyer and supplier based on transaction direction."""
@@ -498,18 +502,20 @@ class ExternalTransactionSerializer(serializers.ModelSerializer):
         """
 
         if "node" in validated_data.keys():
-            supply_chain = Product.objects.get(
-                id=common_lib._decode(self.initial_data["product"])
+            supply_chain = self.transaction_context.get_product(
+                common_lib._decode(self.initial_data["product"])
             ).supply_chain
             try:
                 node = self.context["view"].kwargs["node"]
             except KeyError:
                 node = self.context["node"]
-            connected_nodes = node.get_connections(supply_chain=supply_chain)
-            if not validated_data["node"] in connected_nodes:
+            connected_ids = self.transaction_context.get_connected_ids(
+                node, supply_chain
+            )
+            if validated_data["node"].id not in connected_ids:
                 raise BadRequest(
                     f"Only connected companies can create transaction.: "
-                    f"{validated_data['node']} not in {connected_nodes}"
+                    f"{validated_data['node']} not connected to {node}"
                 )
         force_create = validated_data.pop("force_create", None)
         if "created_on" in validated_data.keys():
@@ -598,7 +604,10 @@ class ExternalTransactionSerializer(serializers.ModelSerializer):
         if created:
             django_transaction.on_commit(
                 lambda: self.post_commit(
-                    transaction, supplier=supplier, buyer=buyer
+                    transaction,
+                    supplier=supplier,
+                    buyer=buyer,
+                    transaction_context=self.transaction_context,
                 )
             )
         return transaction
@@ -606,12 +615,15 @@ class ExternalTransactionSerializer(serializers.ModelSerializer):
     @staticmethod
     def post_commit(transaction, **kwargs):
         """To perform function post_commit."""
-        transaction.source_wallet = kwargs[
-            "supplier"
-        ].setup_blockchain_account()
-        transaction.destination_wallet = kwargs[
-            "buyer"
-        ].setup_blockchain_account()
+        transaction_context = kwargs.get(
+            "transaction_context"
+        ) or TransactionContext()
+        transaction.source_wallet = transaction_context.get_wallet(
+            kwargs["supplier"]
+        )
+        transaction.destination_wallet = transaction_context.get_wallet(
+            kwargs["buyer"]
+        )
         transaction.save()
         transaction_follow_up.delay(transaction.id)
 
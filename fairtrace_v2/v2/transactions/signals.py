@@ -1,3 +1,10 @@
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from v2.transactions import lineage
+from v2.transactions.models import Transaction
+
 # @receiver(post_save)
 # def caching_signal_transaction(sender, instance, **kwargs):
 #     sender_name = sender.__name__
@@ -11,3 +18,44 @@
 #     for batch in batches:
 #         clear_ci_cache(batch, 'stage')
 #         clear_ci_cache(batch, 'map')
+
+
+@receiver(m2m_changed, sender=Transaction.parents.through)
+def update_transaction_lineage(sender, instance, action, reverse, **kwargs):
+    """Keeps the lineage closure table in sync with the parents m2m."""
+    pk_set = kwargs.get("pk_set") or set()
+    if action == "post_add":
+        if reverse:
+            edges = [(child_id, instance.id) for child_id in pk_set]
+        else:
+            edges = [(instance.id, parent_id) for parent_id in pk_set]
+        lineage.add_edges(edges)
+    elif action == "post_remove":
+        lineage.refresh(
+            lineage.affected_descendants(pk_set if reverse else {instance.id})
+        )
+    elif action == "pre_clear":
+        if reverse:
+            children = instance.children.values_list("id", flat=True)
+            instance._lineage_affected = lineage.affected_descendants(children)
+        else:
+            instance._lineage_affected = lineage.affected_descendants(
+                {instance.id}
+            )
+    elif action == "post_clear":
+        lineage.refresh(getattr(instance, "_lineage_affected", set()))
+
+
+@receiver(pre_delete, sender=Transaction)
+def collect_transaction_lineage(sender, instance, **kwargs):
+    """Remembers the descendants whose ancestry passes through a deleted
+    transaction."""
+    instance._lineage_affected = lineage.affected_descendants(
+        {instance.id}
+    ) - {instance.id}
+
+
+@receiver(post_delete, sender=Transaction)
+def refresh_transaction_lineage(sender, instance, **kwargs):
+    """Recomputes the ancestry of descendants of a deleted transaction."""
+    lineage.refresh(getattr(instance, "_lineage_affected", set()))
@@ -1,6 +1,9 @@
 """Celery tasks from Supply chain app."""
 from celery import shared_task
+from django.conf import settings
+from django.utils import translation
 from scripts.app_transactions import export_txn
+from v2.products.trace_snapshot import get_snapshot
 from v2.transactions.models import Transaction
 
 
@@ -13,6 +16,10 @@ def transaction_follow_up(transaction_id):
     child.notify()
     child.log_blockchain_transaction()
     child.update_cache()
+    for batch in transaction.result_batches.all():
+        for language, _ in settings.CI_LANGUAGES:
+            with translation.override(language):
+                get_snapshot(batch, rebuild=True)
     return True
 
 
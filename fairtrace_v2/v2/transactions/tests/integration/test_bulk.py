@@ -0,0 +1,256 @@
+"""Tests of the bulk creation of incoming transactions."""
+from unittest import mock
+
+from common.currencies import CURRENCY_USD
+from mixer.backend.django import mixer
+from v2.bulk_uploads.models import DataSheetTemplate
+from v2.bulk_uploads.models.uploads import DataSheetUpload
+from v2.bulk_uploads.tasks.bulk_transaction_adapters import (
+    BulkTransactionAdapter,
+)
+from v2.products.constants import UNIT_KG
+from v2.products.models import BatchFarmerMapping
+from v2.projects.models import Payment
+from v2.supply_chains.constants import BLOCKCHAIN_WALLET_TYPE_HEDERA
+from v2.supply_chains.constants import NODE_TYPE_FARM
+from v2.supply_chains.models import BlockchainWallet
+from v2.supply_chains.models import Connection
+from v2.supply_chains.models import Farmer
+from v2.supply_chains.models import NodeSupplyChain
+from v2.transactions.bulk import BulkIncomingTransactionCreator
+from v2.transactions.constants import EXTERNAL_TRANS_TYPE_INCOMING
+from v2.transactions.models import ExternalTransaction
+from v2.transactions.models import SourceBatch
+from v2.transactions.tasks import transaction_follow_up
+from v2.transactions.tests.integration.base import TransactionBaseTestCase
+
+
+class BulkIncomingTransactionTestCase(TransactionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Run the wallet updates of the transactions, which are deferred
+        # until the commit of the test transaction otherwise.
+        for patcher in (
+            mock.patch(
+                "django.db.transaction.on_commit",
+                side_effect=lambda func: func(),
+            ),
+            mock.patch.object(transaction_follow_up, "delay"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.wallets = {self.company.id: self.create_wallet(self.company)}
+        self.data = {
+            "quantity": "12.300",
+            "price": 20.5,
+            "date": "2023-05-17T10:00:00Z",
+            "invoice_number": "INV-1",
+            "comment": "Bulk upload",
+            "buyer_ref_number": "B-1",
+            "seller_ref_number": "S-1",
+        }
+        template = mixer.blend(DataSheetTemplate, file=None)
+        self.data_sheet = DataSheetUpload.objects.bulk_create(
+            [
+                DataSheetUpload(
+                    node=self.company,
+                    template=template,
+                    product=self.product,
+                    supply_chain=self.supply_chain,
+                    unit=UNIT_KG,
+                    currency=CURRENCY_USD,
+                    creator=self.user,
+                    updater=self.user,
+                )
+            ]
+        )[0]
+
+    def create_wallet(self, node):
+        return mixer.blend(
+            BlockchainWallet,
+            node=node,
+            wallet_type=BLOCKCHAIN_WALLET_TYPE_HEDERA,
+            default=True,
+        )
+
+    def create_farmer(self, connected=True):
+        farmer = mixer.blend(
+            Farmer,
+            type=NODE_TYPE_FARM,
+            first_name="Jane",
+            last_name="Doe",
+            creator=self.user,
+            updater=self.user,
+        )
+        mixer.blend(
+            NodeSupplyChain,
+            node=farmer,
+            supply_chain=self.supply_chain,
+            primary_operation=self.operation,
+        )
+        if connected:
+            mixer.blend(
+                Connection,
+                buyer=self.company,
+                supplier=farmer,
+                supply_chain=self.supply_chain,
+            )
+        self.wallets[farmer.id] = self.create_wallet(farmer)
+        return farmer
+
+    def create_adapter(self):
+        return BulkTransactionAdapter(self.data_sheet, rows=[])
+
+    def serializer_row_data(self):
+        return dict(
+            self.data,
+            product=self.product.idencode,
+            unit=UNIT_KG,
+            currency=CURRENCY_USD,
+            force_create=True,
+            type=EXTERNAL_TRANS_TYPE_INCOMING,
+        )
+
+    def describe(self, farmer):
+        """Returns the objects created for the incoming transaction from
+        the farmer, with the ids that differ between farmers replaced."""
+        transaction = ExternalTransaction.objects.get(source=farmer)
+        source_batch = SourceBatch.objects.get(transaction=transaction)
+        farmer_batch = source_batch.batch
+        result_batch = transaction.result_batches.get()
+        payment = Payment.objects.get(transaction=transaction)
+        return {
+            "transaction": (
+                transaction.destination_id,
+                transaction.type,
+                transaction.price,
+                transaction.currency,
+                transaction._source_quantity,
+                transaction._destination_quantity,
+                transaction.date,
+                transaction.invoice_number,
+                transaction.comment,
+                transaction.buyer_ref_number,
+                transaction.seller_ref_number,
+                transaction.number - transaction.id,
+                transaction.creator_id,
+            ),
+            "fingerprint": transaction.fingerprint
+            == ExternalTransaction.get_fingerprint(
+                farmer.id,
+                transaction.date,
+                transaction.currency,
+                transaction.price,
+            ),
+            "wallets": (
+                transaction.source_wallet_id == self.wallets[farmer.id].id,
+                transaction.destination_wallet_id
+                == self.wallets[self.company.id].id,
+            ),
+            "source_batch": source_batch.quantity,
+            "farmer_batch": (
+                farmer_batch.node_id == farmer.id,
+                farmer_batch.product_id,
+                farmer_batch.name,
+                farmer_batch.initial_quantity,
+                farmer_batch.current_quantity,
+                farmer_batch.unit,
+                farmer_batch.type,
+                farmer_batch.number - farmer_batch.id,
+            ),
+            "result_batch": (
+                result_batch.node_id,
+                result_batch.product_id,
+                result_batch.name,
+                result_batch.initial_quantity,
+                result_batch.current_quantity,
+                result_batch.unit,
+                result_batch.note,
+                result_batch.buyer_ref_number,
+                result_batch.seller_ref_number,
+                result_batch.number - result_batch.id,
+                result_batch.creator_id,
+            ),
+            "parents": list(result_batch.parents.values_list("id", flat=True))
+            == [farmer_batch.id],
+            "batch_farmers": [
+                set(
+                    BatchFarmerMapping.objects.filter(batch=batch).values_list(
+                        "farmer_id", flat=True
+                    )
+                )
+                == {farmer.id}
+                for batch in (farmer_batch, result_batch)
+            ],
+            "payment": (
+                payment.amount,
+                payment.source_id,
+                payment.destination_id == farmer.id,
+                payment.currency,
+                payment.invoice_number,
+                payment.payment_type,
+                payment.method,
+                payment.description,
+            ),
+            "data_sheet": self.data_sheet.added_transactions.filter(
+                id=transaction.id
+            ).exists(),
+        }
+
+    def test_bulk_creation_matches_serializer(self):
+        serializer_farmer = self.create_farmer()
+        bulk_farmer = self.create_farmer()
+        adapter = self.create_adapter()
+        adapter.create_transaction(
+            0, serializer_farmer, self.serializer_row_data()
+        )
+        creator = BulkIncomingTransactionCreator(
+            node=self.company,
+            user=self.user,
+            product=self.product,
+            unit=UNIT_KG,
+            currency=CURRENCY_USD,
+            data_sheet=self.data_sheet,
+        )
+
+        self.assertEqual(creator.add(1, bulk_farmer, self.data), {})
+        created, failed = creator.create()
+
+        self.assertEqual(dict(adapter.errors), {})
+        self.assertEqual((created, failed), ([1], []))
+        self.assertEqual(
+            self.describe(bulk_farmer), self.describe(serializer_farmer)
+        )
+
+    def test_invalid_row_is_not_added(self):
+        creator = BulkIncomingTransactionCreator(
+            node=self.company,
+            user=self.user,
+            product=self.product,
+            unit=UNIT_KG,
+            currency=CURRENCY_USD,
+        )
+
+        errors = creator.add(0, self.create_farmer(), {"quantity": 0})
+
+        self.assertIn("quantity", errors)
+        self.assertEqual(creator.create(), ([], []))
+
+    def test_failed_chunk_falls_back_to_rows(self):
+        farmer = self.create_farmer()
+        not_connected = self.create_farmer(connected=False)
+        adapter = self.create_adapter()
+
+        adapter.create_transactions(
+            {
+                0: (farmer, self.serializer_row_data()),
+                1: (not_connected, self.serializer_row_data()),
+            }
+        )
+
+        self.assertEqual(list(adapter.errors), [1])
+        self.assertEqual(len(adapter.exceptions), 1)
+        self.assertTrue(ExternalTransaction.objects.filter(source=farmer))
+        self.assertFalse(
+            ExternalTransaction.objects.filter(source=not_connected)
+        )
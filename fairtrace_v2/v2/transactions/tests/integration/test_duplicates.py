@@ -0,0 +1,67 @@
+from datetime import datetime
+from decimal import Decimal
+
+from common import library as comm_lib
+from common.currencies import CURRENCY_USD
+from django.utils import timezone
+from mixer.backend.django import mixer
+from v2.products.models import Batch
+from v2.supply_chains.constants import NODE_TYPE_FARM
+from v2.supply_chains.models import Farmer
+from v2.supply_chains.models import NodeSupplyChain
+from v2.transactions.duplicates import find_duplicate_transactions
+from v2.transactions.models import ExternalTransaction
+from v2.transactions.tests.integration.base import TransactionBaseTestCase
+
+
+class DuplicateTransactionTestCase(TransactionBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.farmer = mixer.blend(Farmer, type=NODE_TYPE_FARM)
+        mixer.blend(
+            NodeSupplyChain,
+            node=self.farmer,
+            supply_chain=self.supply_chain,
+            primary_operation=self.operation,
+        )
+        transaction = mixer.blend(
+            ExternalTransaction,
+            source=self.farmer,
+            destination=self.company,
+            date=timezone.make_aware(datetime(2023, 5, 17, 10)),
+            currency=CURRENCY_USD,
+            price=20.5,
+        )
+        self.transaction_id = transaction.id
+        mixer.blend(
+            Batch,
+            node=self.company,
+            product=self.product,
+            source_transaction=transaction,
+            current_quantity=Decimal("12.300"),
+        )
+
+    def create_row(self, quantity):
+        return {
+            "id": self.farmer.idencode,
+            "transaction_date": "17-05-2023",
+            "currency": CURRENCY_USD,
+            "price_per_unit": 20.5,
+            "product_id": self.product.idencode,
+            "quantity": quantity,
+            "primary_operation": comm_lib._encode(self.operation.id),
+        }
+
+    def test_fractional_quantity_matches_the_stored_quantity(self):
+        rows = [self.create_row(12.3), self.create_row("12.3001")]
+
+        duplicates = find_duplicate_transactions(rows)
+
+        self.assertEqual(
+            duplicates, [self.transaction_id, self.transaction_id]
+        )
+
+    def test_different_quantity_does_not_match(self):
+        duplicates = find_duplicate_transactions([self.create_row(12.4)])
+
+        self.assertEqual(duplicates, [None])
@@ -0,0 +1,120 @@
+from django.test import override_settings
+from django.test import TestCase
+from mixer.backend.django import mixer
+from rest_framework.exceptions import ValidationError
+from v2.products.models import Batch
+from v2.products.models import Product
+from v2.supply_chains.constants import NODE_TYPE_COMPANY
+from v2.supply_chains.models import Company
+from v2.transactions import lineage
+from v2.transactions.models import Transaction
+from v2.transactions.models import TransactionLineage
+
+
+class TransactionGraphTestCase(TestCase):
+    def setUp(self):
+        #   root_a   root_b
+        #      \     /
+        #       middle
+        #      /     \
+        #   leaf_a   leaf_b
+        self.root_a = Transaction.objects.create()
+        self.root_b = Transaction.objects.create()
+        self.middle = Transaction.objects.create()
+        self.leaf_a = Transaction.objects.create()
+        self.leaf_b = Transaction.objects.create()
+        self.middle.parents.add(self.root_a, self.root_b)
+        self.leaf_a.parents.add(self.middle)
+        self.leaf_b.parents.add(self.middle)
+
+    def test_get_ancestors(self):
+        ancestors = set(self.leaf_a.get_ancestors())
+        assert ancestors == {self.middle, self.root_a, self.root_b}
+        assert self.leaf_a in self.leaf_a.get_ancestors(include_self=True)
+
+    def test_get_ancestors_max_depth(self):
+        assert set(self.leaf_a.get_ancestors(max_depth=1)) == {self.middle}
+
+    def create_batch(self, transaction, *parents):
+        batch = mixer.blend(
+            Batch,
+            source_transaction=transaction,
+            product=self.product,
+            node=self.node,
+        )
+        batch.parents.add(*parents)
+        return batch
+
+    def test_get_ancestors_pruned_by_batches(self):
+        self.product = mixer.blend(Product)
+        self.node = mixer.blend(Company, type=NODE_TYPE_COMPANY)
+        root_batch = self.create_batch(self.root_a)
+        self.create_batch(self.root_b)
+        middle_batch = self.create_batch(self.middle, root_batch)
+        leaf_batch = self.create_batch(self.leaf_a, middle_batch)
+
+        batches = Batch.objects.filter(id=leaf_batch.id)
+        ancestors = set(self.leaf_a.get_ancestors(batches=batches))
+        assert ancestors == {self.middle, self.root_a}
+        assert self.leaf_a.get_ancestor_ids(
+            include_self=True, batches=batches
+        ) == {self.leaf_a.id, self.middle.id, self.root_a.id}
+
+        # Parents are not followed past the end of the batch lineage.
+        middle_batch.parents.clear()
+        ancestors = set(self.leaf_a.get_ancestors(batches=batches))
+        assert ancestors == {self.middle}
+
+    def test_get_descendants(self):
+        descendants = set(self.root_a.get_descendants())
+        assert descendants == {self.middle, self.leaf_a, self.leaf_b}
+        assert self.root_a.get_descendant_ids(include_self=True) == {
+            self.root_a.id,
+            self.middle.id,
+            self.leaf_a.id,
+            self.leaf_b.id,
+        }
+
+    def test_root_and_leaf_nodes(self):
+        assert set(self.leaf_a.get_root_nodes()) == {self.root_a, self.root_b}
+        assert set(self.root_a.get_leaf_nodes()) == {self.leaf_a, self.leaf_b}
+        assert list(self.root_a.get_root_nodes()) == [self.root_a]
+
+    def test_circular_checker(self):
+        with self.assertRaises(ValidationError):
+            Transaction.circular_checker(self.leaf_a, self.root_a)
+        with self.assertRaises(ValidationError):
+            Transaction.circular_checker(self.middle, self.middle)
+        Transaction.circular_checker(self.root_a, self.leaf_a)
+
+
+@override_settings(TRANSACTION_LINEAGE_ENABLED=True)
+class TransactionLineageTestCase(TransactionGraphTestCase):
+    def assert_consistent(self):
+        for result in lineage.check():
+            assert result["missing"] == 0
+            assert result["extra"] == 0
+
+    def test_lineage_is_maintained(self):
+        self.assert_consistent()
+        assert (
+            TransactionLineage.objects.get(
+                ancestor=self.root_a, descendant=self.leaf_b
+            ).depth
+            == 2
+        )
+
+    def test_lineage_after_remove(self):
+        self.middle.remove_parent(self.root_a)
+        self.assert_consistent()
+        assert set(self.leaf_a.get_ancestors()) == {self.middle, self.root_b}
+
+    def test_lineage_after_clear(self):
+        self.middle.children.clear()
+        self.assert_consistent()
+        assert not self.leaf_a.get_ancestor_ids()
+
+    def test_rebuild(self):
+        TransactionLineage.objects.all().delete()
+        list(lineage.rebuild())
+        self.assert_consistent()
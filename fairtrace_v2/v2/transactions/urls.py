@@ -90,6 +90,11 @@ urlpatterns = [
         trans_views.ValidateTransaction.as_view(),
         name="internal-details",
     ),
+    path(
+        "validate/transactions/",
+        trans_views.ValidateTransactionBatch.as_view(),
+        name="validate-transactions",
+    ),
     path(
         "validate/dynamic-transaction/",
         trans_views.ValidateDynamicTransaction.as_view(),
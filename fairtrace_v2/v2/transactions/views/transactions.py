@@ -1,11 +1,7 @@
 """Views related to transactions in transactions app."""
-import re
 
 from common import library as comm_lib
 from common.drf_custom.views import MultiPermissionView
-from common.excel_templates.constants import VALUE_CHANGED
-from common.excel_templates.constants import VALUE_NEW
-from common.excel_templates.constants import VALUE_UNCHANGED
 from common.exceptions import BadRequest
 from django.db.models import Q
 from django.http import HttpResponse
@@ -17,13 +13,10 @@ from common.library import decode, filter_queryset
 from v2.accounts import permissions as user_permissions
 from v2.products.models import Product
 from v2.supply_chains import permissions as sc_permissions
-from v2.supply_chains.models import Farmer
 from v2.transactions.bulk_upload import get_transaction_bulk_template
 from v2.transactions.bulk_upload import get_transaction_bulk_template2
 from v2.transactions.bulk_upload.constants import file_name
-from v2.transactions.constants import BULK_UPLOAD_TYPE_TXN
-from v2.transactions.constants import DUPLICATE_EX_TXN
-from v2.transactions.constants import DUPLICATE_FARMER
+from v2.transactions.duplicates import validate_rows
 from v2.transactions.filters import ExternalTransactionFilter
 from v2.transactions.filters import InternalTransactionFilter
 from v2.transactions.filters import TransactionAttachmentFilter
@@ -218,93 +211,25 @@ class BulkTransactionTemplate2(APIView):
 class ValidateTransaction(generics.RetrieveAPIView):
     """View to check transaction duplicate exists."""
 
-    @staticmethod
-    def check_txn_duplicate(request):
-        """To perform function check_txn_duplicate."""
-        duplicate = False
-        duplicate_type = ""
-        transaction_status = VALUE_NEW
-        duplicate_id = ""
-        price_per_unit = comm_lib.convert_float(request.data["price_per_unit"])
-        quantity = comm_lib.convert_float(request.data["quantity"])
-        external_trans = ExternalTransaction.objects.filter(
-            result_batches__product__id=comm_lib._decode(
-                request.data["product_id"]
-            ),
-            price=price_per_unit,
-            result_batches__current_quantity=quantity,
-            date__date=comm_lib._string_to_datetime(
-                request.data["transaction_date"]
-            ),
-            currency=request.data["currency"],
-            source__id=comm_lib._decode(request.data["id"]),
-            source__nodesupplychain__primary_operation__id=comm_lib._decode(
-                request.data["primary_operation"]
-            ),
-        )
-        if external_trans and request.data["id"]:
-            duplicate = True
-            duplicate_id = external_trans[0].idencode
-            duplicate_type = DUPLICATE_EX_TXN
-            transaction_status = VALUE_UNCHANGED
-        return duplicate, duplicate_type, transaction_status, duplicate_id
+    def post(self, request, *args, **kwargs):
+        """To perform function post."""
+        data = validate_rows([request.data], request.data["bulk_upload_type"])
+        return comm_lib._success_response(data[0], "Validated", 200)
 
-    @staticmethod
-    def check_farmer_duplicate(request):
-        """To perform function check_farmer_duplicate."""
-        duplicate = False
-        duplicate_type = ""
-        duplicate_id = ""
-        farmer_status = VALUE_UNCHANGED
-        dial_code = re.sub("[(),a-z,A-Z]", "", request.data["dial_code"])
-        phone_number = str(dial_code) + str(request.data["phone"])
-        farmer_dup = Farmer.objects.filter(
-            first_name=request.data["first_name"],
-            last_name=request.data["last_name"],
-            street=request.data["street"],
-            city=request.data["city"],
-            country=request.data["country"],
-            province=request.data["province"],
-            zipcode=request.data["zipcode"],
-            email=request.data["email"],
-            nodesupplychain__primary_operation__id=comm_lib._decode(
-                request.data["primary_operation"]
-            ),
-            identification_no=request.data["identification_no"],
-            phone=phone_number,
-        )
-        if farmer_dup and not request.data["id"]:
-            duplicate = True
-            duplicate_type = DUPLICATE_FARMER
-            duplicate_id = farmer_dup[0].idencode
-            farmer_status = VALUE_NEW
-        elif not request.data["id"]:
-            farmer_status = VALUE_NEW
-        elif not farmer_dup and request.data["id"]:
-            farmer_status = VALUE_CHANGED
-        return duplicate, duplicate_type, farmer_status, duplicate_id
+
+class ValidateTransactionBatch(generics.RetrieveAPIView):
+    """View to check the duplicates of all the rows of a sheet at once.
+
+    The rows are checked as with ValidateTransaction, and the results are
+    returned in the order of the rows.
+    """
 
     def post(self, request, *args, **kwargs):
         """To perform function post."""
-        data = {}
-        (
-            data["duplicate"],
-            data["duplicate_type"],
-            data["farmer_status"],
-            data["duplicate_id"],
-        ) = self.check_farmer_duplicate(request)
-        if request.data["bulk_upload_type"] == BULK_UPLOAD_TYPE_TXN:
-            (
-                duplicate,
-                duplicate_type,
-                data["transaction_status"],
-                duplicate_id,
-            ) = self.check_txn_duplicate(request)
-            if not data["duplicate"]:
-                data["duplicate"] = duplicate
-                data["duplicate_id"] = duplicate_id
-            if not data["duplicate_type"]:
-                data["duplicate_type"] = duplicate_type
+        rows = request.data.get("rows")
+        if not isinstance(rows, list):
+            raise BadRequest("rows should be a list")
+        data = validate_rows(rows, request.data["bulk_upload_type"])
         return comm_lib._success_response(data, "Validated", 200)
 
 